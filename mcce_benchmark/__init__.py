@@ -54,12 +54,14 @@ def get_conda_paths() -> tuple:
 ENTRY_POINTS = {"setup": "bench_setup",
                 "launch": "bench_batch", # used by crontab :: launch 1 batch
                 "analyze": "bench_analyze",
-                "compare": "bench_compare"}
+                "compare": "bench_compare",
+                "gate": "bench_gate"}
 
 # bench_setup sub-commands, also used throughout:
 SUB1 = "pkdb_pdbs"
 SUB2 = "user_pdbs"
 SUB3 = "launch"   # :: crontab job scheduler step of setup.
+SUB4 = "sweep"    # :: setup of one set per point of a grid of step options.
 
 # user envir:
 USER_ENV = get_user_env()
@@ -73,8 +75,11 @@ class FILES(Enum):
     ALL_PKAS = "all_pkas.out"
     ALL_PKAS_TSV = "all_pkas.tsv"        # contains no oob pkas if ALL_PKAS_OOB exists
     ALL_PKAS_OOB = "all_pkas_oob.tsv"    # out of bounds pKas
+    ALL_PKAS_REFIT = "all_pkas_refit.tsv"   # pkas refit from sum_crg, see titration.py
     ALL_SUMCRG = "all_sumcrg.out"
     ALL_SUMCRG_DIFF = "all_smcrg_diff.tsv"
+    CONFS_OCC_DIFF = "all_confs_occ_diff.tsv"   # fort.38 deltas, bench_compare --conformers
+    RES_OCC_DIFF = "all_res_occ_diff.tsv"
     JOB_PKAS = "job_pkas.pickle"         # pickled dict
     CONF_COUNTS = "conf_counts.tsv"
     RES_COUNTS = "res_counts.tsv"
@@ -85,13 +90,21 @@ class FILES(Enum):
     VERSIONS = "versions.txt"
     MATCHED_PKAS = "matched_pkas.csv"
     MATCHED_PKAS_STATS = "matched_pkas_stats.pickle" # pickled dict
-    PKAS_STATS = "pkas_stats.csv"
+    PKAS_STATS = "pkas_stats.csv"        # metrics & bootstrap CIs per grouping, see stats.py
+    PKAS_SUMMARY = "pkas_summary.tsv"    # counts, mean, sd & histogram of the pkas per residue type
     RES_OUTLIER = "outlier_residues.tsv"
     RESID_OUTLIER = "outlier_resids.tsv"
     FIG_FIT_ALLPKS = "pkas_fit.png"
     FIG_FIT_PER_RES = "res_analysis.png"
+    COMPARE_MATRIX = "compare_matrix.tsv"   # bench_compare -dirs: stats per set & residue type
+    PARTIAL_COVERAGE = "partial_coverage.tsv"   # bench_compare --partial: runs coverage per set
+    MANY_SUMMARY = "many_summary.tsv"   # bench_analyze many: summary per set
+    STORE = "analysis_store.npz"         # versioned columnar store, see store.py
 
 RUNS_DIR = "runs"
+PDBS_FPRINTS = "pdbs_fingerprints.tsv"  # <bench_dir>/runs/: source pdbs fingerprints (user_pdbs)
+SWEEP_MANIFEST = "sweep_manifest.tsv"   # <sweep_dir>/: one row per point (sweep)
+GATE_LOG = "gate_log.tsv"               # <bench_dir>/: one row per look (bench_gate)
 ANALYZE_DIR = "analysis"
 MCCE_EPS = 4   # default dielectric constant (epsilon) in MCCE
 N_BATCH = 10   # number of jobs to maintain in the process queue
@@ -114,6 +127,7 @@ class Bench_Resources():
     __slots__ = ("_BENCH_DATA",
                  "_BENCH_DB",
                  "_BENCH_WT",
+                 "_BENCH_WT_DB",
                  "_BENCH_PROTS",
                  "_BENCH_PDBS",
                  "_DEFAULT_JOB",
@@ -128,6 +142,7 @@ class Bench_Resources():
         self._BENCH_DATA = res_files
         self._BENCH_DB = self._BENCH_DATA.joinpath("pkadbv1")
         self._BENCH_WT = self._BENCH_DB.joinpath("WT_pkas.csv")
+        self._BENCH_WT_DB = self._BENCH_DB.joinpath("WT_pkas.npz")   # compiled BENCH_WT, see pkadb.py
         self._BENCH_PROTS = self._BENCH_DB.joinpath("proteins.tsv")
         self._BENCH_PDBS = self._BENCH_DB.joinpath(RUNS_DIR)
         self._DEFAULT_JOB = "default_run"
@@ -157,6 +172,10 @@ class Bench_Resources():
     def BENCH_WT(self):
         return self._BENCH_WT
 
+    @property
+    def BENCH_WT_DB(self):
+        return self._BENCH_WT_DB
+
     @property
     def BENCH_PROTS(self):
         return self._BENCH_PROTS
@@ -188,6 +207,7 @@ class Bench_Resources():
         BENCH_PARSE_PHE4 = {str(self.BENCH_PARSE_PHE4)}
         BENCH_DB = {str(self.BENCH_DB)}
         BENCH_WT = {str(self.BENCH_WT)}
+        BENCH_WT_DB = {str(self.BENCH_WT_DB)}
         BENCH_PROTS = {str(self.BENCH_PROTS)}
         BENCH_PDBS = {str(self.BENCH_PDBS)}
         DEFAULT_JOB = {str(self.DEFAULT_JOB)}
@@ -227,7 +247,11 @@ Default analysis output file names (fixed):
   ALL_PKAS: {FILES.ALL_PKAS.value}
   ALL_SUMCRG: {FILES.ALL_SUMCRG.value}
   ALL_SUMCRG_DIFF: {FILES.ALL_SUMCRG_DIFF.value}
+  CONFS_OCC_DIFF: {FILES.CONFS_OCC_DIFF.value}
+  RES_OCC_DIFF: {FILES.RES_OCC_DIFF.value}
   ALL_PKAS_OOB: {FILES.ALL_PKAS_OOB.value}
+  ALL_PKAS_REFIT: {FILES.ALL_PKAS_REFIT.value}
+  PKAS_SUMMARY: {FILES.PKAS_SUMMARY.value}
   JOB_PKAS: {FILES.JOB_PKAS.value}
   CONF_COUNTS: {FILES.CONF_COUNTS.value}
   RES_COUNTS: {FILES.RES_COUNTS.value}
@@ -236,12 +260,17 @@ Default analysis output file names (fixed):
   CONFS_THRUPUT: {FILES.CONFS_THRUPUT.value}
   FIG_CONFS_TP: {FILES.FIG_CONFS_TP.value}
   VERSIONS: {FILES.VERSIONS.value}
+  STORE: {FILES.STORE.value}
 Additionally, with with SUB1:
   MATCHED_PKAS: {FILES.MATCHED_PKAS.value}
   MATCHED_PKAS_STATS: {FILES.MATCHED_PKAS_STATS.value}
+  PKAS_STATS: {FILES.PKAS_STATS.value}
   RES_OUTLIER = {FILES.RES_OUTLIER.value}
   RESID_OUTLIER = {FILES.RESID_OUTLIER.value}
   FIG_FIT_ALLPKS = {FILES.FIG_FIT_ALLPKS .value}
   FIG_FIT_PER_RES = {FILES.FIG_FIT_PER_RES.value}
+  COMPARE_MATRIX = {FILES.COMPARE_MATRIX.value}
+  PARTIAL_COVERAGE = {FILES.PARTIAL_COVERAGE.value}
+  MANY_SUMMARY = {FILES.MANY_SUMMARY.value}
 \n{'-'*70}
 """
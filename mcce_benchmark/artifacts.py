@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+Module: artifacts.py
+
+Make-style builder of the analysis artifacts of a set of runs (see
+pkanalysis.analysis_nodes for the graph of `bench_analyze`).
+Each artifact is a Node: the files it writes, the nodes or sources it derives from,
+and its build function. A node is stale when one of its outputs is missing or was
+modified, or when the digest of its inputs differs from the one recorded at its last
+build in <analysis dir>/ARTIFACTS_STATE.
+The inputs digest of a node combines the sha256 of the outputs of its input nodes and
+the digests of its sources (e.g. the fingerprints of the run files), so that a rebuilt
+but unchanged artifact does not make its dependents stale.
+
+make builds the stale nodes needed by the targets in dependency order: the nodes whose
+inputs are up to date are built concurrently by a pool of threads, except the `serial`
+ones (e.g. figures: pyplot is not thread-safe), which are built one at a time.
+
+Functions:
+ required_nodes(nodes:dict, targets:list) -> list
+ make(analyze_dir:str, nodes:dict, sources:dict, targets:list=None,
+      n_jobs:int=1, force:bool=False) -> list
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from mcce_benchmark.io_utils import file_fingerprint
+import hashlib
+import json
+import logging
+from pathlib import Path
+import threading
+from typing import Callable
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+ARTIFACTS_STATE = ".artifacts.json"   # in the analysis dir: {node: inputs digest & outputs}
+
+
+class Node:
+    """An analysis artifact:
+      - outputs: the names of the files it writes in the analysis dir; those in
+        `optional` may not be written (e.g. no out of bounds pkas);
+      - inputs: the names of the nodes or sources it derives from;
+      - build: the function (no arguments) writing the outputs;
+      - serial: build it while no other serial node is being built.
+    """
+
+    def __init__(self, name:str, outputs:list, inputs:list, build:Callable,
+                 optional:list = None, serial:bool = False):
+        self.name = name
+        self.outputs = outputs
+        self.inputs = inputs
+        self.build = build
+        self.optional = optional or []
+        self.serial = serial
+
+    def __str__(self):
+        return f"{self.name}: {self.outputs} <- {self.inputs}"
+
+
+def required_nodes(nodes:dict, targets:list) -> list:
+    """Return the names of the `targets` nodes & of all the nodes they derive from,
+    in dependency order (a node follows its inputs; else, the order of `nodes`).
+    """
+
+    unknown = [t for t in targets if t not in nodes]
+    if unknown:
+        msg = f"Unknown artifacts: {unknown}; choices: {list(nodes)}."
+        logger.error(msg)
+        raise ValueError(msg)
+
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in needed:
+            needed.add(name)
+            todo.extend(i for i in nodes[name].inputs if i in nodes)
+
+    order = []
+    visiting = set()
+
+    def visit(name):
+        if name in order:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle in the artifacts graph at {name!r}.")
+        visiting.add(name)
+        for i in nodes[name].inputs:
+            if i in nodes:
+                visit(i)
+        visiting.discard(name)
+        order.append(name)
+
+    for name in nodes:
+        if name in needed:
+            visit(name)
+
+    return order
+
+
+def _load_state(state_fp:Path) -> dict:
+    if not state_fp.exists():
+        return {}
+    try:
+        with open(state_fp) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        logger.warning(f"Unreadable artifacts state: {state_fp}; all artifacts are stale.")
+        return {}
+
+
+def _save_state(state:dict, state_fp:Path) -> None:
+    tmp_fp = state_fp.with_suffix(".tmp")
+    with open(tmp_fp, "w") as fh:
+        json.dump(state, fh, indent=1)
+    tmp_fp.replace(state_fp)
+
+    return
+
+
+def make(analyze_dir:str, nodes:dict, sources:dict, targets:list = None,
+         n_jobs:int = 1, force:bool = False) -> list:
+    """Build the stale artifacts needed by `targets` (default: all the nodes).
+    Args:
+      analyze_dir (str): folder of the outputs & of the ARTIFACTS_STATE file;
+      nodes (dict): {name: Node};
+      sources (dict): {name: digest} of the inputs that are not nodes;
+      targets (list, None): names of the nodes to bring up to date;
+      n_jobs (int, 1): number of threads building independent nodes;
+      force (bool, False): rebuild all the needed nodes.
+    Return the names of the nodes built, in completion order.
+    """
+
+    analyze = Path(analyze_dir)
+    order = required_nodes(nodes, list(nodes) if targets is None else targets)
+    for name in order:
+        missing = [i for i in nodes[name].inputs if i not in nodes and i not in sources]
+        if missing:
+            raise ValueError(f"Unknown inputs of artifact {name!r}: {missing}.")
+
+    state_fp = analyze.joinpath(ARTIFACTS_STATE)
+    state = _load_state(state_fp)
+    serial_lock = threading.Lock()
+
+    def outputs_fprints(name:str) -> dict:
+        """{output: fingerprint or None}; unchanged files are not re-hashed."""
+        recorded = state.get(name, {}).get("outputs", {})
+        fprints = {}
+        for fname in nodes[name].outputs:
+            fp = analyze.joinpath(fname)
+            fprints[fname] = list(file_fingerprint(fp, recorded.get(fname))) if fp.exists() else None
+        return fprints
+
+    def inputs_digest(name:str) -> str:
+        h = hashlib.sha256(name.encode())
+        for i in nodes[name].inputs:
+            if i in nodes:
+                digests = {f: fpr and fpr[2] for f, fpr in outputs_fprints(i).items()}
+                h.update(f"\n{i}:{json.dumps(digests, sort_keys=True)}".encode())
+            else:
+                h.update(f"\n{i}:{sources[i]}".encode())
+        return h.hexdigest()
+
+    def is_stale(name:str, digest:str) -> bool:
+        rec = state.get(name)
+        if force or rec is None or rec["inputs"] != digest:
+            return True
+        node = nodes[name]
+        for fname, fpr in outputs_fprints(name).items():
+            if fpr is None and fname not in node.optional:
+                return True
+            prev = rec["outputs"].get(fname)
+            if (fpr and fpr[2]) != (prev and prev[2]):
+                return True
+        return False
+
+    def build(name:str) -> None:
+        node = nodes[name]
+        logger.info(f"Building {name}.")
+        if node.serial:
+            with serial_lock:
+                node.build()
+        else:
+            node.build()
+        return
+
+    built = []
+    done = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, n_jobs)) as pool:
+        while True:
+            # one pass in dependency order: up to date nodes free their dependents
+            for name in order:
+                if name in done or name in running:
+                    continue
+                if not all(i in done for i in nodes[name].inputs if i in nodes):
+                    continue
+                digest = inputs_digest(name)
+                if is_stale(name, digest):
+                    running[name] = (pool.submit(build, name), digest)
+                else:
+                    done.add(name)
+
+            if not running:
+                break
+
+            finished, _ = wait([f for f, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name in [n for n, (f, _) in running.items() if f in finished]:
+                future, digest = running.pop(name)
+                # re-raise a build error; the running builds are awaited on exit:
+                future.result()
+                state[name] = {"inputs": digest, "outputs": outputs_fprints(name)}
+                _save_state(state, state_fp)
+                done.add(name)
+                built.append(name)
+
+    logger.info(f"Artifacts built: {len(built)}; up to date: {len(order) - len(built)}.")
+
+    return built
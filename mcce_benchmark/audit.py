@@ -20,17 +20,24 @@ def reset_multi_models(pdbs_dir:Path = BENCH.BENCH_PDBS, debug:bool = False) ->
 def update_proteins_multi(proteins_file:Path = BENCH.BENCH_PROTS):
 def rewrite_book_file(book_file:Path) -> None:
 def pdb_list_from_book(book_file:Path = Path(BENCH.Q_BOOK)) -> list:
+def book_states(book_file:Path = Path(BENCH.Q_BOOK)) -> dict:
+def write_book_states(book_file:Path, states:dict) -> None:
 def pdb_list_from_runs_folder(pdbs_dir:Path = BENCH.BENCH_PDBS) -> list:
 def prots_symdiff_runs(prot_tsv_file:Path=BENCH.BENCH_PROTS,
 def update_data(prot_tsv_file:Path=BENCH.BENCH_PROTS,
 def same_pdbs_book_vs_runs() -> bool:
 def pdb_list_from_experimental_pkas(pkas_file:Path=BENCH.BENCH_WT) -> list:
+def pdbs_costs(run_times_file:Path=REFSET_RUN_TIMES, conf_counts_file:Path=REFSET_CONF_COUNTS) -> pd.Series:
+def pdbs_res_types(pkas_file:Path=BENCH.BENCH_WT) -> dict:
+def cover_res_types(res_types:dict, costs:pd.Series) -> list:
+def select_pdbs_subset(subset:str, n_pdbs:int = SUBSET_N_PDBS) -> list:
 def proteins_to_tsv(prot_file:str) -> list:
 """
 
 # import class of files resources and associated constants:
-from mcce_benchmark import BENCH, RUNS_DIR
+from mcce_benchmark import BENCH, RUNS_DIR, ANALYZE_DIR, FILES
 from mcce_benchmark.io_utils import Pathok, subprocess
+from mcce_benchmark import pkadb
 import logging
 import numpy as np
 import pandas as pd
@@ -43,6 +50,13 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.WARNING)
 
 
+# packaged per-protein cost: run times of the reference set
+REFSET_RUN_TIMES = BENCH.BENCH_PARSE_PHE4.joinpath(ANALYZE_DIR, FILES.RUN_TIMES.value)
+REFSET_CONF_COUNTS = BENCH.BENCH_PARSE_PHE4.joinpath(ANALYZE_DIR, FILES.CONF_COUNTS.value)
+SUBSETS = ["smoke", "stratified", "smallest"]
+SUBSET_N_PDBS = 10   # default subset size for 'stratified' & 'smallest'
+
+
 MULTI_ACTIVE_MSG = \
 """Multi-model folder {!r} contains multiple 'active' pdbs with
 {!r} being the second one.
@@ -348,6 +362,33 @@ def pdb_list_from_book(book_file:Path = Path(BENCH.Q_BOOK)) -> list:
     return pdbs
 
 
+def book_states(book_file:Path = Path(BENCH.Q_BOOK)) -> dict:
+    """Return a dict {pdb dir: state} from the book file.
+    Unsubmitted entries have state ' '.
+    """
+
+    states = {}
+    with open(book_file) as book:
+        for line in book:
+            fields = line.strip().split("#")[0].split()
+            if not fields:
+                continue
+            states[fields[0]] = fields[1].lower() if len(fields) > 1 else " "
+
+    return states
+
+
+def write_book_states(book_file:Path, states:dict) -> None:
+    """Re-write the book file from a {pdb dir: state} dict, sorted by pdb dir.
+    Same line format as batch_submit.ENTRY.
+    """
+
+    with open(book_file, "w") as book:
+        book.writelines([f"{d:6s} {states[d]:1s}\n" for d in sorted(states)])
+
+    return
+
+
 def pdb_list_from_runs_folder(pdbs_dir:Path = BENCH.BENCH_PDBS) -> list:
     """pdbs_dir: folder with one PDBID folder for each pdbid.pdb file"""
 
@@ -460,16 +501,87 @@ def pdb_list_from_experimental_pkas(pkas_file:Path=BENCH.BENCH_WT) -> list:
         logger.error("Only wild type proteins listed in 'WT_pkas.csv' are currently considered.")
         raise TypeError("Only wild type proteins listed in 'WT_pkas.csv' are currently considered.")
 
-    pkas_df = pd.read_csv(fp,
-                          usecols=["PDB ID", "Expt. pKa"],
-                          comment="#",
-                          converters={"Expt. pKa": to_float},
-                          ).dropna(how="any")
+    return pkadb.pkadb_pdbs(fp, fp.with_suffix(".npz"))
 
-    pdbs = pkas_df['PDB ID'].unique().tolist()
-    pdbs.sort()
 
-    return pdbs
+def pdbs_costs(run_times_file:Path=REFSET_RUN_TIMES,
+               conf_counts_file:Path=REFSET_CONF_COUNTS) -> pd.Series:
+    """Return the predicted cost of each pdb, indexed by pdb id: the run time of
+    steps 1-4 in the packaged reference set, or, if the run times are uninformative
+    (all equal), the number of conformers squared, as the pairwise energies of
+    step 3 dominate the cpu time.
+    """
+
+    df = pd.read_csv(run_times_file, sep="\t")
+    costs = df.groupby("PDB")["seconds"].sum()
+    if costs.nunique() > 1:
+        return costs
+
+    logger.info("Uninformative run times: conformer counts used for the predicted costs.")
+    confs = pd.read_csv(conf_counts_file, sep="\t", index_col="PDB")["confs"]
+
+    return confs.astype(float)**2
+
+
+def pdbs_res_types(pkas_file:Path=BENCH.BENCH_WT) -> dict:
+    """Return a dict {pdb id: set of residue types with a valid experimental pKa}."""
+
+    fp = Path(pkas_file)
+
+    return pkadb.pkadb_res_types(fp, fp.with_suffix(".npz"))
+
+
+def cover_res_types(res_types:dict, costs:pd.Series) -> list:
+    """Greedy weighted set cover: return the pdb ids covering all the residue types
+    in `res_types` at a low total cost; the pdb with the lowest cost per newly covered
+    type is added at each step.
+    """
+
+    to_cover = set().union(*res_types.values())
+    cover = []
+    while to_cover:
+        best = min((costs[pdb] / len(types & to_cover), pdb)
+                   for pdb, types in res_types.items() if types & to_cover)[1]
+        cover.append(best)
+        to_cover -= res_types[best]
+
+    return cover
+
+
+def select_pdbs_subset(subset:str, n_pdbs:int = SUBSET_N_PDBS) -> list:
+    """Return a list ["PDB/pdb[_*].pdb", ..] of valid pdbs for a fast benchmark.
+    All subsets include the cheapest pdbs covering the ionizable residue types of
+    the experimental pKas (see cover_res_types), with the predicted costs of the
+    packaged reference set (see pdbs_costs):
+      - 'smoke': only the covering pdbs;
+      - 'smallest': + the cheapest other pdbs, up to n_pdbs;
+      - 'stratified': + the cheapest pdb in each of the cost quantiles of the other
+        pdbs, up to n_pdbs; the subset spans the range of protein sizes.
+    """
+
+    if subset not in SUBSETS:
+        logger.error(f"Unknown subset: {subset!r}; choices: {SUBSETS}.")
+        raise ValueError(f"Unknown subset: {subset!r}; choices: {SUBSETS}.")
+
+    valid, _ = list_all_valid_pdbs()
+    valid_pdbs = {v.split("/")[0]: v for v in valid}
+    costs = pdbs_costs().reindex(list(valid_pdbs))
+    # pdbs without reference run times come last:
+    costs = costs.fillna(costs.max() * 2).sort_values(kind="stable")
+    res_types = {pdb: types for pdb, types in pdbs_res_types().items() if pdb in valid_pdbs}
+
+    selected = cover_res_types(res_types, costs)
+    others = costs.drop(selected)
+    n_more = max(0, n_pdbs - len(selected))
+    if subset == "smallest":
+        selected.extend(others.index[:n_more])
+    elif subset == "stratified" and n_more:
+        strata = pd.qcut(others.rank(method="first"), min(n_more, len(others)), labels=False)
+        selected.extend(others.groupby(strata).idxmin())
+
+    logger.info(f"Subset {subset!r}: {len(selected)} pdbs; {costs[selected].sum()/costs.sum():.1%} of the total predicted cost.")
+
+    return [valid_pdbs[pdb] for pdb in sorted(selected)]
 
 
 ##############################################################
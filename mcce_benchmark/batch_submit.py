@@ -13,11 +13,16 @@ Main functions:
     Query shell for user's processes with job_name.
     Return a list of runs/ sub-directories where the jobs are running.
 
-* batch_run(job_name:str, n_batch:int = N_BATCH, sentinel_file:str = "pK.out") -> None:
+* batch_run(job_name:str, n_batch:int = N_BATCH, sentinel_file:str = "pK.out") -> int:
     Update Q_BOOK according to user's running jobs' statuses.
     Launch new jobs inside runs subfolders until the number of
     job equals n_batch.
     To be run in /runs subfolder, which is where Q_BOOK resides.
+    Return the number of running jobs.
+
+* launch_sweep(args:Namespace) -> None:
+    Call batch_run for each point of the sweep in args.bench_dir, in order,
+    sharing the n_batch slots.
 
 * launch_job(bench_dir:str),
              job_name:str = None,
@@ -41,6 +46,7 @@ from mcce_benchmark import BENCH, RUNS_DIR, N_BATCH, USER, ENTRY_POINTS, N_BATCH
 from mcce_benchmark.io_utils import subprocess_run, subprocess
 from mcce_benchmark.pkanalysis import pct_completed
 from mcce_benchmark.scheduling import clear_crontab
+from mcce_benchmark import audit, step_cache, sweep
 import logging
 import os
 from pathlib import Path
@@ -110,7 +116,7 @@ def get_running_jobs_dirs(job_name:str) -> list:
     return dirs
 
 
-def batch_run(args:Union[dict, Namespace]) -> None:
+def batch_run(args:Union[dict, Namespace]) -> int:
     """
     Update Q_BOOK according to user's running jobs' states.
     Launch new jobs inside the runs subfolders until the number of
@@ -123,10 +129,13 @@ def batch_run(args:Union[dict, Namespace]) -> None:
     args.sentinel_file (str, "pK.out"): File whose existence signals a completed job;
       When running all 4 MCCE steps (default), this file is 'pK.out', while
       when running only the first 2, this file is 'step2_out.pdb'.
+    args.hold (set, optional): Names of the unsubmitted entries not to launch yet.
+    Return the number of running jobs.
     """
 
     if isinstance(args, dict):
         args = Namespace(**args)
+    hold = getattr(args, "hold", set())
 
     job_name = args.job_name
     job_script = f"{job_name}.sh"
@@ -138,16 +147,28 @@ def batch_run(args:Union[dict, Namespace]) -> None:
     n_jobs = len(running_jobs)
     logger.info(f"Running jobs: {n_jobs}")
 
+    # shared cache of steps 1 & 2 outputs, if enabled at setup:
+    cache_cfg = step_cache.read_cache_config(Path.cwd())
+    if cache_cfg is not None:
+        step_lines = step_cache.script_step_lines(job_script)
+
     new_entries = []
     logger.info("Launching script for unsubmitted entries")
     for entry in entries:
-        if entry.state == " ":  # unsubmitted
+        if entry.state == " " and entry.name not in hold:  # unsubmitted
             n_jobs += 1
             if n_jobs <= args.n_batch:
+                env = None
+                if cache_cfg is not None:
+                    keys = step_cache.step_keys(entry.name, step_lines)
+                    n_cached = step_cache.fetch_cached_steps(entry.name, keys,
+                                                             cache_cfg["cache_dir"])
+                    env = dict(os.environ, **{step_cache.CACHED_STEPS_VAR: str(n_cached)})
                 os.chdir(entry.name)
                 subprocess.Popen(f"../{job_script}",
                                  shell=True,
                                  close_fds=True,
+                                 env=env,
                                  stdout=open("run.log", "w"))
                 os.chdir("../")
                 entry.state = "r"
@@ -161,6 +182,13 @@ def batch_run(args:Union[dict, Namespace]) -> None:
                 if sentin_fp.exists():
                     entry.state = "c"
                 logger.info(f"Changed {entry.name}: 'r' -> {entry.state!r}")
+                if cache_cfg is not None:
+                    keys = step_cache.step_keys(entry.name, step_lines)
+                    # only the steps confirmed complete are cached:
+                    step_cache.store_step_outputs(entry.name, keys,
+                                                  cache_cfg["cache_dir"],
+                                                  cache_cfg["max_gb"],
+                                                  run_completed=entry.state == "c")
 
         new_entries.append(entry)
 
@@ -168,7 +196,7 @@ def batch_run(args:Union[dict, Namespace]) -> None:
     with open(BENCH.Q_BOOK, "w") as bk:
         bk.writelines([f"{e}\n" for e in new_entries])
 
-    return
+    return min(n_jobs, args.n_batch)
 
 
 def launch_job(args:Namespace) -> None:
@@ -186,6 +214,10 @@ def launch_job(args:Namespace) -> None:
     """
 
     bench_dir = Path(args.bench_dir)
+    if sweep.is_sweep(bench_dir):
+        launch_sweep(args)
+        return
+
     if Path.cwd().name != bench_dir.name:
         os.chdir(bench_dir)
 
@@ -198,6 +230,52 @@ def launch_job(args:Namespace) -> None:
     return
 
 
+def launch_sweep(args:Namespace) -> None:
+    """
+    Call batch_run for each point of the sweep in args.bench_dir, in manifest order,
+    so that all the points share the args.n_batch slots.
+    When the steps cache is enabled, an unsubmitted run is held while the same pdb
+    is queued or running in an earlier point with identical steps 1 & 2: it will
+    retrieve their outputs from the cache instead of recomputing them.
+    """
+
+    manifest = sweep.read_sweep_manifest(args.bench_dir)
+    points = []
+    for _, row in manifest.iterrows():
+        runs_dir = Path(row.bench_dir).joinpath(RUNS_DIR)
+        sh_path = runs_dir.joinpath(f"{row.job_name}.sh")
+        step_lines = None
+        if step_cache.read_cache_config(runs_dir) is not None:
+            step_lines = tuple(sorted(step_cache.script_step_lines(sh_path).items()))
+        points.append((row.job_name, runs_dir, step_lines))
+
+    running = {job_name: len(get_running_jobs_dirs(job_name)) for job_name, _, _ in points}
+    n_running = sum(running.values())
+
+    curr = Path.cwd()
+    for i, (job_name, runs_dir, step_lines) in enumerate(points):
+        hold = set()
+        if step_lines is not None:
+            for _, prev_runs, prev_lines in points[:i]:
+                if prev_lines != step_lines:
+                    continue
+                states = audit.book_states(prev_runs.joinpath(BENCH.Q_BOOK))
+                hold.update(d for d, state in states.items() if state in [" ", "r"])
+
+        free = max(0, args.n_batch - n_running)
+        point_args = Namespace(job_name=job_name,
+                               n_batch=running[job_name] + free,
+                               sentinel_file=args.sentinel_file,
+                               hold=hold)
+        os.chdir(runs_dir)
+        n_jobs = batch_run(point_args)
+        os.chdir(curr)
+        n_running += n_jobs - running[job_name]
+        logger.info(f"Sweep point {job_name}: {n_jobs} running, {len(hold)} held.")
+
+    return
+
+
 def batch_parser():
     """Command line arguments parser for batch_submit.launch_job.
     """
@@ -262,8 +340,14 @@ def launch_cli(argv=None):
     args = launch_parser.parse_args(argv)
     launch_job(args)
 
-    book_fp = Path(args.bench_dir).joinpath(RUNS_DIR, BENCH.Q_BOOK)
-    pct = pct_completed(book_fp) # : c or e state :: finished
+    manifest = sweep.read_sweep_manifest(args.bench_dir)
+    if manifest is None:
+        book_fp = Path(args.bench_dir).joinpath(RUNS_DIR, BENCH.Q_BOOK)
+        pct = pct_completed(book_fp) # : c or e state :: finished
+    else:
+        # points have the same number of runs:
+        pct = sum(pct_completed(Path(d).joinpath(RUNS_DIR, BENCH.Q_BOOK))
+                  for d in manifest.bench_dir) / len(manifest)
     logger.info(f"Percentage of jobs completed: {pct:.1%}")
 
     # maybe clear crontab?
@@ -6,7 +6,7 @@ Module: cli.py
 Command line interface for MCCE benchmarking.
 Main entry point: "bench_setup"
 
-+ 3 sub-commands:
++ 4 sub-commands:
  1. "pkdb_pdbs"
     Sub-command for setting up <bench_dir>/runs folder
     using the pdbs in pKaDBv1 & job_name_run.sh script.
@@ -18,14 +18,18 @@ Main entry point: "bench_setup"
  3. "launch"
     Sub-command for scheduling the processing of the set.
     Can be by-passed if 1. or 2. have the --launch flag
+
+ 4. "sweep"
+    Sub-command for setting up one <bench_dir>/<job_name>NN/runs folder per point
+    of a grid of step options, sharing the staged pdbs & a single scheduler.
 """
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter, Namespace
 # import class of files resources and constants:
-from mcce_benchmark import BENCH, LOG_HDR, ENTRY_POINTS, SUB1, SUB2, SUB3
+from mcce_benchmark import BENCH, LOG_HDR, ENTRY_POINTS, SUB1, SUB2, SUB3, SUB4
 from mcce_benchmark import RUNS_DIR, N_BATCH, N_PDBS
 from mcce_benchmark.io_utils import Pathok
-from mcce_benchmark import job_setup, scheduling, custom_sh
+from mcce_benchmark import audit, job_setup, scheduling, custom_sh, step_cache, sweep
 from IPython.core.formatters import format_display_data
 import logging
 from pathlib import Path
@@ -64,6 +68,13 @@ HELP_3 = f"""Sub-command for scheduling the processing of the set in batches; e.
 Note: if provided, the value for the -job_name option must match the one used in `bench_setup [pkdb_pdbs, user_pdbs]`.
 """
 
+HELP_4 = f"""Sub-command for setting up a parameter sweep: one set per point of the grid
+of step options, e.g. 4 sets for:
+>{CLI_NAME} {SUB4} -bench_dir <folder name> -grid d=4,8 n=15,30
+The pdbs (pKaDBv1 or -pdbs_list) are staged once, the steps 1 & 2 cache is enabled, and
+the sets are processed by a single scheduler: use `{CLI_NAME} {SUB3} -bench_dir <folder name>`.
+"""
+
 DESC = f"""
 Description:
 Launch a MCCE benchmarking job using either the curated structures from the pKaDBv1
@@ -73,6 +84,7 @@ The main command is {CLI_NAME} along with one of 2 sub-commands:
 - Sub-command 1: {SUB1}: setup the dataset and run script to run mcce steps 1 through 4;
 - Sub-command 2: {SUB2}: setup the user dataset and run script to run mcce steps 1 through 4;
 - Sub-command 3: {SUB3}: delete any existing sentinel_file & launch the cron-scheduled batch runs;
+- Sub-command 4: {SUB4}: setup one set per point of a grid of step options (parameter sweep);
 """
 
 EPI = f"""
@@ -143,7 +155,8 @@ def bench_job_setup(args:Namespace) -> None:
         job_setup.setup_user_runs(args)
     else:
         job_setup.setup_expl_runs(args.bench_dir,
-                                  args.n_pdbs)
+                                  args.n_pdbs,
+                                  args.subset)
 
     # determine if args are all defaults
     use_default_sh = custom_sh.all_opts_are_defaults(args)
@@ -153,6 +166,11 @@ def bench_job_setup(args:Namespace) -> None:
         custom_sh.write_run_script_from_template(args.bench_dir,
                                                  args.job_name,
                                                  job_args = args)
+    if args.step_cache:
+        step_cache.enable_step_cache(args.bench_dir,
+                                     args.job_name,
+                                     cache_dir = args.cache_dir,
+                                     max_gb = args.cache_max_gb)
     logger.info("Setup over.")
 
     if args.launch:
@@ -164,6 +182,30 @@ def bench_job_setup(args:Namespace) -> None:
     return
 
 
+def bench_sweep_setup(args:Namespace) -> None:
+    """Benchmark cli function for the 'sweep' sub-command.
+    Processing steps:
+     - Stage the pdbs once in args.bench_dir/staged/runs/
+     - Create one args.bench_dir/<job_name>NN/runs/ folder & script per grid point
+     - Write the sweep manifest
+    """
+
+    in_benchmarks = Path.cwd().name == args.bench_dir.name
+    if in_benchmarks:
+        args.bench_dir = Path.cwd()
+
+    logger.info(args_to_str(args))
+    sweep.setup_sweep(args)
+    logger.info("Setup over.")
+
+    if args.launch:
+        logger.info("Launch flag on: Doing scheduling now.")
+        setattr(args, 'n_batch', N_BATCH)
+        bench_launch_batch(args)
+
+    return
+
+
 def bench_launch_batch(args:Namespace) -> None:
     """Benchmark cli function for 'launch' sub-command.
     PRE-REQS:
@@ -178,15 +220,22 @@ def bench_launch_batch(args:Namespace) -> None:
     logger.info(args_to_str(args))
     args.bench_dir = Pathok(args.bench_dir)
 
-    job_setup.delete_sentinel(args.bench_dir, args.sentinel_file)
+    manifest = sweep.read_sweep_manifest(args.bench_dir)
+    if manifest is None:
+        jobs = [(args.bench_dir, args.job_name)]
+    else:
+        jobs = list(zip(manifest.bench_dir.map(Path), manifest.job_name))
+
+    for bench_dir, job_name in jobs:
+        job_setup.delete_sentinel(bench_dir, args.sentinel_file)
 
-    #log script text again in case it was manualy modified.
-    sh_name = f"{args.job_name}.sh"
-    sh_path = Pathok(args.bench_dir.joinpath(RUNS_DIR, sh_name))
-    sh_msg = ("Script contents prior to launch:\n```\n"
-              + f"{job_setup.get_script_contents(sh_path)}\n```\n"
-             )
-    logger.info(sh_msg)
+        #log script text again in case it was manualy modified.
+        sh_name = f"{job_name}.sh"
+        sh_path = Pathok(bench_dir.joinpath(RUNS_DIR, sh_name))
+        sh_msg = ("Script contents prior to launch:\n```\n"
+                  + f"{job_setup.get_script_contents(sh_path)}\n```\n"
+                 )
+        logger.info(sh_msg)
 
     scheduling.schedule_job(args)
 
@@ -406,6 +455,27 @@ def bench_parser():
         help = "Enable microstate output",
         action = "store_true"
     )
+    cp.add_argument(
+        "--step_cache",
+        default = False,
+        action = "store_true",
+        help = """Use the cache of steps 1 & 2 outputs shared across benchmarking sets:
+        a run whose pdb, steps 1-2 options and MCCE version match a cached entry
+        skips these steps."""
+    )
+    cp.add_argument(
+        "-cache_dir",
+        type = arg_valid_dirpath,
+        default = str(step_cache.CACHE_DIR),
+        help = "Location of the steps cache (with --step_cache); default: %(default)s."
+    )
+    cp.add_argument(
+        "-cache_max_gb",
+        type = float,
+        default = step_cache.CACHE_MAX_GB,
+        help = """Maximal size of the steps cache in GB; the least recently used entries
+        are evicted beyond it; default: %(default)s."""
+    )
     cp.add_argument(
         "--launch",
         default = False,
@@ -417,10 +487,11 @@ def bench_parser():
                                   title = f"{CLI_NAME} sub-commands",
                                   dest = "subparser_name",
                                   description = "Sub-commands of MCCE benchmarking cli.",
-                                  help = """The 3 choices for the benchmarking process:
+                                  help = """The 4 choices for the benchmarking process:
                                   1) Setup pkdbv1 data & run-script: {SUB1}
                                   2) Setup user data & run-script: {SUB2}
                                   3) Schedule batch runs for mcce steps 1 through 4: {SUB3}
+                                  4) Setup a parameter sweep: {SUB4}
                                   """,
                                  )
 
@@ -435,6 +506,17 @@ def bench_parser():
         default = 120,
         type = int,
         help = """The number of curated pdbs to setup for the benchmarking job; max=default: %(default)s.
+        With --subset stratified or smallest: the subset size, 10 if not given.
+        """
+    )
+    sub1.add_argument(
+        "--subset",
+        choices = audit.SUBSETS,
+        default = None,
+        help = """Setup a fast benchmark: a subset of the curated pdbs that covers all the ionizable
+        residue types with experimental pKas at the lowest predicted cpu time (packaged run times);
+        smoke: covering pdbs only; smallest: + the cheapest pdbs up to n_pdbs; stratified: + the
+        cheapest pdb of each cost stratum up to n_pdbs.
         """
     )
     sub1.set_defaults(func=bench_job_setup)
@@ -452,6 +534,15 @@ def bench_parser():
         pdbs file paths.
         """
     )
+    sub2.add_argument(
+        "--incremental",
+        default = False,
+        action = "store_true",
+        help = """Re-setup an existing <bench_dir>: only the new pdbs are added to the book;
+        the runs of pdbs whose content changed (size, mtime, hash) are cleared and requeued;
+        completed runs of unchanged pdbs are left untouched.
+        """
+    )
     sub2.set_defaults(func=bench_job_setup)
 
     # launch
@@ -494,6 +585,48 @@ def bench_parser():
     )
     sub3.set_defaults(func=bench_launch_batch)
 
+    # sweep
+    sub4 = subparsers.add_parser(SUB4,
+                                 help=HELP_4,
+                                 formatter_class = RawDescriptionHelpFormatter,
+                                 parents=[cp]
+                                 )
+    sub4.add_argument(
+        "-grid",
+        required = True,
+        nargs = "+",
+        metavar = "option=v1,v2",
+        help = """The step options to sweep with their comma-separated values, e.g.:
+        -grid d=4,8 n=15,30; one set is setup per combination of values.
+        """
+    )
+    sub4.add_argument(
+        "-pdbs_list",
+        type = arg_valid_dir_or_file,
+        default = None,
+        help = """The path to a dir containing pdb files OR the path to a file listing the
+        pdbs file paths; the pKaDBv1 pdbs are used if not given.
+        """
+    )
+    sub4.add_argument(
+        "-n_pdbs",
+        default = 120,
+        type = int,
+        help = """The number of curated pdbs to setup when -pdbs_list is not given;
+        max=default: %(default)s.
+        """
+    )
+    sub4.add_argument(
+        "--subset",
+        choices = audit.SUBSETS,
+        default = None,
+        help = f"""Stage a cost-based subset of the curated pdbs when -pdbs_list is not given;
+        see `{CLI_NAME} {SUB1} -h`.
+        """
+    )
+    # short name: points scripts are <job_name>NN.sh, and pgrep only sees 15 chars:
+    sub4.set_defaults(func=bench_sweep_setup, job_name="sweep")
+
     return p
 
 
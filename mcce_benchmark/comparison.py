@@ -15,17 +15,23 @@ Cli parser with options:
   --dir2_is_refset: Flag presence indicate dir2 holds the NAME of a reference dataset,
                currently 'parse.e4' for pH titrations.
   The flags are mutually exclusive.
+  --conformers: Flag presence adds the comparison of the conformers occupancies (fort.38).
+  --partial: compare the runs completed in both sets, before all are completed.
+  -dirs, -ref: compare several run sets to one reference (path or refset name).
 """
 
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter, Namespace
+from concurrent.futures import ProcessPoolExecutor
 from mcce_benchmark import BENCH, ENTRY_POINTS, SUB1, SUB2
 from mcce_benchmark import FILES, ANALYZE_DIR, RUNS_DIR
 from mcce_benchmark import mcce_env
 from mcce_benchmark.cleanup import clear_folder
-from mcce_benchmark import pkanalysis, diff_mc, plots
-from mcce_benchmark.io_utils import Pathok, to_pickle, from_pickle
+from mcce_benchmark import pkanalysis, diff_mc, plots, refsets, stats, store
+from mcce_benchmark.io_utils import Pathok, get_book_dirs_for_status, to_pickle, from_pickle
 import logging
+import os
+import pandas as pd
 from pathlib import Path
 from typing import Union
 import sys
@@ -35,70 +41,78 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 #................................................................................
 
-def compare_runs(args:Union[dict, Namespace]):
+# memoized job pkas: {resolved bench path: (source mtimes, df)}
+_job_pkas = {}
 
-    if isinstance(args, dict):
-        args = Namespace(**args)
 
-    kind = SUB2 if args.user_pdbs else SUB1
+def job_pkas_df(bench_dir:Path) -> pd.DataFrame:
+    """Return the job pkas of `bench_dir` from its analysis store, or from the
+    JOB_PKAS pickle if the store is missing or outdated.
+    The parse is memoized (e.g. for a reference set used in several comparisons)
+    and re-done if the source files have changed.
+    """
 
-    ok, msg = mcce_env.validate_envs(args.dir1,
-                                      args.dir2,
-                                      subcmd=kind,
-                                      dir2_is_refset=args.dir2_is_refset
-                                      )
-    if not ok:
-        logger.error(f"Runs failed validation:\n{msg}")
-        raise TypeError(f"Runs failed validation:\n{msg}")
-    if ok and msg != "OK":
-        logger.warning(f"Runs validation warning:\n{msg}")
+    bench = Path(bench_dir).resolve()
+    mtimes = (mcce_env._mtime(store.store_path(bench)),
+              mcce_env._mtime(bench.joinpath(ANALYZE_DIR, FILES.JOB_PKAS.value)))
+    cached = _job_pkas.get(str(bench))
+    if cached is not None and cached[0] == mtimes:
+        return cached[1].copy()
 
-    analyze1 = args.dir1.joinpath(ANALYZE_DIR)
-    if not analyze1.exists():
-        pkanalysis.analyze_runs(args.dir1, kind)
+    df = store.read_table(bench, "pkas")
+    if df is None:
+        d = from_pickle(bench.joinpath(ANALYZE_DIR, FILES.JOB_PKAS.value))
+        df = pkanalysis.pkas_dict_to_df(d)
+    _job_pkas[str(bench)] = (mtimes, df)
 
-    analyze2 = args.dir2.joinpath(ANALYZE_DIR)
-    if not analyze2.exists():
-        pkanalysis.analyze_runs(args.dir2, kind)
+    return df.copy()
 
-    out_dir = Path(args.o)
-    if not out_dir.exists():
-        out_dir.mkdir()
-    else:
-        clear_folder(out_dir)
-        logger.info(f"Cleared comparison output folder: {out_dir}")
 
+def runs_coverage(dir1:Path, dir2:Path) -> tuple:
+    """Return the runs completed in both sets, in set 1 book order, and the coverage
+    of each set in a pandas.DataFrame: number of runs, of completed runs, of runs
+    completed in both sets (common) and its fraction of the runs (pct_common).
+    """
 
-    # 1. get collated sum_crg.out diff:
-    logger.info(f"Calculating sum_crg diff file.")
+    completed, n_runs = [], []
+    for d in [dir1, dir2]:
+        book_fp = Path(d).joinpath(RUNS_DIR, BENCH.Q_BOOK)
+        completed.append(get_book_dirs_for_status(book_fp))
+        with open(book_fp) as book:
+            n_runs.append(sum(1 for line in book if line.split("#")[0].strip()))
+    in2 = set(completed[1])
+    common = [d for d in completed[0] if d in in2]
 
-    sc1 = analyze1.joinpath(FILES.ALL_SUMCRG.value)
-    sc2 = analyze2.joinpath(FILES.ALL_SUMCRG.value)
-    tsv_fp = out_dir.joinpath(FILES.ALL_SUMCRG_DIFF.value)
+    coverage = pd.DataFrame({"runs": n_runs,
+                             "completed": [len(c) for c in completed],
+                             "common": len(common)},
+                            index=pd.Index(["set1", "set2"], name="set"))
+    coverage["pct_common"] = coverage.common / coverage.runs
 
-    diff_mc.get_diff(sc1, sc2, save_to_tsv=tsv_fp)
+    return common, coverage
 
-    # 2. get pkas to dict from all_pkas1, all_pkas2 & match pkas:
-    logger.info(f"Matching the pkas and saving list to csv file.")
 
-    d1 = from_pickle(analyze1.joinpath(FILES.JOB_PKAS.value))
-    d2 = from_pickle(analyze2.joinpath(FILES.JOB_PKAS.value))
+def matched_outputs(matched_pkas:list, out_dir:Path, kind:str=SUB1) -> dict:
+    """Save the matched pkas of a comparison in `out_dir` with their stats & figures.
+    Return the stats dict from pkanalysis.matched_pkas_stats.
+    """
 
-    matched_pkas = pkanalysis.match_pkas(d1, d2)
     matched_fp = out_dir.joinpath(FILES.MATCHED_PKAS.value)
     pkanalysis.matched_pkas_to_csv(matched_fp, matched_pkas, kind=kind)
 
-    # 3. get figure for matched residues analysis:
+    # figure for matched residues analysis:
     logger.info(f"Plotting matched residues analysis -> pic.")
 
     save_to = out_dir.joinpath(FILES.FIG_FIT_PER_RES.value)
     plots.plot_res_analysis(matched_pkas, save_to)
 
-    # 4. matched pkas stats
+    # matched pkas stats:
     logger.info(f"Calculating the matched pkas stats into dict.")
 
     _ = pkanalysis.res_outlier_count(matched_fp, grp_by="res")
     _ = pkanalysis.res_outlier_count(matched_fp, grp_by="resid")
+    # all groupings with bootstrap CIs -> PKAS_STATS:
+    _ = stats.matched_stats_to_csv(pd.DataFrame(matched_pkas, columns=["key", "calc", "ref"]), out_dir)
 
     # matched_df: for matched_pkas_stats and plots.plot_pkas_fit
     matched_df = pkanalysis.matched_pkas_to_df(matched_fp)
@@ -116,9 +130,192 @@ def compare_runs(args:Union[dict, Namespace]):
         save_to = out_dir.joinpath(FILES.FIG_FIT_ALLPKS.value)
         plots.plot_pkas_fit(matched_df, d_stats, save_to)
 
+    return d_stats
+
+
+def compare_runs(args:Union[dict, Namespace]):
+
+    if isinstance(args, dict):
+        args = Namespace(**args)
+
+    kind = SUB2 if args.user_pdbs else SUB1
+
+    dir1 = Path(args.dir1)
+    if args.dir2_is_refset:
+        # dir2 holds a refset name (the parser may have resolved it as a path):
+        dir2 = refsets.get_refset(Path(args.dir2).name, subcmd=kind)
+    else:
+        dir2 = Path(args.dir2)
+
+    ok, msg = mcce_env.validate_envs(dir1, dir2, subcmd=kind)
+    if not ok:
+        logger.error(f"Runs failed validation:\n{msg}")
+        raise TypeError(f"Runs failed validation:\n{msg}")
+    if ok and msg != "OK":
+        logger.warning(f"Runs validation warning:\n{msg}")
+
+    analyze1 = dir1.joinpath(ANALYZE_DIR)
+    analyze2 = dir2.joinpath(ANALYZE_DIR)
+
+    partial = getattr(args, "partial", False)
+    common = None
+    if partial:
+        common, coverage = runs_coverage(dir1, dir2)
+        logger.info(f"Partial comparison on the {len(common)} runs completed in both sets:\n{coverage}")
+        if not common:
+            logger.error("No runs completed in both sets.")
+            raise ValueError("No runs completed in both sets.")
+
+    # the analyses, then the sum_crg diffs & the pkas matching, run concurrently:
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        # partial sets are re-analyzed: only their new or changed runs are parsed:
+        to_analyze = [d for d, a in [(dir1, analyze1), (dir2, analyze2)]
+                      if not a.exists() or (partial and not (d == dir2 and args.dir2_is_refset))]
+        if to_analyze:
+            logger.info(f"Analyzing the runs of: {[str(d) for d in to_analyze]}")
+        for fut in [pool.submit(pkanalysis.analyze_runs, d, kind) for d in to_analyze]:
+            fut.result()
+
+        out_dir = Path(args.o)
+        if not out_dir.exists():
+            out_dir.mkdir()
+        else:
+            clear_folder(out_dir)
+            logger.info(f"Cleared comparison output folder: {out_dir}")
+        if partial:
+            coverage.to_csv(out_dir.joinpath(FILES.PARTIAL_COVERAGE.value), sep="\t", float_format="%.3f")
+
+        # 1. get collated sum_crg.out diff:
+        logger.info(f"Calculating sum_crg diff file.")
+
+        sc1 = analyze1.joinpath(FILES.ALL_SUMCRG.value)
+        sc2 = analyze2.joinpath(FILES.ALL_SUMCRG.value)
+        tsv_fp = out_dir.joinpath(FILES.ALL_SUMCRG_DIFF.value)
+        diff_futs = [pool.submit(diff_mc.get_diff, sc1, sc2, save_to_tsv=tsv_fp, runs=common)]
+
+        if getattr(args, "conformers", False):
+            logger.info(f"Calculating the conformers occupancy deltas from fort.38 files.")
+            diff_futs.append(pool.submit(diff_mc.conformers_diff, dir1, dir2, out_dir))
+
+        # 2. get pkas to dict from all_pkas1, all_pkas2 & match pkas:
+        logger.info(f"Matching the pkas and saving list to csv file.")
+
+        pkas1 = job_pkas_df(dir1)
+        pkas2 = job_pkas_df(dir2)
+        if partial:
+            pkas1 = pkas1[pkas1.PDB.isin(common)]
+            pkas2 = pkas2[pkas2.PDB.isin(common)]
+        matches = pkanalysis.match_pkas_df(pkas1, pkas2)
+        matched_pkas = list(matches.itertuples(index=False, name=None))
+
+        # 3. save the matched pkas with their stats & figures:
+        d_stats = matched_outputs(matched_pkas, out_dir, kind=kind)
+
+        if partial:
+            # sample size of each statistic, per residue type:
+            stats_df = pkanalysis.pkas_stats_matrix(matches.assign(set=dir1.name))
+            stats_df.to_csv(out_dir.joinpath(FILES.COMPARE_MATRIX.value), sep="\t", float_format="%.3f")
+            logger.info(f"Partial comparison: {len(common)} runs completed in both sets; "
+                        + f"{d_stats['N']} matched pkas.\n{stats_df.loc[dir1.name]}")
+
+        for fut in diff_futs:
+            fut.result()
+
     return
 
 
+def ref_location(ref:str, kind:str=SUB1) -> Path:
+    """Return the path of a reference given as a set of runs folder or a refset name."""
+
+    if Path(ref).joinpath(RUNS_DIR).is_dir():
+        return Path(ref)
+
+    return refsets.get_refset(Path(ref).name, subcmd=kind)
+
+
+def set_labels(dirs:list) -> list:
+    """Return the labels of the sets in `dirs`: their folder names, prefixed with
+    their rank if the names are not unique.
+    """
+
+    names = [Path(d).name for d in dirs]
+    if len(set(names)) < len(names):
+        names = [f"{i}_{name}" for i, name in enumerate(names, start=1)]
+
+    return names
+
+
+def compare_many(args:Union[dict, Namespace]) -> pd.DataFrame:
+    """Compare several sets of runs, args.dirs, to one reference, args.ref (folder or
+    refset name): the reference is loaded once and the pkas of all the sets are
+    matched in one join.
+    Output in args.o:
+      - FILES.COMPARE_MATRIX: stats per set, for all & per residue type;
+      - <set label>/: the outputs of a 2-set comparison, without the conformers.
+    Return the stats matrix.
+    """
+
+    if isinstance(args, dict):
+        args = Namespace(**args)
+
+    kind = SUB2 if args.user_pdbs else SUB1
+    ref_dir = ref_location(args.ref, kind=kind)
+    dirs = [Path(d) for d in args.dirs]
+
+    for d in dirs:
+        ok, msg = mcce_env.validate_envs(d, ref_dir, subcmd=kind)
+        if not ok:
+            logger.error(f"Runs failed validation: {d}\n{msg}")
+            raise TypeError(f"Runs failed validation: {d}\n{msg}")
+        if msg != "OK":
+            logger.warning(f"Runs validation warning: {d}\n{msg}")
+
+    out_dir = Path(args.o)
+    if not out_dir.exists():
+        out_dir.mkdir()
+    else:
+        clear_folder(out_dir)
+        logger.info(f"Cleared comparison output folder: {out_dir}")
+
+    labels = set_labels(dirs)
+    n_workers = max(1, min(len(dirs) + 1, os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        to_analyze = [d for d in dirs + [ref_dir] if not d.joinpath(ANALYZE_DIR).exists()]
+        if to_analyze:
+            logger.info(f"Analyzing the runs of: {[str(d) for d in to_analyze]}")
+        for fut in [pool.submit(pkanalysis.analyze_runs, d, kind) for d in to_analyze]:
+            fut.result()
+
+        logger.info(f"Calculating the sum_crg diff files.")
+        sc_ref = ref_dir.joinpath(ANALYZE_DIR, FILES.ALL_SUMCRG.value)
+        diff_futs = []
+        for d, label in zip(dirs, labels):
+            set_dir = out_dir.joinpath(label)
+            set_dir.mkdir()
+            diff_futs.append(pool.submit(diff_mc.get_diff,
+                                         d.joinpath(ANALYZE_DIR, FILES.ALL_SUMCRG.value),
+                                         sc_ref,
+                                         save_to_tsv=set_dir.joinpath(FILES.ALL_SUMCRG_DIFF.value)))
+
+        logger.info(f"Matching the pkas of {len(dirs)} sets with the reference.")
+        ref_df = job_pkas_df(ref_dir)
+        matches = pkanalysis.match_pkas_many({label: job_pkas_df(d) for d, label in zip(dirs, labels)},
+                                             ref_df)
+        stats_df = pkanalysis.pkas_stats_matrix(matches)
+        stats_fp = out_dir.joinpath(FILES.COMPARE_MATRIX.value)
+        stats_df.to_csv(stats_fp, sep="\t", float_format="%.3f")
+        logger.info(f"Saved the stats matrix: {stats_fp}")
+
+        for label, grp in matches.groupby("set", observed=True, sort=False):
+            matched_pkas = list(grp[["key", "calc", "ref"]].itertuples(index=False, name=None))
+            _ = matched_outputs(matched_pkas, out_dir.joinpath(label), kind=kind)
+
+        for fut in diff_futs:
+            fut.result()
+
+    return stats_df
+
+
 #........................................................................
 CLI_NAME = ENTRY_POINTS["compare"] # as per pyproject.toml entry point
 
@@ -139,8 +336,24 @@ Options:
 
   --dir2_is_refset: Flag presence indicates that dir2 value is a refset name;
                If used, --user_pdbs must NOT be present.
+               The refsets (packaged: parse.e4, or local: see refsets.register_refset)
+               are listed in a manifest with their params & hashes (refsets.py).
+  --conformers: Flag presence adds the comparison of the conformers occupancies
+               (fort.38) at each titration point, per conformer & per residue.
+  --partial: Flag presence enables the comparison of sets that are not fully completed:
+               only the runs completed in both sets are compared; the sets are re-analyzed
+               (incrementally) at each call. Additional output: {FILES.PARTIAL_COVERAGE.value}
+               (runs coverage per set) and {FILES.COMPARE_MATRIX.value} (stats with their
+               sample size, N, per residue type).
+
+  -dirs: paths to several run sets, compared to the reference given with -ref
+         (path to a run set, or a refset name, e.g. parse.e4); replaces -dir1 & -dir2.
+         A sweep folder stands for all its points (see sweep.point_dirs).
+         Output: {FILES.COMPARE_MATRIX.value} (stats per set & per residue type)
+         and one folder per set with the outputs of a 2-set comparison.
 
   (mce) >bench_compare -dir1 <d1> dir2 parse.e4 --dir2_is_refset -o ./output/dir/path
+  (mce) >bench_compare -dirs <d1> <d2> <d3> -ref parse.e4 -o ./output/dir/path
 
 
 Post an issue for all errors and feature requests at:
@@ -179,16 +392,26 @@ def compare_parser():
 
     p.add_argument(
         "-dir1",
-        required=True,
         type = arg_valid_dirpath,
         help = """Path to run set 1."""
     )
     p.add_argument(
          "-dir2",
-        required=True,
         type = arg_valid_dirpath,
         help = """Path to run set 2."""
     )
+    p.add_argument(
+        "-dirs",
+        nargs = "+",
+        type = arg_valid_dirpath,
+        help = """Paths to several run sets, or to a sweep folder (all its points), to compare
+        to -ref; replaces -dir1 & -dir2."""
+    )
+    p.add_argument(
+        "-ref",
+        type = str,
+        help = """With -dirs: path to the reference run set, or a refset name, e.g. parse.e4."""
+    )
 
     # cannot have --user_pdbs & --dir2_is_refset together:
     mutex = p.add_mutually_exclusive_group()
@@ -217,6 +440,24 @@ def compare_parser():
         type = arg_valid_dirpath,
         help = """Path to comparison results folder."""
     )
+    p.add_argument(
+        "--partial",
+        default = False,
+        action = "store_true",
+        help = f"""
+        Flag presence enables the comparison of the runs completed in both sets, without
+        waiting for the completion of all the runs; the coverage is saved to {FILES.PARTIAL_COVERAGE.value}.
+        """
+    )
+    p.add_argument(
+        "--conformers",
+        default = False,
+        action = "store_true",
+        help = f"""
+        Flag presence enables the comparison of the conformers occupancies (fort.38) of the
+        runs completed in both sets; output files: {FILES.CONFS_OCC_DIFF.value}, {FILES.RES_OCC_DIFF.value}.
+        """
+    )
 
     return p
 
@@ -229,8 +470,30 @@ def compare_cli(argv=None):
     cli_parser = compare_parser()
     args = cli_parser.parse_args(argv)
 
+    if args.dirs:
+        if args.ref is None or args.dir1 is not None or args.dir2 is not None:
+            cli_parser.error("-dirs requires -ref and excludes -dir1, -dir2.")
+        if args.partial:
+            cli_parser.error("--partial applies to a comparison of two sets, -dir1 & -dir2.")
+        if args.conformers:
+            cli_parser.error("--conformers applies to a comparison of two sets, -dir1 & -dir2.")
+        args.dirs = pkanalysis.bench_dirs_from_args([str(d) for d in args.dirs])
+        if not args.dirs:
+            cli_parser.error("-dirs: no sets of runs found.")
+        to_check = list(args.dirs)
+        # a refset is complete, a set of runs may not be:
+        if Path(args.ref).joinpath(RUNS_DIR).is_dir():
+            to_check.append(ref_location(args.ref))
+    else:
+        if args.dir1 is None or args.dir2 is None:
+            cli_parser.error("-dir1 and -dir2 are required, or -dirs with -ref.")
+        # a refset is complete:
+        to_check = [args.dir1] if args.dir2_is_refset else [args.dir1, args.dir2]
+        if args.partial:
+            to_check = []
+
     # OK to compare?
-    for d in [args.dir1, args.dir2]:
+    for d in to_check:
         bench = Pathok(d)
         book_fp = bench.joinpath(RUNS_DIR, BENCH.Q_BOOK)
         pct = pkanalysis.pct_completed(book_fp)
@@ -238,7 +501,10 @@ def compare_cli(argv=None):
             logger.info(f"Runs not 100% completed or failed in {d}, try again later; completed = {pct:.2f}")
             return
 
-    compare_runs(args)
+    if args.dirs:
+        compare_many(args)
+    else:
+        compare_runs(args)
 
     return
 
@@ -102,8 +102,9 @@ for S in defaults_per_step:
 def cli_args_to_dict(sh_args:Namespace) -> dict:
     """Only return mcce steps args."""
 
-    excluded_keys = ["subparser_name", "bench_dir", "n_pdbs", "pdbs_list",
-                     "sentinel_file", "job_name", "launch",
+    excluded_keys = ["subparser_name", "bench_dir", "n_pdbs", "subset", "pdbs_list",
+                     "incremental", "sentinel_file", "job_name", "launch",
+                     "step_cache", "cache_dir", "cache_max_gb", "grid",
                      "func", "help",
                     ]
     d_args = {k:v for k, v in vars(sh_args).items() if k not in excluded_keys}
@@ -5,66 +5,132 @@ Module: diff_mc
 
 Subtract two Monte Carlo sampling result reports.
 The reports can be fort.38, sum_crg.out, or anything with matching columns.
+
+The values of a report are held in a 2-D numpy array indexed by the row names and
+the titration points, so that a diff is one vectorized subtraction.
+
+Conformer-level comparison of two sets of runs (bench_compare --conformers): the
+fort.38 files of the runs completed in both sets are read one pair at a time into
+float32 arrays; the per-conformer and per-residue occupancy deltas are appended to
+FILES.CONFS_OCC_DIFF and FILES.RES_OCC_DIFF; see conformers_diff.
 """
 
+import csv
+from mcce_benchmark import BENCH, FILES, RUNS_DIR
+from mcce_benchmark.io_utils import get_book_dirs_for_status
+import logging
+import numpy as np
+import pandas as pd
 from pathlib import Path
 from typing import Union
 
 
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+FORT38 = "fort.38"
+
+
 class MCfile:
     def __init__(self, fname:Union[str, None]=None):
         self.fname = fname
         self.type = ""
         self.pHs = []
         self.names = []
-        self.values = {}
+        # {name: row} in the arrays:
+        self.index = {}
+        # values: float (nan if missing), present: bool, cells: str (tsv output):
+        self.values = np.empty((0, 0))
+        self.present = np.empty((0, 0), dtype=bool)
+        self.cells = np.empty((0, 0), dtype=object)
 
     def readfile(self):
         if self.fname is None:
             print("Class instanciated without fname.")
             return
 
-        lines = open(self.fname).readlines()
-        hdr = lines.pop(0)
+        with open(self.fname) as fh:
+            hdr = fh.readline()
         fields = hdr.strip().split()
         self.type = fields[0]
         prec = 0
         if self.type.upper() == "PH": prec = 1
         self.pHs = [f"{float(x.strip()):.{prec}f}" for x in fields[1:]]
+        n_pts = len(self.pHs)
 
-        for line in lines:
-            fields = line.strip().split()
-            if len(fields) > 1:
-                name = fields[0]
-                self.names.append(name)
-                for i in range(len(fields)-1):
-                    self.values[(name, self.pHs[i])] = fields[i+1]
+        try:
+            df = pd.read_csv(self.fname, sep=r"\s+", header=None, skiprows=1,
+                             names=range(n_pts + 1), index_col=False,
+                             dtype=object, keep_default_na=False, na_values=[""],
+                             quoting=csv.QUOTE_NONE)
+        except pd.errors.EmptyDataError:
+            df = pd.DataFrame(columns=range(n_pts + 1), dtype=object)
+        cells = df.to_numpy(dtype=object)
+        present = pd.notna(cells[:, 1:])
+        # skip the lines without values:
+        keep = present.any(axis=1)
+        if not keep.all():
+            df, cells, present = df[keep], cells[keep], present[keep]
+        self.names = cells[:, 0].tolist()
+        if df[0].duplicated().any():
+            # a repeated name keeps its first position & its last values:
+            df = df.groupby(0, sort=False).last()
+            cells = df.reset_index().to_numpy(dtype=object)
+            present = pd.notna(cells[:, 1:])
+
+        self.index = {name: i for i, name in enumerate(cells[:, 0].tolist())}
+        cells = cells[:, 1:]
+        self.present = present
+        self.cells = np.where(self.present, cells, "")
+        try:
+            self.values = np.where(self.present, cells, np.nan).astype(float)
+        except ValueError:
+            self.values = pd.DataFrame(self.cells).apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    def select_runs(self, runs:set):
+        """Keep the rows of a collated report whose names, '<run>:<resid>', are in `runs`."""
+
+        self.names = [name for name in self.names if name.split(":")[0] in runs]
+        rows = [self.index[name] for name in dict.fromkeys(self.names)]
+        self.index = {name: i for i, name in enumerate(dict.fromkeys(self.names))}
+        self.values = self.values[rows]
+        self.present = self.present[rows]
+        self.cells = self.cells[rows]
 
     def to_tsv(self, tsv_fp):
+        rows = [self.index[name] for name in self.names]
         with open(tsv_fp, "w") as fo:
             fo.writelines("%s\t%s\n" % (self.type, "\t".join(self.pHs)))
-            for name in self.names:
-                fo.writelines("%s\t%s\n" % (name, "\t".join(["%s" % self.values[(name, ph)] for ph in self.pHs])))
-
+            fo.writelines("%s\t%s\n" % (name, "\t".join(cells))
+                          for name, cells in zip(self.names, self.cells[rows].tolist()))
 
     def __str__(self):
-        out = "%-14s %s" % (self.type, " ".join(self.pHs))
+        out = "%-14s %s\n" % (self.type, " ".join(self.pHs))
         for name in self.names:
-            out = out + "%-14s %s" % (name, " ".join(["%6s" % self.values[(name, ph)] for ph in self.pHs]))
+            out = out + "%-14s %s\n" % (name, " ".join(["%6s" % c for c in self.cells[self.index[name]]]))
+        return out
 
 
 def merge_lists(list1:list, list2:list) -> list:
     "Return a merged list while preserving order."
 
+    # first positions in list1, merged items: hashed
+    pos1 = {}
+    for i, x in enumerate(list1):
+        pos1.setdefault(x, i)
+    merged = set()
+
     ipos = 0
     list_merged = []
     for x in list2:  #ref
-        if x not in list_merged:
-            if x in list1:
-                xpos = list1.index(x)
+        if x not in merged:
+            if x in pos1:
+                xpos = pos1[x]
                 list_merged += list1[ipos:xpos]
+                merged.update(list1[ipos:xpos])
                 ipos = xpos + 1
             list_merged.append(x)
+            merged.add(x)
 
     # list1 might have extra items
     if len(list1) > ipos:
@@ -73,6 +139,24 @@ def merge_lists(list1:list, list2:list) -> list:
     return list_merged
 
 
+def _aligned(f:MCfile, names:list, pHs:list) -> tuple:
+    """Return the values & presence mask of `f` re-indexed on `names` x `pHs`."""
+
+    rows = np.array([f.index.get(name, -1) for name in names], dtype=int)
+    col_of = {ph: j for j, ph in enumerate(f.pHs)}
+    cols = np.array([col_of.get(ph, -1) for ph in pHs], dtype=int)
+
+    found = (rows[:, None] >= 0) & (cols[None, :] >= 0)
+    if f.values.size:
+        values = f.values[rows[:, None], cols[None, :]]
+        present = f.present[rows[:, None], cols[None, :]] & found
+    else:
+        values = np.full(found.shape, np.nan)
+        present = found
+
+    return np.where(present, values, np.nan), present
+
+
 def diff(f1:MCfile, f2:MCfile) -> MCfile:
     if f1.type != f2.type:
         return None
@@ -83,28 +167,36 @@ def diff(f1:MCfile, f2:MCfile) -> MCfile:
     # get merged names
     names = merge_lists(f1.names, f2.names)
 
-    values = {}
-    for name in names:
-        for ph in pHs:
-            key = (name, ph)
-            if key in f1.values and key not in f2.values:
-                values[key] = "<<<"
-            elif key not in f1.values and key in f2.values:
-                values[key] = ">>>"
-            else:  # must be in both
-                # f2 - f1 to get A - B??
-                values[key] = "%6.2f" % (float(f2.values[key]) - float(f1.values[key]))
+    v1, in1 = _aligned(f1, names, pHs)
+    v2, in2 = _aligned(f2, names, pHs)
+    # f2 - f1 to get A - B??
+    values = np.where(in1 & in2, v2 - v1, np.nan)
+
+    cells = np.full(values.shape, "", dtype=object)
+    both = in1 & in2
+    if both.any():
+        # format each distinct value once:
+        uniq, inv = np.unique(values[both], return_inverse=True)
+        cells[both] = np.array(["%6.2f" % v for v in uniq.tolist()], dtype=object)[inv]
+    cells[in1 & ~in2] = "<<<"
+    cells[~in1 & in2] = ">>>"
 
     delta = MCfile()
     delta.type = f1.type
     delta.pHs = pHs
     delta.names = names
+    delta.index = {}
+    for i, name in enumerate(names):
+        delta.index.setdefault(name, i)
     delta.values = values
+    delta.present = both
+    delta.cells = cells
 
     return delta
 
 
-def get_diff(fp1:str, fp2:str, save_to_tsv:str=None) -> None:
+def get_diff(fp1:str, fp2:str, save_to_tsv:str=None, runs:list=None) -> None:
+    """Diff two reports; collated reports can be restricted to the rows of `runs`."""
 
     mcf1 = MCfile(fp1)
     mcf1.readfile()
@@ -112,6 +204,10 @@ def get_diff(fp1:str, fp2:str, save_to_tsv:str=None) -> None:
     mcf2 = MCfile(fp2)
     mcf2.readfile()
 
+    if runs is not None:
+        mcf1.select_runs(set(runs))
+        mcf2.select_runs(set(runs))
+
     delta = diff(mcf1, mcf2)
     if save_to_tsv is not None:
         delta.to_tsv(save_to_tsv)
@@ -119,3 +215,97 @@ def get_diff(fp1:str, fp2:str, save_to_tsv:str=None) -> None:
     print(delta)
 
     return
+
+
+def read_fort38(fort38_fp:str) -> tuple:
+    """Return the titration points, the conformer names and their occupancies in a
+    float32 array (n_confs x n_points) from a fort.38 file.
+    """
+
+    df = pd.read_csv(fort38_fp, sep=r"\s+", index_col=0, quoting=csv.QUOTE_NONE)
+
+    return list(df.columns), df.index.to_numpy(dtype=str), df.to_numpy(dtype=np.float32)
+
+
+def conformer_resids(confs:np.ndarray) -> np.ndarray:
+    """Return the residue ids of mcce conformer names, e.g. GLU01A0035_002 -> GLUA0035_."""
+
+    confs = pd.Series(confs, dtype=object)
+
+    return (confs.str[:3] + confs.str[5:11]).to_numpy(dtype=str)
+
+
+def fort38_deltas(fort38_fp1:str, fort38_fp2:str) -> tuple:
+    """Return the occupancy deltas (set2 - set1, same sign as the sum_crg deltas of
+    diff) between two fort.38 files in two pandas.DataFrames at the titration points
+    common to both files:
+      - per conformer, with a 'side' column: "<<<" (only in set1), ">>>" (only in set2),
+        or "" (in both); a missing conformer has a null occupancy;
+      - per residue: 0.5 * sum of |delta| over the conformers of the residue, i.e.
+        the fraction of the residue occupancy that changed.
+    """
+
+    pts1, confs1, occ1 = read_fort38(fort38_fp1)
+    pts2, confs2, occ2 = read_fort38(fort38_fp2)
+    if pts1 != pts2:
+        logger.warning(f"Titration points differ: {fort38_fp1} vs {fort38_fp2}; using the common points.")
+    pts = [p for p in pts1 if p in pts2]
+    occ1 = occ1[:, [pts1.index(p) for p in pts]]
+    occ2 = occ2[:, [pts2.index(p) for p in pts]]
+
+    confs = np.array(merge_lists(confs1.tolist(), confs2.tolist()), dtype=str)
+    aligned = []
+    for c, occ in [(confs1, occ1), (confs2, occ2)]:
+        rows = pd.Index(c).get_indexer(confs)
+        vals = np.zeros((len(confs), len(pts)), dtype=np.float32)
+        vals[rows >= 0] = occ[rows[rows >= 0]]
+        aligned.append((rows >= 0, vals))
+    (in1, v1), (in2, v2) = aligned
+    delta = v2 - v1
+
+    conf_df = pd.DataFrame(delta, index=pd.Index(confs, name="conf"), columns=pts)
+    conf_df.insert(0, "side", np.select([in1 & ~in2, ~in1 & in2], ["<<<", ">>>"], ""))
+
+    res_df = pd.DataFrame(np.abs(delta), columns=pts)
+    res_df.insert(0, "resid", conformer_resids(confs))
+    res_df = 0.5 * res_df.groupby("resid", sort=False).sum()
+
+    return conf_df, res_df
+
+
+def conformers_diff(bench_dir1:str, bench_dir2:str, out_dir:str) -> int:
+    """Compare the conformer occupancies of the runs completed in both sets, one pair
+    of fort.38 files at a time: write the deltas to FILES.CONFS_OCC_DIFF and
+    FILES.RES_OCC_DIFF in `out_dir`, with the titration points of the first run as
+    columns: the deltas of a run with other points are reindexed to them (missing
+    points are empty).
+    Return the number of runs compared.
+    """
+
+    runs1 = Path(bench_dir1).joinpath(RUNS_DIR)
+    runs2 = Path(bench_dir2).joinpath(RUNS_DIR)
+    common = set(get_book_dirs_for_status(runs2.joinpath(BENCH.Q_BOOK)))
+    pdbs = [d for d in get_book_dirs_for_status(runs1.joinpath(BENCH.Q_BOOK))
+            if d in common
+            and runs1.joinpath(d, FORT38).exists() and runs2.joinpath(d, FORT38).exists()]
+    if not pdbs:
+        logger.warning(f"No completed runs with {FORT38} in both sets.")
+        return 0
+
+    conf_fp = Path(out_dir).joinpath(FILES.CONFS_OCC_DIFF.value)
+    res_fp = Path(out_dir).joinpath(FILES.RES_OCC_DIFF.value)
+    pts = None
+    for i, pdb in enumerate(pdbs):
+        conf_df, res_df = fort38_deltas(runs1.joinpath(pdb, FORT38), runs2.joinpath(pdb, FORT38))
+        if pts is None:
+            pts = res_df.columns.tolist()
+        elif res_df.columns.tolist() != pts:
+            logger.warning(f"{pdb}: titration points differ from those of {pdbs[0]}; reindexed to them.")
+            conf_df = conf_df.reindex(columns=["side"] + pts)
+            res_df = res_df.reindex(columns=pts)
+        for df, fp in [(conf_df, conf_fp), (res_df, res_fp)]:
+            df.insert(0, "PDB", pdb)
+            df.to_csv(fp, sep="\t", float_format="%.3f", mode="w" if i == 0 else "a", header=(i == 0))
+    logger.info(f"Conformer occupancy deltas of {len(pdbs)} runs saved to {conf_fp} and {res_fp}.")
+
+    return len(pdbs)
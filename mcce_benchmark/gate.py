@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+
+"""
+Module: gate.py
+
+Cli end point for the early decision of a regression gate on a set of runs in
+progress, `bench_gate`.
+
+At each look, i.e. each call with newly completed runs, the pkas of the completed
+runs are matched with the reference pkas (experimental, or those of a refset or
+set of runs), and the RMSD and mean delta (of |calc - ref|) are compared to their
+maximum allowed values with sequential confidence bounds: the error rate alpha is
+spent over the looks as alpha_k = alpha * 6/(pi^2 * k^2) (sum over k = alpha),
+so that the gate can be decided at any look.
+The gate fails as soon as a lower bound exceeds its maximum, passes when all the
+upper bounds are within their maximums; it is then decided, and the scheduler
+(crontab) is cleared unless --no_stop is used. When all the runs are completed,
+the point estimates decide.
+Each look is appended to <bench_dir>/GATE_LOG with the gate settings (reference,
+maximums, alpha, min_runs): a look is only reused, and the looks only counted, under
+the same settings; a call with other settings starts a new log.
+
+Functions:
+ completed_pkas_df(bench_dir:str) -> pd.DataFrame
+ look_alpha(k:int, alpha:float) -> float
+ same_settings(last:pd.Series, settings:dict) -> bool
+ metric_bounds(delta:np.ndarray, z:float, clusters:np.ndarray=None) -> dict
+ gate_look(bench_dir:str, ref_df:pd.DataFrame, max_rmsd:float=None,
+           max_mean_delta:float=None, alpha:float=0.05, min_runs:int=10,
+           ref_id:str=GATE_EXPL_REF) -> dict
+ gate_cli(argv=None)
+"""
+
+from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from datetime import datetime
+from mcce_benchmark import BENCH, ENTRY_POINTS, RUNS_DIR, GATE_LOG, DT_FMT
+from mcce_benchmark import FILES, ANALYZE_DIR
+from mcce_benchmark import pkanalysis, comparison, store
+from mcce_benchmark.io_utils import Pathok, get_book_dirs_for_status, pks_to_float
+from mcce_benchmark.io_utils import fwf_to_df, get_col_specs
+from mcce_benchmark.mcce_env import get_bench_meta
+from mcce_benchmark.scheduling import clear_crontab
+from io import StringIO
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from statistics import NormalDist
+import sys
+import time
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+GATE_METRICS = ["rmsd", "mean_delta"]
+GATE_EXPL_REF = "expl"   # ref id of the experimental pkas
+
+
+def completed_pkas_df(bench_dir:str) -> pd.DataFrame:
+    """Return the in bounds pkas of the completed runs of `bench_dir` (columns PDB,
+    resid, pka), read from their pK.out files without writing any analysis file.
+    """
+
+    bench = Pathok(bench_dir)
+    runs_dir = bench.joinpath(RUNS_DIR)
+    book_fp = runs_dir.joinpath(BENCH.Q_BOOK)
+    if not get_book_dirs_for_status(book_fp):
+        return pd.DataFrame(columns=["PDB", "resid", "pka"])
+
+    titr = get_bench_meta(bench).titr_type.upper()
+    hdr = f"PDB  resid@{titr}         pKa/Em  n(slope) 1000*chi2      vdw0    vdw1    tors    ebkb    dsol   offset  pHpK0   EhEm0    -TS   residues   total"
+    lines = pkanalysis.collate_run_files(runs_dir, "pK.out", lambda line: line.endswith("total"))
+    text = "".join(f"{line}\n" for line in [hdr] + lines)
+    colspecs, cols = get_col_specs(collated=True, titr_type=titr)
+    allout_df = fwf_to_df(StringIO(text), colspecs, cols)
+
+    allout_df["pKa/Em"] = pks_to_float(allout_df["pKa/Em"])
+    allout_df = allout_df[~pkanalysis.get_oob_mask(allout_df)]
+
+    return pkanalysis.job_pkas_to_df(book_fp, allout_df)
+
+
+def look_alpha(k:int, alpha:float) -> float:
+    """Return the error rate spent at look `k` (1-based): alpha * 6/(pi^2 * k^2)."""
+
+    return alpha * 6 / (np.pi**2 * k**2)
+
+
+def metric_bounds(delta:np.ndarray, z:float, clusters:np.ndarray = None) -> dict:
+    """Return the point estimates and the normal-approximation confidence bounds,
+    (estimate, lower, upper), of the RMSD and mean of |delta| at `z` standard errors;
+    the RMSD bounds are the square roots of those of the mean of delta^2.
+    The pkas of a protein are correlated: the standard errors are cluster-robust, from
+    the sums of the residuals per cluster, e.g. the protein of each delta (default:
+    one cluster per delta, i.e. the usual standard error).
+    """
+
+    n = delta.size
+    if clusters is None:
+        codes = np.arange(n)
+    else:
+        codes = pd.factorize(np.asarray(clusters, dtype=object))[0]
+    n_cl = codes.max() + 1 if n else 0
+
+    bounds = {}
+    for name, x in [("mean_delta", np.abs(delta)), ("rmsd", delta**2)]:
+        m = x.mean()
+        if n_cl > 1:
+            resid_sums = np.bincount(codes, weights=x - m, minlength=n_cl)
+            se = np.sqrt(n_cl / (n_cl - 1) * np.sum(resid_sums**2)) / n
+            half = z * se
+        else:
+            half = np.inf
+        lo, hi = max(m - half, 0.0), m + half
+        if name == "rmsd":
+            m, lo, hi = np.sqrt(m), np.sqrt(lo), np.sqrt(hi)
+        bounds[name] = (m, lo, hi)
+
+    return bounds
+
+
+def read_gate_log(bench_dir:str) -> pd.DataFrame:
+    fp = Path(bench_dir).joinpath(GATE_LOG)
+    if not fp.exists():
+        return None
+
+    return pd.read_csv(fp, sep="\t", dtype={"ref": str})
+
+
+def same_settings(last:pd.Series, settings:dict) -> bool:
+    """Return whether the logged look `last` was made with the gate `settings`."""
+
+    for key, v in settings.items():
+        prev = last.get(key, np.nan)
+        if v is None:
+            same = pd.isna(prev)
+        elif isinstance(v, str):
+            same = prev == v
+        else:
+            same = not pd.isna(prev) and bool(np.isclose(float(prev), v))
+        if not same:
+            return False
+
+    return True
+
+
+def gate_look(bench_dir:str, ref_df:pd.DataFrame,
+              max_rmsd:float = None,
+              max_mean_delta:float = None,
+              alpha:float = 0.05,
+              min_runs:int = 10,
+              ref_id:str = GATE_EXPL_REF) -> dict:
+    """Evaluate the gate on the completed runs of `bench_dir` vs the pkas in `ref_df`,
+    identified in the log by `ref_id` (e.g. the path of the reference set of runs).
+    A look is only counted (and logged) when the number of completed runs has changed
+    and reached `min_runs` (or all the runs are finished): before, no decision is
+    possible and no alpha is spent (look 0); if the last logged look has other
+    settings, the log is restarted.
+    Return a dict with keys: look, runs, completed, finished (all runs completed or
+    in error), N (matched pkas), alpha_k, the bounds of each metric (estimate, lower,
+    upper), and decision: one of 'pass', 'fail', 'undecided'.
+    """
+
+    maxima = {"rmsd": max_rmsd, "mean_delta": max_mean_delta}
+    if all(v is None for v in maxima.values()):
+        msg = "At least one of max_rmsd, max_mean_delta is required."
+        logger.error(msg)
+        raise ValueError(msg)
+
+    bench = Pathok(bench_dir)
+    book_fp = bench.joinpath(RUNS_DIR, BENCH.Q_BOOK)
+    n_completed = len(get_book_dirs_for_status(book_fp))
+    with open(book_fp) as book:
+        n_runs = sum(1 for line in book if line.split("#")[0].strip())
+    n_finished = n_completed + len(get_book_dirs_for_status(book_fp, status="e"))
+
+    settings = {"ref": ref_id, "max_rmsd": max_rmsd, "max_mean_delta": max_mean_delta,
+                "alpha": alpha, "min_runs": min_runs}
+    log = read_gate_log(bench)
+    if log is not None and (not len(log) or not same_settings(log.iloc[-1], settings)):
+        logger.warning(f"Gate settings changed: new {GATE_LOG}; the previous looks are discarded.")
+        log = None
+
+    if log is not None and log.completed.iloc[-1] == n_completed:
+        # no new data: the previous look holds
+        last = log.iloc[-1]
+        return {"look": int(last.look), "runs": n_runs, "completed": n_completed,
+                "finished": n_finished == n_runs, "N": int(last.N), "alpha_k": last.alpha_k,
+                **{m: (last[m], last[f"{m}_lo"], last[f"{m}_hi"]) for m in GATE_METRICS},
+                "decision": last.decision}
+
+    if n_completed < min_runs and n_finished < n_runs:
+        return {"look": 0, "runs": n_runs, "completed": n_completed, "finished": False,
+                "N": 0, "alpha_k": 0.0, **{m: (np.nan, np.nan, np.nan) for m in GATE_METRICS},
+                "decision": "undecided"}
+
+    k = 1 if log is None else len(log) + 1
+    alpha_k = look_alpha(k, alpha)
+    z = NormalDist().inv_cdf(1 - alpha_k / 2)
+
+    matches = pkanalysis.match_pkas_df(completed_pkas_df(bench), ref_df)
+    delta = (matches.calc - matches.ref).to_numpy(dtype=float)
+    valid = ~np.isnan(delta)
+    delta = delta[valid]
+    # the protein of each matched pka (key: <pdb>/<resid>):
+    pdbs = matches.key.str.split("/", n=1).str[0].to_numpy(dtype=object)[valid]
+    bounds = (metric_bounds(delta, z, clusters=pdbs) if delta.size
+              else {m: (np.nan, np.nan, np.nan) for m in GATE_METRICS})
+
+    decision = "undecided"
+    if n_finished == n_runs and delta.size:
+        # all done: the estimates decide
+        ok = [bounds[m][0] <= v for m, v in maxima.items() if v is not None]
+        decision = "pass" if all(ok) else "fail"
+    elif n_completed >= min_runs and delta.size:
+        if any(bounds[m][1] > v for m, v in maxima.items() if v is not None):
+            decision = "fail"
+        elif all(bounds[m][2] <= v for m, v in maxima.items() if v is not None):
+            decision = "pass"
+
+    look = {"look": k, "runs": n_runs, "completed": n_completed,
+            "finished": n_finished == n_runs, "N": int(delta.size),
+            "alpha_k": alpha_k, **bounds, "decision": decision}
+
+    row = {"time": datetime.now().strftime(DT_FMT), "look": k, "completed": n_completed,
+           "N": int(delta.size), "alpha_k": alpha_k}
+    for m in GATE_METRICS:
+        row.update(dict(zip([m, f"{m}_lo", f"{m}_hi"], bounds[m])))
+    row["decision"] = decision
+    row.update(settings)
+    pd.DataFrame([row]).to_csv(bench.joinpath(GATE_LOG), sep="\t", index=False, float_format="%.6g",
+                               mode="w" if log is None else "a", header=log is None)
+
+    return look
+
+
+def look_report(look:dict) -> str:
+    """Return the text of a gate look."""
+
+    if look["look"] == 0:
+        return (f"No gate look: {look['completed']}/{look['runs']} runs completed, "
+                + "fewer than min_runs.\nDecision: undecided")
+
+    txt = (f"Gate look {look['look']}: {look['completed']}/{look['runs']} runs completed; "
+           + f"{look['N']} matched pkas; alpha_k = {look['alpha_k']:.4g}\n")
+    for m in GATE_METRICS:
+        est, lo, hi = look[m]
+        txt = txt + f"  {m}: {est:.3f}  [{lo:.3f}, {hi:.3f}]\n"
+
+    return txt + f"Decision: {look['decision']}"
+
+
+#.......................................................................
+CLI_NAME = ENTRY_POINTS["gate"] # as per pyproject.toml entry point
+
+DESC = f"""
+Description:
+Regression gate on a set of runs in progress: at each call with newly completed runs,
+the RMSD & mean delta of the matched pkas vs the reference (experimental pkas by default)
+are compared with their maximum values using sequential confidence bounds.
+As soon as the gate is decided, pass or fail, the scheduler (crontab) is cleared.
+The looks are logged in <bench_dir>/{GATE_LOG}.
+
+Options:
+  -bench_dir: path to the set of runs.
+  -ref: reference set of runs (path) or refset name, e.g. parse.e4; default: experimental pkas.
+  -max_rmsd, -max_mean_delta: maximum values of the metrics; at least one is required.
+  -alpha: total error rate of the sequential bounds; default: 0.05.
+  -min_runs: minimum number of completed runs before deciding; default: 10.
+  --watch: seconds between looks; the cli returns when the gate is decided;
+           default: 0, i.e. one look (e.g. for use in a crontab).
+  --no_stop: Flag presence prevents the clearing of the crontab.
+
+  (mce) >{CLI_NAME} -bench_dir <d> -ref parse.e4 -max_rmsd 1.2 --watch 600
+
+Exit code: 1 if the gate fails, else 0.
+"""
+
+
+def gate_parser():
+    """Cli arguments parser for the regression gate. """
+
+    def arg_valid_dirpath(p: str):
+        """Return resolved path from the command line."""
+        if not len(p):
+            return None
+        return Path(p).resolve()
+
+    p = ArgumentParser(
+        prog = f"{CLI_NAME} ",
+        description = DESC,
+        formatter_class = RawDescriptionHelpFormatter,
+    )
+    p.add_argument(
+        "-bench_dir",
+        required = True,
+        type = arg_valid_dirpath,
+        help = """Path to the set of runs."""
+    )
+    p.add_argument(
+        "-ref",
+        type = str,
+        default = None,
+        help = """Path to the reference set of runs, or a refset name; default: experimental pkas."""
+    )
+    p.add_argument(
+        "-max_rmsd",
+        type = float,
+        default = None,
+        help = """Maximum RMSD of the matched pkas."""
+    )
+    p.add_argument(
+        "-max_mean_delta",
+        type = float,
+        default = None,
+        help = """Maximum mean delta (of |calc - ref|) of the matched pkas."""
+    )
+    p.add_argument(
+        "-alpha",
+        type = float,
+        default = 0.05,
+        help = """Total error rate of the sequential bounds; default: %(default)s."""
+    )
+    p.add_argument(
+        "-min_runs",
+        type = int,
+        default = 10,
+        help = """Minimum number of completed runs before deciding; default: %(default)s."""
+    )
+    p.add_argument(
+        "--watch",
+        type = int,
+        default = 0,
+        help = """Seconds between looks until the gate is decided; default: %(default)s (one look)."""
+    )
+    p.add_argument(
+        "--no_stop",
+        default = False,
+        action = "store_true",
+        help = """Flag presence prevents the clearing of the crontab when the gate is decided."""
+    )
+
+    return p
+
+
+def gate_cli(argv=None):
+    """
+    Command line interface for MCCE benchmarking entry point 'bench_gate'.
+    """
+
+    cli_parser = gate_parser()
+    args = cli_parser.parse_args(argv)
+    if args.max_rmsd is None and args.max_mean_delta is None:
+        cli_parser.error("At least one of -max_rmsd, -max_mean_delta is required.")
+
+    if args.ref is None:
+        ref_id = GATE_EXPL_REF
+        ref_df = pkanalysis.experimental_pkas_to_df()
+    else:
+        try:
+            ref_dir = comparison.ref_location(args.ref)
+        except ValueError as e:
+            cli_parser.error(f"-ref: {e}")
+        schema = store.store_schema(ref_dir)
+        if ((schema is None or "pkas" not in schema["tables"])
+            and not Path(ref_dir).joinpath(ANALYZE_DIR, FILES.JOB_PKAS.value).exists()):
+            cli_parser.error(f"-ref: no analysis of the reference runs in {ref_dir}; "
+                             + f"run `{ENTRY_POINTS['analyze']}` on it first.")
+        ref_id = str(Path(ref_dir).resolve())
+        ref_df = comparison.job_pkas_df(ref_dir)
+
+    while True:
+        look = gate_look(args.bench_dir, ref_df,
+                         max_rmsd=args.max_rmsd,
+                         max_mean_delta=args.max_mean_delta,
+                         alpha=args.alpha,
+                         min_runs=args.min_runs,
+                         ref_id=ref_id)
+        print(look_report(look))
+        if look["decision"] != "undecided" or look["finished"] or args.watch <= 0:
+            break
+        time.sleep(args.watch)
+
+    if look["decision"] != "undecided" and not args.no_stop:
+        logger.info("Gate decided: clearing crontab")
+        clear_crontab()
+
+    if look["decision"] == "fail":
+        sys.exit(1)
+
+    return
+
+
+if __name__ == "__main__":
+
+    gate_cli(sys.argv[1:])
@@ -12,21 +12,28 @@ Functions:
                    check:bool=False,
                    text=True, shell=True) -> Union[subprocess.CompletedProcess, subprocess.CalledProcessError]
  make_executable(sh_path:str) -> None:
+ file_fingerprint(fpath:str, previous:tuple=None) -> tuple
  tsv_to_df(fpath:str, index_col:str=None) -> Union[pd.DataFrame, None]
  pk_to_float(value) -> float
+ pks_to_float(pks:pd.Series) -> pd.Series
  get_col_specs(collated:bool=False, titr_type:str='ph') -> tuple(specs, cols)
+ fwf_to_df(src:Union[str, TextIO], colspecs:list, cols:list, is_pko:bool=True) -> pd.DataFrame
  fout_df(pko_fp:str, collated:bool=False, titr_type:str='ph') -> Union[pd.DataFrame, None]
  to_pickle(obj:Any, fp:str) -> None:
  from_pickle(fp:str) -> Any:
 """
 
-from mcce_benchmark.mcce_env import get_mcce_env_dir
+from mcce_benchmark import RUNS_DIR, mcce_env
+import csv
+import hashlib
+from io import BytesIO
 import logging
+import numpy as np
 import pandas as pd
 from pathlib import Path
 import pickle
 import subprocess
-from typing import Union, Any #, Type, Tuple
+from typing import Union, Any, Iterator, TextIO #, Type, Tuple
 
 
 logger = logging.getLogger(__name__)
@@ -98,6 +105,26 @@ def make_executable(sh_path:str) -> None:
     return
 
 
+def file_fingerprint(fpath:str, previous:tuple=None) -> tuple:
+    """Return the fingerprint of a file as a 3-tuple: (size, mtime_ns, sha256 hex digest).
+    If `previous` is a fingerprint with the same size and mtime_ns as the file,
+    it is returned as is, i.e. without re-hashing the file.
+    """
+
+    fp = Path(fpath)
+    st = fp.stat()
+    if previous is not None:
+        if (int(previous[0]), int(previous[1])) == (st.st_size, st.st_mtime_ns):
+            return tuple(previous)
+
+    h = hashlib.sha256()
+    with open(fp, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+
+    return st.st_size, st.st_mtime_ns, h.hexdigest()
+
+
 def tsv_to_df(fpath:str, index_col:str=None) -> Union[pd.DataFrame, None]:
     """Read a tab-separated file into a pandas.DataFrame.
     Return None upon failure.
@@ -175,21 +202,12 @@ def get_col_specs(collated:bool=False, titr_type:str='ph') -> tuple:
 
 
 def get_sumcrg_hdr(bench_dir:str) -> str:
-   """Used for colspecs -> df."""
-
-   hdr0 = "  pH           0     1     2     3     4     5     6     7     8     9    10    11    12    13    14"
-   def_flds = len(hdr0.strip().split())
+    """Used for colspecs -> df.
+    Return the sum_crg.out header of bench_dir from its memoized metadata (see
+    mcce_env.get_bench_meta) if it is not the default one, else the default header.
+    """
 
-   run_dir = get_mcce_env_dir(bench_dir)
-   cmd = f"head -n1 {str(run_dir)}/sum_crg.out"
-   out = subprocess_run(cmd)
-   if isinstance(out, subprocess.CompletedProcess):
-       hdr = out.stdout.splitlines()[0]
-   flds = len(hdr.strip().split())
-   if flds != def_flds:
-       return hdr
-   else:
-       return hdr0
+    return mcce_env.get_sumcrg_hdr(bench_dir) or mcce_env.SUMCRG_HDR0
 
 
 def get_sumcrg_col_specs(collated:bool=False, titr_type:str='ph', hdr:str=None) -> tuple:
@@ -237,6 +255,90 @@ def get_sumcrg_col_specs(collated:bool=False, titr_type:str='ph', hdr:str=None)
     return cs, fields
 
 
+def pks_to_float(pks:pd.Series) -> pd.Series:
+    """Vectorized pk_to_float: out of bound values become +/-8888 or 9999 (curve
+    too sharp) during conversion to float.
+    """
+
+    if pd.api.types.is_numeric_dtype(pks.dtype):
+        return pks.astype(float)
+
+    vals = np.array(pd.to_numeric(pks, errors="coerce"), dtype=float)
+    oob = np.flatnonzero(np.isnan(vals) & pks.notna().to_numpy())
+    txt = pks.iloc[oob].astype(str)
+    vals[oob] = np.select([txt.str.startswith("titra"),   #tion curve too sharp"
+                           txt.str.startswith("<")],
+                          [9999., -8888.],
+                          8888.)
+
+    return pd.Series(vals, index=pks.index, name=pks.name)
+
+
+def _fwf_to_delimited(text:str, colspecs:list, sep:str="\t") -> bytes:
+    """Return the non-blank lines of `text` with the fields given by `colspecs`
+    sliced over the whole buffer at once, right-aligned and joined by `sep`.
+    """
+
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    # one byte per char (chars outside latin-1 become "?"):
+    lines = [line for line in text.encode("latin-1", errors="replace").split(b"\n")
+             if line.strip()]
+    width = max(end for _, end in colspecs)
+    # one row per line, truncated or padded with NULs to width:
+    chars = np.array(lines, dtype=f"S{width}").view(np.uint8).reshape(len(lines), width)
+    blank = ord(" ")
+    chars[chars == 0] = blank
+
+    sep_col = np.full((len(lines), 1), ord(sep), dtype=np.uint8)
+    pieces = []
+    for start, end in colspecs:
+        field = chars[:, start:end]
+        # right-align the fields with trailing blanks (header excepted: its names
+        # are stripped) so that the reader strips them as leading spaces:
+        rows = np.flatnonzero(field[1:, -1] == blank) + 1
+        if rows.size:
+            k = end - start
+            sub = field[rows]
+            last = np.where(sub != blank, np.arange(k), -1).max(axis=1)
+            shifted = (np.arange(k) + last[:, None] + 1) % k
+            field = field.copy()
+            field[rows] = np.take_along_axis(sub, shifted, axis=1)
+        pieces.extend([field, sep_col])
+    pieces[-1] = np.full((len(lines), 1), ord("\n"), dtype=np.uint8)
+
+    return np.concatenate(pieces, axis=1).tobytes()
+
+
+def fwf_to_df(src:Union[str, TextIO], colspecs:list, cols:list, is_pko:bool=True) -> pd.DataFrame:
+    """Parse the fixed-width text of a pK.out-like file (path or text buffer) with the
+    column specs and header fields from get_col_specs or get_sumcrg_col_specs.
+    Same output as pd.read_fwf(src, colspecs=colspecs, index_col=0) with renamed
+    columns, but the fields are sliced in bulk and parsed by the C csv reader.
+    """
+
+    if isinstance(src, (str, Path)):
+        text = Path(src).read_text()
+    else:
+        text = src.read()
+
+    df = pd.read_csv(BytesIO(_fwf_to_delimited(text, colspecs)),
+                     encoding="latin-1",
+                     sep="\t",
+                     index_col=0,
+                     skipinitialspace=True,
+                     quoting=csv.QUOTE_NONE)
+    if isinstance(df.index.name, str):
+        df.index.name = df.index.name.strip()
+    df.columns = df.columns.str.strip()
+    # rm 1st col that became index:
+    df.rename(columns=dict(zip(df.columns, cols[1:])), inplace=True)
+    if is_pko:
+        # convert pK/Em vals to float:
+        df["pKa/Em"] = pks_to_float(df["pKa/Em"])
+
+    return df
+
+
 def fout_df(out_fp:str, collated:bool=False, titr_type:str="ph", kind:str="pk.out") -> Union[pd.DataFrame, None]:
     """Load a file that has the same format as 'pK.out'; it can be either
     a single 'pK.out', 'sum_crg.out' file or a file that is collation of many:
@@ -264,22 +366,34 @@ def fout_df(out_fp:str, collated:bool=False, titr_type:str="ph", kind:str="pk.ou
     if is_pko:
         colspecs, cols = get_col_specs(collated=collated, titr_type=titr)
     else:
-        #get env to get sumcrg_hdr
+        #get bench metadata to get sumcrg_hdr
         if collated:
-            bench = fp.parent.parent
+            sc_hdr = get_sumcrg_hdr(fp.parent.parent)
+        elif fp.parent.parent.name == RUNS_DIR:
+            sc_hdr = get_sumcrg_hdr(fp.parent.parent.parent)
         else:
-            bench = fp.parent
-        sc_hdr = get_sumcrg_hdr(bench)
+            # run folder outside of a bench_dir:
+            with open(fp) as fh:
+                sc_hdr = fh.readline().rstrip("\n")
         colspecs, cols = get_sumcrg_col_specs(collated=collated, titr_type=titr, hdr=sc_hdr)
 
-    df = pd.read_fwf(fp, colspecs=colspecs, index_col=0)
-    # rm 1st col that became index:
-    df.rename(columns=dict(zip(df.columns, cols[1:])), inplace=True)
-    if is_pko:
-        # convert pK/Em vals to float:
-        df["pKa/Em"] = df["pKa/Em"].apply(pk_to_float)
+    return fwf_to_df(fp, colspecs, cols, is_pko=is_pko)
 
-    return df
+
+def iter_book_dirs(book_fpath:str, status:str="c") -> Iterator[str]:
+    """Yield the folder names from book_fp, the Q_BOOK file path, whose status
+    codes match 'status', one line at a time; see get_book_dirs_for_status.
+    """
+
+    book_fp = Pathok(book_fpath)
+    with open(book_fp) as book:
+        for line in book:
+            # select the portion preceding any appended comment
+            rawtxt = line.strip().split("#")[0]
+            fields = rawtxt.split()
+            if len(fields) == 2:
+                if fields[1].lower() == status:
+                    yield fields[0]
 
 
 def get_book_dirs_for_status(book_fpath:str, status:str="c") -> list:
@@ -293,18 +407,7 @@ def get_book_dirs_for_status(book_fpath:str, status:str="c") -> list:
         logger.error("Invalid 'status'; choices are 'c' or 'e'")
         raise ValueError("Invalid 'status'; choices are 'c' or 'e'")
 
-    book_fp = Pathok(book_fpath)
-    book_dirs = []
-    with open(book_fp) as book:
-        for line in book:
-            # select the portion preceding any appended comment
-            rawtxt = line.strip().split("#")[0]
-            fields = rawtxt.split()
-            if len(fields) == 2:
-                if fields[1].lower() == status:
-                    book_dirs.append(fields[0])
-
-    return book_dirs
+    return list(iter_book_dirs(book_fpath, status))
 
 
 def to_pickle(obj:Any, fp:str):
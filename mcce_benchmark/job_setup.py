@@ -39,9 +39,10 @@ Functions:
 
 #...............................................................................
 from argparse import Namespace
-from mcce_benchmark import BENCH, RUNS_DIR
+from mcce_benchmark import BENCH, RUNS_DIR, PDBS_FPRINTS, N_PDBS
 from mcce_benchmark import audit
-from mcce_benchmark.io_utils import Pathok
+from mcce_benchmark.cleanup import delete_mcce_outputs
+from mcce_benchmark.io_utils import Pathok, file_fingerprint
 import logging
 import os
 from pathlib import Path
@@ -88,34 +89,11 @@ def setup_user_runs(args:Namespace) -> None:
     if not runs_dir.exists():
         runs_dir.mkdir()
 
-    for i, fp in enumerate(pdbs_lst):
-        if fp.is_symlink():
-            logger.error("Cannot use a linked file as pdb source.")
-            raise TypeError("Cannot use a linked file as pdb source.")
-        
-        pname = fp.stem
-        # create pdb dir:
-        pd = runs_dir.joinpath(pname.upper())
-        if not pd.is_dir():
-            pd.mkdir()
-
-        fp_dest = pd.joinpath(fp.name)
-        if not fp_dest.exists():
-            shutil.copy(fp, fp_dest, follow_symlinks=False)
-
-        # cd to avoid links with long names:
-        os.chdir(pd)
-        prot = Path("prot.pdb")
-        try:
-            prot.symlink_to(fp.name)
-        except FileExistsError:
-            if not prot.is_symlink() or (prot.resolve().name != fp.name):
-                prot.unlink()
-                prot.symlink_to(fp.name)
-                logger.info(f"Reset soft-linked pdb to prot.pdb for {d.name}")
-        os.chdir("../") # pd.parent: runs_dir)
-
-    os.chdir(curr)
+    if getattr(args, "incremental", False):
+        update_user_runs(runs_dir, pdbs_lst)
+    else:
+        for fp in pdbs_lst:
+            link_user_pdb(runs_dir, fp)
 
     # copy script file:
     dest = runs_dir.joinpath(BENCH.DEFAULT_JOB_SH.name)
@@ -123,17 +101,164 @@ def setup_user_runs(args:Namespace) -> None:
         shutil.copy(BENCH.DEFAULT_JOB_SH, dest)
         logger.info(f"Script file copied: {dest}")
 
-    audit.rewrite_book_file(runs_dir.joinpath(BENCH.Q_BOOK))
+    if not getattr(args, "incremental", False):
+        audit.rewrite_book_file(runs_dir.joinpath(BENCH.Q_BOOK))
     logger.info(f"The data setup in {runs_dir} went beautifully!")
 
     return
 
 
-def setup_expl_runs(bench_dir:str, n_pdbs:int) -> None:
+def link_user_pdb(runs_dir:Path, fp:Path, replace:bool=False) -> Path:
+    """Create the run folder of pdb `fp` in `runs_dir`, copy the pdb therein
+    and soft-link it as "prot.pdb".
+    If `replace` is True, an existing copy of the pdb is overwritten.
+    Return the run folder path.
+    """
+
+    if fp.is_symlink():
+        logger.error("Cannot use a linked file as pdb source.")
+        raise TypeError("Cannot use a linked file as pdb source.")
+
+    pname = fp.stem
+    # create pdb dir:
+    pd = runs_dir.joinpath(pname.upper())
+    if not pd.is_dir():
+        pd.mkdir()
+
+    fp_dest = pd.joinpath(fp.name)
+    if replace or not fp_dest.exists():
+        shutil.copy(fp, fp_dest, follow_symlinks=False)
+
+    # cd to avoid links with long names:
+    curr = Path.cwd()
+    os.chdir(pd)
+    prot = Path("prot.pdb")
+    try:
+        prot.symlink_to(fp.name)
+    except FileExistsError:
+        if not prot.is_symlink() or (prot.resolve().name != fp.name):
+            prot.unlink()
+            prot.symlink_to(fp.name)
+            logger.info(f"Reset soft-linked pdb to prot.pdb for {pd.name}")
+    os.chdir(curr)
+
+    return pd
+
+
+def read_pdbs_fingerprints(runs_dir:Path) -> dict:
+    """Return the dict {pdb dir: (source path, size, mtime_ns, sha256)} saved
+    in <bench_dir>/runs/PDBS_FPRINTS, or an empty dict if the file is not found.
+    """
+
+    fp = Path(runs_dir).joinpath(PDBS_FPRINTS)
+    if not fp.exists():
+        return {}
+
+    fprints = {}
+    with open(fp) as fh:
+        next(fh)  # header
+        for line in fh:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) == 5:
+                d, src, size, mtime, sha = fields
+                fprints[d] = (src, int(size), int(mtime), sha)
+
+    return fprints
+
+
+def write_pdbs_fingerprints(runs_dir:Path, fprints:dict) -> None:
+    """Save the dict {pdb dir: (source path, size, mtime_ns, sha256)} to
+    <bench_dir>/runs/PDBS_FPRINTS.
+    """
+
+    fp = Path(runs_dir).joinpath(PDBS_FPRINTS)
+    with open(fp, "w") as fh:
+        fh.write("PDB\tsource\tsize\tmtime_ns\tsha256\n")
+        for d in sorted(fprints):
+            fh.write("\t".join(str(v) for v in (d, *fprints[d])) + "\n")
+
+    return
+
+
+def update_user_runs(runs_dir:Path, pdbs_lst:list) -> tuple:
+    """Incremental version of the pdbs setup done in `setup_user_runs`.
+    Each source pdb is fingerprinted by (size, mtime, sha256) and compared with
+    the fingerprint saved by the previous incremental setup (or with the copy
+    found in its run folder if there is none):
+      - new pdb: its run folder is created & added to the book as unsubmitted;
+      - changed pdb: the mcce outputs in its run folder are deleted, the new pdb
+        is copied over and the run is requeued, i.e. reset to unsubmitted;
+        if the run is running (state "r"), it is left as is with its previous
+        fingerprint, to be updated by the next setup, & reported;
+      - unchanged pdb: nothing is done, whatever its state in the book.
+    Return a 4-tuple of lists of run folder names: (new, changed, unchanged, running),
+    running: the changed pdbs of running jobs, not updated.
+    """
+
+    runs_dir = Path(runs_dir)
+    book_fp = runs_dir.joinpath(BENCH.Q_BOOK)
+    states = audit.book_states(book_fp) if book_fp.exists() else {}
+    prev_fprints = read_pdbs_fingerprints(runs_dir)
+
+    fprints = dict(prev_fprints)
+    new, changed, unchanged, running = [], [], [], []
+    for fp in pdbs_lst:
+        fp = Path(fp)
+        d = fp.stem.upper()
+        prev = prev_fprints.get(d)
+        if prev is not None and prev[0] == str(fp):
+            fprint = file_fingerprint(fp, previous=prev[1:])
+        else:
+            fprint = file_fingerprint(fp)
+
+        pd = runs_dir.joinpath(d)
+        fp_dest = pd.joinpath(fp.name)
+        if prev is None and fp_dest.exists():
+            # no record: compare with the copy in the run folder
+            dest_size = fp_dest.stat().st_size
+            if dest_size == fprint[0]:
+                prev = (str(fp), *file_fingerprint(fp_dest))
+            else:
+                prev = (str(fp), dest_size, 0, "")
+
+        if prev is None:
+            link_user_pdb(runs_dir, fp)
+            states[d] = " "
+            new.append(d)
+        elif prev[3] != fprint[2]:
+            if states.get(d) == "r":
+                # keep the previous fingerprint: updated once the job is done
+                fprints[d] = prev
+                running.append(d)
+                continue
+            delete_mcce_outputs(pd, del_original_pdb=False)
+            link_user_pdb(runs_dir, fp, replace=True)
+            states[d] = " "
+            changed.append(d)
+        else:
+            if d not in states:
+                states[d] = " "
+            unchanged.append(d)
+
+        fprints[d] = (str(fp), *fprint)
+
+    audit.write_book_states(book_fp, states)
+    write_pdbs_fingerprints(runs_dir, fprints)
+    logger.info(f"Incremental setup: {len(new)} new, {len(changed)} changed (requeued), "
+                + f"{len(unchanged)} unchanged runs.")
+    if running:
+        logger.warning(f"Input changed for {len(running)} running jobs, not updated until "
+                       + f"they are done; rerun the setup then: {running}")
+
+    return new, changed, unchanged, running
+
+
+def setup_expl_runs(bench_dir:str, n_pdbs:int, subset:str = None) -> None:
     """
     Replicate current setup.
     - Create a copy of BENCH_PDBS (packaged data) in <bench_dir>/runs, or a subset
-      of size (1, n_pdbs) if n_pdbs < 120.
+      of size (1, n_pdbs) if n_pdbs < 120, or the cost-based subset named `subset`
+      (see audit.select_pdbs_subset).
     - Soft-link the relevant pdb as "prot.pdb";
     - Copy the "queue book" and default script files (BENCH.BENCH_Q_BOOK, BENCH.DEFAULT_JOB_SH)
       in <bench_dir>/runs;
@@ -152,7 +277,14 @@ def setup_expl_runs(bench_dir:str, n_pdbs:int) -> None:
     if not runs_dir.exists():
         runs_dir.mkdir()
 
-    valid, invalid = audit.list_all_valid_pdbs()
+    if subset is None:
+        valid, invalid = audit.list_all_valid_pdbs()
+    else:
+        if n_pdbs >= N_PDBS:
+            n_pdbs = audit.SUBSET_N_PDBS
+        valid = audit.select_pdbs_subset(subset, n_pdbs)
+        n_pdbs = len(valid)
+
     for i, v in enumerate(valid):
         if i == n_pdbs:
             break
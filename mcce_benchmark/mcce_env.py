@@ -9,12 +9,15 @@ Modified version of ENV class from Stable-MCCE/bin/pdbio.py:
   - Attributes:
     self.runprm: dict
     self.rundir: Path
+
+BenchMeta: per-bench metadata (run.prm.record params, TITR_TYPE, sum_crg.out header
+and titration grid), read in-process once and memoized by bench path and by the
+mtimes of its source files; see get_bench_meta.
 """
 
 from mcce_benchmark import BENCH, RUNS_DIR, SUB1
 import logging
 from pathlib import Path
-import subprocess
 from typing import Union
 
 
@@ -149,7 +152,7 @@ def get_mcce_env_dir(bench_dir:str,
 
     runs_dir = Path(bdir.joinpath(RUNS_DIR))
     for fp in runs_dir.iterdir():
-        if fp.is_dir:
+        if fp.is_dir():
             return fp
 
     return
@@ -174,28 +177,90 @@ def validate_envs(bench_dir1:str, bench_dir2:str,
        Return the 2-tuple from valid_envs: bool, msg.
     """
 
-    env1 = get_run_env(bench_dir1, subcmd=subcmd)
-    env2 = get_run_env(bench_dir2,
-                       subcmd=subcmd,
-                       is_refset=dir2_is_refset)
+    env1 = get_bench_meta(bench_dir1, subcmd=subcmd).env
+    env2 = get_bench_meta(bench_dir2,
+                          subcmd=subcmd,
+                          is_refset=dir2_is_refset).env
 
     return valid_envs(env1, env2)
 
 
-def get_sumcrg_hdr(bench_dir:str) -> str:
+SUMCRG_HDR0 = "  pH           0     1     2     3     4     5     6     7     8     9    10    11    12    13    14"
+
+
+def _mtime(fp:Path) -> Union[int, None]:
+    try:
+        return fp.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class BenchMeta:
+    """Metadata of a set of runs, from one of its run folders:
+      - env: ENV of the run folder; runprm: its run.prm.record params
+      - titr_type: TITR_TYPE
+      - sumcrg_hdr: header line of sum_crg.out, in the first folder having one
+      - titr_grid: titration points of the header
+    """
+
+    def __init__(self, bench_dir:str, subcmd:str = SUB1, is_refset:bool = False):
+        self.bench_dir = bench_dir
+        self.env = get_run_env(bench_dir, subcmd=subcmd, is_refset=is_refset)
+        self.runprm = self.env.runprm
+        self.titr_type = self.runprm.get("TITR_TYPE")
+
+        self.sumcrg_fp = None
+        runs_dir = self.env.rundir.parent
+        for fp in sorted(runs_dir.glob("*/sum_crg.out")):
+            self.sumcrg_fp = fp
+            break
+        self.sumcrg_hdr = ""
+        self.titr_grid = []
+        if self.sumcrg_fp is not None:
+            with open(self.sumcrg_fp) as fh:
+                self.sumcrg_hdr = fh.readline().rstrip("\n")
+            self.titr_grid = [float(x) for x in self.sumcrg_hdr.split()[1:]]
+
+        self.mtimes = self.source_mtimes()
+
+    def source_mtimes(self) -> tuple:
+        """Return the mtimes of the files the metadata is read from."""
+
+        return (_mtime(self.env.rundir.joinpath("run.prm.record")),
+                None if self.sumcrg_fp is None else _mtime(self.sumcrg_fp))
+
+    def __str__(self):
+        return (f"bench_dir: {self.bench_dir}\nTITR_TYPE: {self.titr_type}\n"
+                + f"sum_crg header: {self.sumcrg_hdr!r}\ntitration grid: {self.titr_grid}\n"
+                + str(self.env))
+
+
+# memoized BenchMeta: {(resolved bench path or refset name, subcmd, is_refset): BenchMeta}
+_bench_metas = {}
+
+
+def get_bench_meta(bench_dir:str,
+                   subcmd:str = SUB1,
+                   is_refset:bool = False) -> BenchMeta:
+    """Return the memoized BenchMeta of `bench_dir`; it is re-read if its source files
+    have changed.
+    """
+
+    key = (bench_dir if is_refset else str(Path(bench_dir).resolve()), subcmd, is_refset)
+    meta = _bench_metas.get(key)
+    if meta is None or meta.mtimes != meta.source_mtimes() or meta.sumcrg_fp is None:
+        meta = BenchMeta(bench_dir, subcmd=subcmd, is_refset=is_refset)
+        _bench_metas[key] = meta
+
+    return meta
+
+
+def get_sumcrg_hdr(bench_dir:str) -> Union[str, None]:
    """Used for colspecs -> df.
    Return header if not default."""
 
-   hdr0 = "  pH           0     1     2     3     4     5     6     7     8     9    10    11    12    13    14"
-   def_flds = len(hdr0.strip().split())
-
-   run_dir = get_mcce_env_dir(bench_dir)
-   cmd = f"head -n1 {str(run_dir)}/sum_crg.out"
-   out = subprocess.run(cmd)
-   if isinstance(out, subprocess.CompletedProcess):
-       hdr = out.stdout.splitlines()[0]
-       flds = len(hdr.strip().split())
-       if flds != def_flds:
-           return hdr
+   hdr = get_bench_meta(bench_dir).sumcrg_hdr
+   if hdr and len(hdr.split()) != len(SUMCRG_HDR0.split()):
+       return hdr
 
    return None
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""
+Module: pkadb.py
+
+Compiled form of the experimental pkas of pKaDBv1, BENCH.BENCH_WT (WT_pkas.csv):
+a NumPy `.npz` archive, BENCH.BENCH_WT_DB (WT_pkas.npz), shipped with the package
+next to the csv file, holding:
+  PDB, resid, pka, res_name :: typed columns of the valid pkas, sorted by PDB; resid is
+                               the MCCE residue key, e.g. ASP-A0018_; res_name is the
+                               upper-cased 'Res Name' of the csv;
+  pdbs, starts, ends        :: row-range index: the rows of pdbs[i] are starts[i]:ends[i];
+  __schema__                :: json with the format version & the sha256 of the csv.
+The archive is tied to the csv by its sha256: load_pkadb recompiles it, and saves it if
+its folder is writable, when the csv was modified; after an edit of WT_pkas.csv, the
+updated archive is obtained with compile_pkadb() & shipped with the csv.
+
+Functions:
+ compile_pkadb(csv_fp:Path=BENCH.BENCH_WT, db_fp:Path=BENCH.BENCH_WT_DB, save:bool=True) -> dict
+ load_pkadb(csv_fp:Path=BENCH.BENCH_WT, db_fp:Path=BENCH.BENCH_WT_DB) -> dict
+ pkadb_df(pdbs:list=None, csv_fp:Path=BENCH.BENCH_WT, db_fp:Path=BENCH.BENCH_WT_DB) -> pd.DataFrame
+ pkadb_pdbs(csv_fp:Path=BENCH.BENCH_WT, db_fp:Path=BENCH.BENCH_WT_DB) -> list
+ pkadb_res_types(csv_fp:Path=BENCH.BENCH_WT, db_fp:Path=BENCH.BENCH_WT_DB) -> dict
+"""
+
+from mcce_benchmark import BENCH
+from mcce_benchmark.io_utils import file_fingerprint
+import json
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+PKADB_VERSION = 1
+SCHEMA_KEY = "__schema__"
+COLUMNS = ["PDB", "resid", "pka", "res_name"]
+
+RES_TO_MCCE = {"ARG": "ARG+",
+               "HIS": "HIS+",
+               "LYS": "LYS+",
+               "N-TERM": "NTR+",
+               "ASP": "ASP-",
+               "GLU": "GLU-",
+               "C-TERM": "CTR-",
+               "CYS": "CYS-",
+               "TYR": "TYR-"}
+
+
+def _parse_csv(csv_fp:Path) -> pd.DataFrame:
+    """Return the valid pkas of `csv_fp` in a pandas.DataFrame with columns COLUMNS,
+    sorted by PDB, with unique (PDB, resid) keys: at the position of their first
+    occurrence, with the pka of their last.
+    """
+
+    pkas_df = pd.read_csv(csv_fp,
+                          usecols=["PDB ID", "Res Name", "Chain", "Res ID", "Expt. pKa"],
+                          comment="#",
+                          dtype=str)
+    pkas_df["PDB ID"] = pkas_df["PDB ID"].str.upper()
+    pkas_df["Res Name"] = pkas_df["Res Name"].str.upper()
+    # unparsable values, e.g. '<2.0', are invalid:
+    pkas_df["Expt. pKa"] = pd.to_numeric(pkas_df["Expt. pKa"], errors="coerce")
+    pkas_df = pkas_df.dropna(how="any")
+    pkas_df.sort_values(by="PDB ID", inplace=True, ignore_index=True)
+
+    res = pkas_df["Res Name"].map(RES_TO_MCCE)
+    if res.isna().any():
+        unknown = pkas_df["Res Name"][res.isna()].unique().tolist()
+        logger.error(f"Unknown residue names in {Path(csv_fp).name}: {unknown}")
+        raise KeyError(f"Unknown residue names in {Path(csv_fp).name}: {unknown}")
+
+    df = pd.DataFrame({"PDB": pkas_df["PDB ID"],
+                       "resid": (res + pkas_df["Chain"]
+                                 + pkas_df["Res ID"].astype(int).map("{:04d}_".format)),
+                       "pka": pkas_df["Expt. pKa"],
+                       "res_name": pkas_df["Res Name"]})
+
+    keys = ["PDB", "resid"]
+    last = df.groupby(keys, sort=False)["pka"].transform("last")
+    df = df.assign(pka=last)[~df.duplicated(keys)]
+
+    return df.reset_index(drop=True)
+
+
+def compile_pkadb(csv_fp:Path = BENCH.BENCH_WT, db_fp:Path = BENCH.BENCH_WT_DB,
+                  save:bool = True) -> dict:
+    """Compile the experimental pkas file `csv_fp` into the arrays of the pkas
+    archive (see module docstring); save them to `db_fp` if `save`. Return the arrays.
+    """
+
+    df = _parse_csv(csv_fp)
+    arrays = {"PDB": df.PDB.to_numpy(dtype=str),
+              "resid": df.resid.to_numpy(dtype=str),
+              "pka": df.pka.to_numpy(dtype=np.float64),
+              "res_name": df.res_name.to_numpy(dtype=str)}
+
+    # rows sorted by PDB: each pdb is a contiguous range
+    pdbs, starts, counts = np.unique(arrays["PDB"], return_index=True, return_counts=True)
+    arrays.update(pdbs=pdbs, starts=starts.astype(np.int64), ends=(starts + counts).astype(np.int64))
+
+    schema = {"version": PKADB_VERSION,
+              "csv": Path(csv_fp).name,
+              "sha256": file_fingerprint(csv_fp)[2]}
+    arrays[SCHEMA_KEY] = np.array(json.dumps(schema))
+
+    if save:
+        db_fp = Path(db_fp)
+        tmp_fp = db_fp.with_name(f"_tmp_{db_fp.name}")
+        try:
+            with open(tmp_fp, "wb") as fh:
+                np.savez_compressed(fh, **arrays)
+            tmp_fp.replace(db_fp)
+            logger.info(f"Compiled {Path(csv_fp).name} into {db_fp}")
+        except OSError as e:
+            logger.warning(f"Could not save the compiled pkas to {db_fp}: {e}")
+            tmp_fp.unlink(missing_ok=True)
+
+    return arrays
+
+
+def load_pkadb(csv_fp:Path = BENCH.BENCH_WT, db_fp:Path = BENCH.BENCH_WT_DB) -> dict:
+    """Return the arrays of the compiled experimental pkas (see module docstring);
+    the archive is recompiled if it is missing, of another version, or if its sha256
+    differs from that of `csv_fp`.
+    """
+
+    digest = file_fingerprint(csv_fp)[2]
+    db_fp = Path(db_fp)
+    if db_fp.exists():
+        try:
+            with np.load(db_fp, allow_pickle=False) as npz:
+                schema = json.loads(str(npz[SCHEMA_KEY]))
+                if schema["version"] == PKADB_VERSION and schema["sha256"] == digest:
+                    return {k: npz[k] for k in npz.files}
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"Unreadable compiled pkas {db_fp}: {e}")
+        logger.info(f"Compiled pkas {db_fp.name} out of date with {Path(csv_fp).name}.")
+
+    return compile_pkadb(csv_fp, db_fp)
+
+
+def pkadb_df(pdbs:list = None, csv_fp:Path = BENCH.BENCH_WT,
+             db_fp:Path = BENCH.BENCH_WT_DB) -> pd.DataFrame:
+    """Return the experimental pkas of `pdbs` (default: all) in a pandas.DataFrame
+    with columns PDB, resid (mcce format), pka, res_name; the rows of each pdb are
+    selected with the row-range index.
+    """
+
+    db = load_pkadb(csv_fp, db_fp)
+    if pdbs is None:
+        rows = slice(None)
+    else:
+        sel = np.flatnonzero(np.isin(db["pdbs"], list(pdbs)))
+        rows = np.concatenate([np.arange(db["starts"][k], db["ends"][k]) for k in sel]
+                              + [np.empty(0, dtype=np.int64)])
+
+    return pd.DataFrame({c: db[c][rows] for c in COLUMNS})
+
+
+def pkadb_pdbs(csv_fp:Path = BENCH.BENCH_WT, db_fp:Path = BENCH.BENCH_WT_DB) -> list:
+    """Return the sorted pdb ids with a valid experimental pka."""
+
+    return load_pkadb(csv_fp, db_fp)["pdbs"].tolist()
+
+
+def pkadb_res_types(csv_fp:Path = BENCH.BENCH_WT, db_fp:Path = BENCH.BENCH_WT_DB) -> dict:
+    """Return a dict {pdb id: set of residue types (res_name) with a valid experimental pKa}."""
+
+    db = load_pkadb(csv_fp, db_fp)
+
+    return {pdb: set(db["res_name"][s:e].tolist())
+            for pdb, s, e in zip(db["pdbs"].tolist(), db["starts"], db["ends"])}
@@ -12,19 +12,27 @@ Cli parser with 2 sub-commands with same options:
 """
 
 from argparse import ArgumentParser, RawDescriptionHelpFormatter, Namespace
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from io import StringIO
 from mcce_benchmark import BENCH, ENTRY_POINTS, SUB1, SUB2
 from mcce_benchmark import FILES, ANALYZE_DIR, RUNS_DIR
-from mcce_benchmark.mcce_env import ENV, get_run_env
-from mcce_benchmark import plots
-from mcce_benchmark.cleanup import clear_folder
+from mcce_benchmark.mcce_env import ENV, get_bench_meta
+from mcce_benchmark import artifacts, pkadb, plots, stats, store, sweep, titration
 from mcce_benchmark.io_utils import Pathok, subprocess_run, subprocess
-from mcce_benchmark.io_utils import get_book_dirs_for_status, get_sumcrg_hdr, pk_to_float
-from mcce_benchmark.io_utils import fout_df, to_pickle, tsv_to_df
+from mcce_benchmark.io_utils import get_book_dirs_for_status, iter_book_dirs, get_sumcrg_hdr, pks_to_float
+from mcce_benchmark.io_utils import fout_df, fwf_to_df, get_col_specs, get_sumcrg_col_specs
+from mcce_benchmark.io_utils import file_fingerprint, from_pickle, to_pickle, tsv_to_df
 from mcce_benchmark.scheduling import clear_crontab
+from functools import partial
+import glob
+import hashlib
 import logging
+import mmap
+import os
 import numpy as np
 import pandas as pd
 from pathlib import Path
+import re
 from typing import Union
 import sys
 
@@ -58,12 +66,82 @@ def get_mcce_version(pdbs_dir:str) -> None:
 
     return
 
+def _read_run_lines(fp:Path) -> list:
+    # latin-1 & newline="": text read as-is, byte for byte
+    with open(fp, encoding="latin-1", newline="") as fh:
+        lines = fh.read().split("\n")
+    if lines[-1] == "":
+        lines.pop()
+
+    return lines
+
+
+def collate_run_files(runs_dir:str, fname:str, skip_line=None, records:dict=None) -> list:
+    """Read the `fname` file of all the runs in `runs_dir` with a pool of threads, or
+    get their lines from the analysis cache `records` if given (see update_analysis_cache).
+    Return the list of their lines prefixed with '<run folder name>:', in the order
+    of the sorted runs folders, minus the lines for which `skip_line(line)` is True.
+    """
+
+    if records is None:
+        files = sorted(Path(runs_dir).glob(f"*/{fname}"))
+        with ThreadPoolExecutor() as pool:
+            runs_lines = dict(zip([fp.parent.name for fp in files],
+                                  pool.map(_read_run_lines, files)))
+    else:
+        runs_lines = {name: rec["lines"][fname] for name, rec in sorted(records.items())
+                      if rec["lines"][fname] is not None}
+
+    if not runs_lines:
+        msg = f"No {fname} files in {runs_dir}."
+        logger.error(msg)
+        raise FileNotFoundError(msg)
+
+    lines = []
+    for name, run_lines in runs_lines.items():
+        prefix = f"{name}:"
+        lines.extend(prefix + line for line in run_lines
+                     if skip_line is None or not skip_line(line))
+
+    return lines
+
+
+def _write_collated(all_out:Path, hdr:str, lines:list) -> str:
+    """Write the collated lines under the header; return the file text."""
+
+    text = "".join(f"{line}\n" for line in [hdr] + lines)
+    with open(all_out, "w", encoding="latin-1", newline="") as fh:
+        fh.write(text)
+
+    return text
+
+
+def _sumcrg_skip_line(hdr:str):
+    """Return the function selecting the header & separator lines of sum_crg.out files."""
+
+    titr = hdr.strip().split()[0]
+
+    def skip_line(line:str) -> bool:
+        return "----------" in line or f"  {titr}" in line
+
+    return skip_line
+
+
+def _collated_pko_hdr(titr:str) -> str:
+    return f"PDB  resid@{titr}         pKa/Em  n(slope) 1000*chi2      vdw0    vdw1    tors    ebkb    dsol   offset  pHpK0   EhEm0    -TS   residues   total"
+
+
 # for multi-protein runs
-def collate_all_sumcrg(bench_dir:str, run_env:ENV, titr_type:str="ph") ->None:
+def collate_all_sumcrg(bench_dir:str, run_env:ENV, titr_type:str="ph",
+                       records:dict=None) -> pd.DataFrame:
+    """Collate all sum_crg.out files from 'bench_dir'/runs, into analysis/ALL_SUMCRG,
+    without their header & separator lines; the header of the first file is kept.
+    records (dict, None): analysis cache records, see update_analysis_cache.
+    Return the collated data in a pandas.DataFrame indexed by run folder name.
+    """
 
     bench = Pathok(bench_dir)
     dirpath = bench.joinpath(RUNS_DIR)
-    d = str(dirpath)
 
     # output dir
     analyze = bench.joinpath(ANALYZE_DIR)
@@ -71,41 +149,32 @@ def collate_all_sumcrg(bench_dir:str, run_env:ENV, titr_type:str="ph") ->None:
         analyze.mkdir()
     # out file
     all_out = analyze.joinpath(FILES.ALL_SUMCRG.value)
-    all_out_s = str(all_out)
 
     hdr = get_sumcrg_hdr(bench)
     titr = hdr.strip().split()[0]
+    lines = collate_run_files(dirpath, "sum_crg.out", _sumcrg_skip_line(hdr), records)
+    text = _write_collated(all_out, hdr, lines)
+    logger.info(f"Created {all_out!r}; Can be loaded using pkanalysis.all_pkas_df(bench_dir).")
 
-    ofs = '":"'
-    RUNS = '"/' + RUNS_DIR + '/"'
-    cmd = "awk 'BEGIN{OFS=" + ofs + "}{idx = index(FILENAME," + RUNS + ")+6; out = substr(FILENAME, idx, length(FILENAME)-11-idx); print out, $0}' "
-    cmd = cmd + f"{d}/*/sum_crg.out | sed -e '/----------/d' -e '/  {titr}/d' > {d}/all_out; "
-    cmd = cmd + f"sed '1 i\{hdr}' {d}/all_out > {all_out_s};"  # add header back
-    cmd = cmd + f" /bin/rm {d}/all_out"
-
-    data = subprocess_run(cmd, capture_output=False) #check=True)
-    if isinstance(data, subprocess.CompletedProcess):
-        logger.info(f"Created {all_out!r}; Can be loaded using pkanalysis.all_pkas_df(bench_dir).")
-    else:
-        logger.exception(f"Subprocess error")
-        raise data # data holds the error obj
+    colspecs, cols = get_sumcrg_col_specs(collated=True, titr_type=titr, hdr=hdr)
 
-    return
+    return fwf_to_df(StringIO(text), colspecs, cols, is_pko=False)
 
 
-def collate_all_pkas(bench_dir:str, titr_type:str="ph") ->None:
+def collate_all_pkas(bench_dir:str, titr_type:str="ph", records:dict=None) -> pd.DataFrame:
     """Collate all pK.out files from 'bench_dir'/runs, into analysis/ALL_PKAS.
        Retain the same fixed-witdth format => extension = ".out".
        This file can be loaded using either one of these functions:
          - pkanalysis.all_pkas_df(bench_dir)
          - pkanalysis.fout_df(pko_fp, collated=True)
     titr_type (str, 'ph'): titration type, needed for formating; one of ['ph', 'eh', 'ch']
+    records (dict, None): analysis cache records, see update_analysis_cache.
+    Return the collated data in a pandas.DataFrame, as loaded by all_pkas_df(bench_dir,
+    reduced_ok=False).
     """
 
     bench = Pathok(bench_dir)
-    bench_s = str(bench)
     d = Pathok(bench.joinpath(RUNS_DIR))
-    dirpath = str(d)
 
     # output dir
     analyze = bench.joinpath(ANALYZE_DIR)
@@ -113,29 +182,21 @@ def collate_all_pkas(bench_dir:str, titr_type:str="ph") ->None:
         analyze.mkdir()
     # out file
     all_out = analyze.joinpath(FILES.ALL_PKAS.value)
-    all_out_s = str(all_out)
 
     titr = titr_type.lower()
     if titr not in ["ph", "eh", "ch"]:
         raise ValueError("titr_type must be one of ['ph', 'eh', 'ch']")
     titr = titr.upper()
 
-    pko_hdr = f"PDB  resid@{titr}         pKa/Em  n(slope) 1000*chi2      vdw0    vdw1    tors    ebkb    dsol   offset  pHpK0   EhEm0    -TS   residues   total"
-    # offset = len("pk.out") + 4 = 10
-    ofs = '":"'
-    RUNS = '"/' + RUNS_DIR + '/"'
-    cmd = "awk 'BEGIN{OFS=" + ofs + "}{idx = index(FILENAME," + RUNS + ")+6; out = substr(FILENAME, idx, length(FILENAME)-6-idx); print out, $0}' "
-    cmd = cmd + f"{dirpath}/*/pK.out | sed '/total$/d' > {dirpath}/all_pkas; "
-    cmd = cmd + f"sed '1 i\{pko_hdr}' {dirpath}/all_pkas > {all_out_s};"  # add header back
-    cmd = cmd + f" /bin/rm {dirpath}/all_pkas"
-
-    data = subprocess_run(cmd, capture_output=False) #check=True)
-    if isinstance(data, subprocess.CompletedProcess):
-        logger.info(f"Created {all_out!r};\n\tCan be loaded using pkanalysis.fout_df(allfp, collated=True, titr_type='ph').")
-    else:
-        logger.exception(f"Subprocess error")
-        raise data # data holds the error obj
-    return
+    pko_hdr = _collated_pko_hdr(titr)
+    # drop the header line of each file:
+    lines = collate_run_files(d, "pK.out", lambda line: line.endswith("total"), records)
+    text = _write_collated(all_out, pko_hdr, lines)
+    logger.info(f"Created {all_out!r};\n\tCan be loaded using pkanalysis.fout_df(allfp, collated=True, titr_type='ph').")
+
+    colspecs, cols = get_col_specs(collated=True, titr_type=titr)
+
+    return fwf_to_df(StringIO(text), colspecs, cols)
 
 
 def get_oob_mask(df):
@@ -189,17 +250,19 @@ def all_pkas_df(path:str, titr_type:str="ph", reduced_ok=True) -> Union[pd.DataF
     return fout_df(allfp, collated=True, titr_type=titr)
 
 
-def extract_oob_pkas(bench_dir:str):
-    """Load all_pkas.tsv into df;
+def extract_oob_pkas(bench_dir:str, allout_df:pd.DataFrame = None) -> pd.DataFrame:
+    """Load all_pkas.tsv into df, unless the collated pkas are given in `allout_df`;
     Extract and save out of bounds values.
     Rewrite all_pkas.tsv without them.
+    Return the pkas without the out of bounds values.
     """
 
     bench = Path(bench_dir)
-    # Load all_pkas file, all_pkas.out:
-    allout_df = all_pkas_df(bench)
+    if allout_df is None:
+        # Load all_pkas file, all_pkas.out:
+        allout_df = all_pkas_df(bench)
     # convert pK/Em vals to float:
-    allout_df["pKa/Em"] = allout_df["pKa/Em"].apply(pk_to_float)
+    allout_df["pKa/Em"] = pks_to_float(allout_df["pKa/Em"])
 
     #extract oob if any
     msk = get_oob_mask(allout_df)
@@ -217,11 +280,33 @@ def extract_oob_pkas(bench_dir:str):
     else:
         logger.info(f"No out of bound pKa values in {FILES.ALL_PKAS.value}")
 
-    return
+    return allout_df
+
 
+def run_log_times(run_log:str) -> list:
+    """Return the [pdb, step, seconds] rows of the 'Total time' lines of a run.log
+    file, with the same fields as the former awk extraction:
+      awk '/Total time/ {len=length(FILENAME); print substr(FILENAME,len-11,4), $4, NF-1}'
+    """
 
-def all_run_times_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
-    """Return mcce step times from run.log saved to a tab-separated file."""
+    fp = Path(run_log)
+    pdb = fp.parent.name[-4:]
+    rows = []
+    for line in _read_run_lines(fp):
+        if "Total time" not in line:
+            continue
+        fields = line.split()
+        step = fields[3] if len(fields) > 3 else ""
+        row = f"{pdb} {step} {len(fields)-1}".replace("MC:", "step4", 1)
+        rows.append(row.split())
+
+    return rows
+
+
+def all_run_times_to_tsv(pdbs_dir:str, overwrite:bool=True, records:dict=None) -> None:
+    """Return mcce step times from run.log saved to a tab-separated file.
+    records (dict, None): analysis cache records, see update_analysis_cache.
+    """
 
     pdbs = Pathok(pdbs_dir)
     # output dir
@@ -229,12 +314,11 @@ def all_run_times_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
     if not analyze.exists():
         analyze.mkdir()
 
-    cmd = "awk '/Total time/ {len=length(FILENAME); print substr(FILENAME,len-11,4), $4, NF-1}' "
-    cmd = cmd + str(pdbs) + "/*/run.log | sed 's/MC:/step4/'"
-    out = subprocess_run(cmd)
-    if out is subprocess.CalledProcessError:
-        logger.error("Error fetching run times.")
-        return
+    if records is None:
+        runs_times = [run_log_times(fp) for fp in sorted(pdbs.glob("*/run.log"))]
+    else:
+        runs_times = [rec["times"] for _, rec in sorted(records.items())
+                      if rec["times"] is not None]
 
     fp = analyze.joinpath(FILES.RUN_TIMES.value)
     if fp.exists():
@@ -244,7 +328,7 @@ def all_run_times_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
             #logger.info(f"File already exists: {fp}")
             return
 
-    time_list = ["\t".join(line.split()) + "\n" for line in out.stdout.splitlines()]
+    time_list = ["\t".join(row) + "\n" for rows in runs_times for row in rows]
     with open(fp, "w") as o:
         o.writelines(["PDB\tstep\tseconds\n"])
         o.writelines(time_list)
@@ -252,31 +336,74 @@ def all_run_times_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
     return
 
 
+# fixed columns of step2_out.pdb lines: resName[17:20], chainID+resSeq+confNum[21:30]
+# e.g. "ATOM      1  CA  NTR A0001_001  25.408 ..." -> "NTR", "A0001_001"
+_STEP2_LINE = re.compile(rb"^.{17}(.{3}).(.{9})", re.MULTILINE)
+# memoized scans: {resolved path: fingerprint}, {sha256: counts}
+_step2_fprints = {}
+_step2_counts = {}
+
+
+def scan_step2_out(step2_out_path:str) -> dict:
+    """Return the counts from a step2_out.pdb file in a dict with keys:
+      'confs': number of conformers, i.e. of runs of identical conformer ids;
+      'res': number of residues, i.e. of runs of identical (resName, chain+resSeq),
+             termini excluded;
+      'confs_per_res': {resName+chain+resSeq: number of distinct conformer ids}.
+    The file is read once via mmap; the counts are memoized per file fingerprint.
+    """
+
+    fp = Path(step2_out_path).resolve()
+    fprint = file_fingerprint(fp, _step2_fprints.get(fp))
+    _step2_fprints[fp] = fprint
+    if fprint[2] in _step2_counts:
+        return _step2_counts[fprint[2]]
+
+    n_confs, n_res = 0, 0
+    confs_per_res = {}
+    prev_conf, prev_res = None, None
+    if fprint[0]:
+        with open(fp, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for m in _STEP2_LINE.finditer(mm):
+                resname, conf = m.group(1, 2)
+                new_conf = conf != prev_conf
+                if new_conf:
+                    n_confs += 1
+                    prev_conf = conf
+                res = (resname, conf[:5])
+                new_res = res != prev_res
+                if new_res:
+                    if resname not in (b"NTR", b"CTR"):
+                        n_res += 1
+                    prev_res = res
+                if new_conf or new_res:
+                    confs_per_res.setdefault((resname + conf[:5]).decode(), set()).add(conf)
+
+    counts = {"confs": n_confs,
+              "res": n_res,
+              "confs_per_res": {r: len(c) for r, c in confs_per_res.items()},
+             }
+    _step2_counts[fprint[2]] = counts
+    if not n_confs:
+        logger.info(f"No count from step2_out.pdb in {fp.parent.name}")
+
+    return counts
+
+
 def get_step2_count(step2_out_path:str, kind:str) -> int:
     """Return the count of items given by `kind` from a step2_out.pdb file. """
 
-    if kind == "res":
-        cmd = "awk '{print $4, substr($5,1,5)}' " + f"{step2_out_path} |uniq|sed -e '/^NTR/d; /^CTR/d'|wc -l"
-    elif kind == "confs":
-        cmd = "awk '{print $5}' " + f"{step2_out_path} | uniq | wc -l"
-    else:
+    if kind not in ["res", "confs"]:
         logger.error(f"kind must be one of ['res','confs']; Given: {kind}.")
         raise ValueError(f"kind must be one of ['res','confs']; Given: {kind}.")
 
-    data = subprocess_run(cmd)
-    if isinstance(data, subprocess.SubprocessError):
-        logger.exception(f"Error fetching {kind} count.")
-        raise data
-    elif not data.stdout.strip():
-        logger.info(f"No count from step2_out.pdb in {Path(step2_out_path).parent.name}")
-        return 0
-
-    return int(data.stdout.strip())
+    return scan_step2_out(step2_out_path)[kind]
 
 
-def all_counts_to_tsv(pdbs_dir:str, kind:str, overwrite:bool=True) -> None:
+def all_counts_to_tsv(pdbs_dir:str, kind:str, overwrite:bool=True, records:dict=None) -> None:
     """Save the count of items given by `kind` from step2_out.pdb in all subfolders
     of pdbs_dir to a tab-separated file; format: DIR \t n.
+    records (dict, None): analysis cache records, see update_analysis_cache.
     """
 
     pdbs = Pathok(pdbs_dir)
@@ -304,9 +431,14 @@ def all_counts_to_tsv(pdbs_dir:str, kind:str, overwrite:bool=True) -> None:
             return
 
     count_list = []
-    for dp in pdbs.glob("./*/step2_out.pdb"):
-        N = get_step2_count(str(dp), kind=kind)
-        count_list.append(f"{dp.parent.name}\t{N}\n")
+    if records is None:
+        for dp in pdbs.glob("./*/step2_out.pdb"):
+            N = get_step2_count(str(dp), kind=kind)
+            count_list.append(f"{dp.parent.name}\t{N}\n")
+    else:
+        for name, rec in sorted(records.items()):
+            if rec["counts"] is not None:
+                count_list.append(f"{name}\t{rec['counts'][kind]}\n")
 
     with open(fp, "w") as o:
         o.writelines([f"PDB\t{kind}\n"])
@@ -315,7 +447,7 @@ def all_counts_to_tsv(pdbs_dir:str, kind:str, overwrite:bool=True) -> None:
     return
 
 
-def confs_per_res_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
+def confs_per_res_to_tsv(pdbs_dir:str, overwrite:bool=True, records:dict=None) -> None:
     """Save conf per res to tsv. """
 
     pdbs = Pathok(pdbs_dir)
@@ -325,10 +457,10 @@ def confs_per_res_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
         analyze.mkdir()
 
     # confs file:
-    all_counts_to_tsv(pdbs, kind="confs", overwrite=overwrite)
+    all_counts_to_tsv(pdbs, kind="confs", overwrite=overwrite, records=records)
     tsv_count = analyze.joinpath(FILES.CONF_COUNTS.value)
     # res file:
-    all_counts_to_tsv(pdbs, kind="res", overwrite=overwrite)
+    all_counts_to_tsv(pdbs, kind="res", overwrite=overwrite, records=records)
     tsv_res = analyze.joinpath(FILES.RES_COUNTS.value)
 
     df_res = pd.read_csv(tsv_res, sep="\t")
@@ -352,7 +484,7 @@ def confs_per_res_to_tsv(pdbs_dir:str, overwrite:bool=True) -> None:
     return
 
 
-def confs_throughput_to_tsv(pdbs_dir:str, overwrite:bool=True) -> pd.DataFrame:
+def confs_throughput_to_tsv(pdbs_dir:str, overwrite:bool=True, records:dict=None) -> pd.DataFrame:
     """
     Obtain and save the average time & conformer throughput per step in a tab
     separated file, FILES.CONFS_THRUPUT.
@@ -368,7 +500,7 @@ def confs_throughput_to_tsv(pdbs_dir:str, overwrite:bool=True) -> pd.DataFrame:
     tsv_time = analyze.joinpath(FILES.RUN_TIMES.value)
     if tsv_time.exists() and overwrite:
         tsv_time.unlink()
-        all_run_times_to_tsv(pdbs, overwrite=overwrite)
+        all_run_times_to_tsv(pdbs, overwrite=overwrite, records=records)
 
     df_time = pd.read_csv(tsv_time, sep="\t")
     df_time.set_index("PDB", inplace=True)
@@ -378,7 +510,7 @@ def confs_throughput_to_tsv(pdbs_dir:str, overwrite:bool=True) -> pd.DataFrame:
     tsv_count = analyze.joinpath(FILES.CONF_COUNTS.value)
     if tsv_count.exists() and overwrite:
         tsv_count.unlink()
-    all_counts_to_tsv(pdbs, kind="confs", overwrite=overwrite)
+    all_counts_to_tsv(pdbs, kind="confs", overwrite=overwrite, records=records)
 
     df_confs = pd.read_csv(tsv_count, sep="\t")
     df_confs.set_index("PDB", inplace=True)
@@ -399,6 +531,153 @@ def confs_throughput_to_tsv(pdbs_dir:str, overwrite:bool=True) -> pd.DataFrame:
     return
 
 
+ANALYSIS_CACHE = ".cache"   # in <bench_dir>/analysis: one pickle per run
+RUN_FILES = ["pK.out", "sum_crg.out", "step2_out.pdb", "run.log"]
+_RECORD_VERSION = 1
+
+
+def run_fingerprints(run_dir:str, previous:dict=None) -> dict:
+    """Return the fingerprints (size, mtime_ns, sha256) of the RUN_FILES of a run
+    in a dict {file name: fingerprint or None if not found}; a file whose size and
+    mtime_ns match those in `previous` is not re-hashed.
+    """
+
+    previous = previous or {}
+    fprints = {}
+    for fname in RUN_FILES:
+        fp = Path(run_dir).joinpath(fname)
+        if fp.exists():
+            fprints[fname] = file_fingerprint(fp, previous.get(fname))
+        else:
+            fprints[fname] = None
+
+    return fprints
+
+
+def parse_run(run_dir:str, fprints:dict = None) -> dict:
+    """Parse the RUN_FILES of a run into an analysis cache record, a dict with keys:
+      'version', 'fprints': see run_fingerprints;
+      'lines': {'pK.out': lines, 'sum_crg.out': lines}, see collate_run_files;
+      'counts': step2_out.pdb counts, see scan_step2_out;
+      'times': run.log times rows, see run_log_times.
+    A missing file yields None.
+    """
+
+    run_dir = Path(run_dir)
+    if fprints is None:
+        fprints = run_fingerprints(run_dir)
+
+    def parsed(fname, func):
+        if fprints[fname] is None:
+            return None
+        return func(run_dir.joinpath(fname))
+
+    return {"version": _RECORD_VERSION,
+            "fprints": fprints,
+            "lines": {fname: parsed(fname, _read_run_lines) for fname in ["pK.out", "sum_crg.out"]},
+            "counts": parsed("step2_out.pdb", scan_step2_out),
+            "times": parsed("run.log", run_log_times),
+           }
+
+
+def refresh_run_record(run_dir:Path, rec_fp:Path) -> tuple:
+    """Load the analysis cache record of a run from `rec_fp` and parse the run
+    anew if its RUN_FILES contents changed; save the record if updated.
+    Return a 2-tuple: (record or None if the run has no RUN_FILES, parsed:bool).
+    """
+
+    rec = None
+    if rec_fp.exists():
+        try:
+            rec = from_pickle(rec_fp)
+        except Exception:
+            logger.warning(f"Unreadable analysis cache record: {rec_fp.name}")
+        if rec is not None and rec.get("version") != _RECORD_VERSION:
+            rec = None
+
+    fprints = run_fingerprints(run_dir, rec["fprints"] if rec is not None else None)
+    if not any(fprints.values()):
+        return None, False
+
+    parsed = False
+    if rec is None or fprints != rec["fprints"]:
+        hashes = {f: fprints[f] and fprints[f][2] for f in RUN_FILES}
+        if rec is None or hashes != {f: rec["fprints"][f] and rec["fprints"][f][2]
+                                     for f in RUN_FILES}:
+            rec = parse_run(run_dir, fprints)
+            parsed = True
+        else:
+            # same contents, new mtimes:
+            rec["fprints"] = fprints
+        tmp_fp = rec_fp.with_suffix(".tmp")
+        to_pickle(rec, tmp_fp)
+        tmp_fp.replace(rec_fp)
+
+    return rec, parsed
+
+
+def update_analysis_cache(bench_dir:str, n_jobs:int = 1) -> dict:
+    """Update the per-run records in <bench_dir>/analysis/.cache: only the runs whose
+    RUN_FILES are new or changed (fingerprints) are parsed; the records of runs no
+    longer in <bench_dir>/runs are deleted.
+    n_jobs (int, 1): number of processes sharing the runs fingerprinting & parsing.
+    Return the records of all the runs: {run folder name: record}.
+    """
+
+    bench = Pathok(bench_dir)
+    runs_dir = bench.joinpath(RUNS_DIR)
+    cache_dir = bench.joinpath(ANALYZE_DIR, ANALYSIS_CACHE)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    run_dirs = [d for d in sorted(runs_dir.iterdir())
+                if d.is_dir() and not d.name.startswith(".")]
+    rec_fps = [cache_dir.joinpath(f"{d.name}.pickle") for d in run_dirs]
+
+    if n_jobs > 1 and len(run_dirs) > 1:
+        chunksize = max(1, len(run_dirs) // (n_jobs * 4))
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(refresh_run_record, run_dirs, rec_fps, chunksize=chunksize))
+    else:
+        results = list(map(refresh_run_record, run_dirs, rec_fps))
+
+    records = {}
+    n_parsed = 0
+    for run_dir, (rec, parsed) in zip(run_dirs, results):
+        if rec is not None:
+            records[run_dir.name] = rec
+            n_parsed += parsed
+
+    for rec_fp in cache_dir.glob("*.pickle"):
+        if rec_fp.stem not in records:
+            rec_fp.unlink()
+
+    logger.info(f"Analysis cache: {n_parsed} of {len(records)} runs (re)parsed.")
+
+    return records
+
+
+def records_to_frames(records:dict) -> tuple:
+    """Return the counts (PDB, confs, res) and times (PDB, step, seconds) of the
+    analysis cache records as pandas.DataFrames, in run folder order.
+    """
+
+    counts = [{"PDB": name, "confs": rec["counts"]["confs"], "res": rec["counts"]["res"]}
+              for name, rec in sorted(records.items()) if rec["counts"] is not None]
+    counts_df = pd.DataFrame(counts, columns=["PDB", "confs", "res"]).set_index("PDB")
+
+    times = [row for _, rec in sorted(records.items()) if rec["times"] is not None
+             for row in rec["times"]]
+    times_df = pd.DataFrame(times, columns=["PDB", "step", "seconds"])
+    try:
+        if times_df.seconds.isna().any():
+            raise ValueError
+        times_df["seconds"] = pd.to_numeric(times_df.seconds)
+    except (ValueError, TypeError):
+        logger.warning("Incomplete or non-numeric run times: kept as text.")
+
+    return counts_df, times_df
+
+
 def pct_completed(book_fpath:str) -> float:
     """Return the pct of runs that are completed or finished with error."""
 
@@ -420,36 +699,85 @@ def pct_completed(book_fpath:str) -> float:
     return pct
 
 
-def job_pkas_to_dict(book_fpath:str) -> dict:
+PKAS_KEYS = ["PDB", "resid"]
+
+
+def _unique_keys(df:pd.DataFrame, col:str) -> pd.DataFrame:
+    """Return `df` with unique PKAS_KEYS as a dict built row by row would have them:
+    at the position of their first occurrence, with the value of their last.
+    """
+
+    if not df.duplicated(PKAS_KEYS).any():
+        return df
+
+    last = df[~df.duplicated(PKAS_KEYS, keep="last")].set_index(PKAS_KEYS)[col]
+    df = df[~df.duplicated(PKAS_KEYS, keep="first")].copy()
+    df[col] = last.reindex(pd.MultiIndex.from_frame(df[PKAS_KEYS])).to_numpy()
+
+    return df
+
+
+def pkas_dict_to_df(pkas:dict, col:str = "pka") -> pd.DataFrame:
+    """Return a pkas dict {(pdb, resid): pka} as a pandas.DataFrame with columns
+    PDB, resid, `col`.
+    """
+
+    df = pd.DataFrame(list(pkas.keys()), columns=PKAS_KEYS, dtype=object)
+    df[col] = list(pkas.values())
+
+    return df
+
+
+def pkas_df_to_dict(pkas_df:pd.DataFrame, col:str = "pka") -> dict:
+    """Return a pkas frame with columns PDB, resid, `col` as a dict {(pdb, resid): pka}."""
+
+    return dict(zip(zip(pkas_df.PDB, pkas_df.resid), pkas_df[col]))
+
+
+def _allout_pkas(allout_df:pd.DataFrame) -> pd.DataFrame:
+    """Return the pkas of a collated pK.out frame with columns PDB, resid (NTG -> NTR), pka."""
+
+    c_resid, c_pk = allout_df.columns[:2]
+
+    return pd.DataFrame({"PDB": allout_df.index.astype(str),
+                         "resid": allout_df[c_resid].astype(str).str.replace(r"^NTG", "NTR", regex=True),
+                         "pka": allout_df[c_pk]}).reset_index(drop=True)
+
+
+def job_pkas_to_df(book_fpath:str, allout_df:pd.DataFrame = None) -> pd.DataFrame:
     """
     Uses the 'q-book' file to retrieve COMPLETED jobs, together with all_pks.out
     instead of iterating over subfolders (which may not be there.)
 
     Origin: pkanalysis.py/read_calculated_pkas
     Canonical dir struc: book_fpath points to <benchmark_dir>/runs/book.txt
-    Uses <bench_dir>/analysis/all_pkas.out
+    Uses <bench_dir>/analysis/all_pkas.out, unless its in bounds pkas are given
+    in `allout_df`.
+    Return a pandas.DataFrame with columns PDB, resid (NTG -> NTR), pka, in book order.
     """
 
     book_fp = Pathok(book_fpath)
     completed_dirs = get_book_dirs_for_status(book_fp) # default 'c'
 
-    calc_pkas = {}
-    all_out_fp = book_fp.parent.parent.joinpath(ANALYZE_DIR, FILES.ALL_PKAS.value)
+    if allout_df is None:
+        all_out_fp = book_fp.parent.parent.joinpath(ANALYZE_DIR, FILES.ALL_PKAS.value)
+        # all pkas df: all 'in bounds' pk values if tsv version exists; floats
+        allout_df = all_pkas_df(all_out_fp)
+    df = _allout_pkas(allout_df)
+    # book order of the completed dirs, then file order:
+    order = pd.Categorical(df.PDB, categories=list(dict.fromkeys(completed_dirs)), ordered=True)
+    df = df[order.codes >= 0]
+    df = df.iloc[np.argsort(order.codes[order.codes >= 0], kind="stable")]
 
-    # all pkas df: all 'in bounds' pk values if tsv version exists; floats
-    allout_df = all_pkas_df(all_out_fp)
-    c_resid, c_pk = allout_df.columns[:2]
+    return _unique_keys(df, "pka").reset_index(drop=True)
 
-    for dir in completed_dirs:
-        pk_df = allout_df.loc[dir]      # filter for this dir
-        for r, row in pk_df.iterrows():
-            resid = row[c_resid]
-            if resid.startswith("NTG"):
-                resid = "NTR" + resid[3:]
-            key = (dir, resid)
-            calc_pkas[key] = row[c_pk]
 
-    return calc_pkas
+def job_pkas_to_dict(book_fpath:str, allout_df:pd.DataFrame = None) -> dict:
+    """Return the calculated pkas of the COMPLETED jobs in a dict {(pdb, resid): pka};
+    see job_pkas_to_df.
+    """
+
+    return pkas_df_to_dict(job_pkas_to_df(book_fpath, allout_df))
 
 
 def to_float(value:str):
@@ -468,38 +796,44 @@ def to_upper(value:str):
     return str(value).upper()
 
 
-def experimental_pkas_to_dict() -> dict:
+def experimental_pkas_to_df(pdbs:list = None) -> pd.DataFrame:
     """Origin: pkanalysis.py/read_experiment_pkas
-    Uses package resources BENCH.BENCH_WT.
-    """
-
-    res_to_mcce = {"ARG": "ARG+",
-                   "HIS": "HIS+",
-                   "LYS": "LYS+",
-                   "N-TERM": "NTR+",
-                   "ASP": "ASP-",
-                   "GLU": "GLU-",
-                   "C-TERM": "CTR-",
-                   "CYS": "CYS-",
-                   "TYR": "TYR-"}
-
-    pkas_df = pd.read_csv(BENCH.BENCH_WT,
-                          usecols=["PDB ID", "Res Name", "Chain", "Res ID", "Expt. pKa"],
-                          comment="#",
-                          converters={"PDB ID":to_upper,
-                                      "Res Name":to_upper,
-                                      "Expt. pKa": to_float,
-                                     },
-                          ).dropna(how="any")
-    pkas_df.sort_values(by="PDB ID", inplace=True, ignore_index=True)
-
-    expl_pkas = {}
-    for _, row in pkas_df.iterrows():
-        key = (row["PDB ID"],
-               f'{res_to_mcce[row["Res Name"]]}{row["Chain"]}{int(row["Res ID"]):04d}_')
-        expl_pkas[key] = row["Expt. pKa"]
-
-    return expl_pkas
+    Uses package resources BENCH.BENCH_WT, compiled in BENCH.BENCH_WT_DB (see pkadb.py).
+    Return a pandas.DataFrame with columns PDB, resid (mcce format), pka, for the
+    proteins in `pdbs` if given.
+    """
+
+    return pkadb.pkadb_df(pdbs)[PKAS_KEYS + ["pka"]]
+
+
+def experimental_pkas_to_dict() -> dict:
+    """Return the experimental pkas in a dict {(pdb, resid): pka}; see experimental_pkas_to_df."""
+
+    return pkas_df_to_dict(experimental_pkas_to_df())
+
+
+def match_pkas_df(calc_df:pd.DataFrame, ref_df:pd.DataFrame) -> pd.DataFrame:
+    """Return the pkas of `ref_df` in the proteins of `calc_df` matched with their
+    calculated values in a pandas.DataFrame with columns key (<pdb>/<resid>), calc, ref.
+    Both frames have columns PDB, resid, pka and unique (PDB, resid) keys.
+    Missing calculated pkas default to the titration bounds according to the charge
+    sign in resid: 0.0 for "-", 14.0 for "+".
+    """
+
+    ref = ref_df[ref_df.PDB.isin(calc_df.PDB.unique())]
+    df = ref.merge(calc_df, on=PKAS_KEYS, how="left", suffixes=("_ref", "_calc"))
+
+    missing = df.pka_calc.isna() & ~df.set_index(PKAS_KEYS).index.isin(
+        pd.MultiIndex.from_frame(calc_df[PKAS_KEYS]))
+    sign = df.resid.str[3]
+    calc = df.pka_calc.where(~missing, np.select([sign == "-", sign == "+"], [0.0, 14.0], np.nan))
+    bad = missing & ~sign.isin(["-", "+"])
+    if bad.any():
+        logger.error(f"Parsing error of job pKas for {df[bad][PKAS_KEYS].values.tolist()}")
+
+    return pd.DataFrame({"key": df.PDB + "/" + df.resid,
+                         "calc": calc.to_numpy(),
+                         "ref": df.pka_ref.to_numpy()})
 
 
 def match_pkas(calc_pkas:dict, expl_pkas:dict) -> list:
@@ -508,24 +842,63 @@ def match_pkas(calc_pkas:dict, expl_pkas:dict) -> list:
     (id=<pdb>/<res>, calculated pka, experimental pka).
     """
 
-    calculated_ids = list(set([key[0] for key in calc_pkas]))
-    pkas = []
-    for key in expl_pkas:
-        if key[0] not in calculated_ids:
-            continue
+    matched_df = match_pkas_df(pkas_dict_to_df(calc_pkas), pkas_dict_to_df(expl_pkas))
 
-        if key in calc_pkas:
-            calc_pka = calc_pkas[key]
-        elif key[1][3] == "-":
-            calc_pka = 0.0
-        elif key[1][3] == "+":
-            calc_pka = 14.0
-        else:
-            logger.error(f"Parsing error of job pKas for {key}")
+    return list(matched_df.itertuples(index=False, name=None))
+
+
+def match_pkas_many(calc_dfs:dict, ref_df:pd.DataFrame) -> pd.DataFrame:
+    """Match the pkas of several sets, `calc_dfs`: {set name: pkas df}, with the
+    reference pkas `ref_df` in one join.
+    Return a pandas.DataFrame with columns set, key, calc, ref; the rows of each set
+    are those of match_pkas_df(calc_dfs[set], ref_df).
+    """
+
+    names = list(calc_dfs)
+    calc = pd.concat([df[PKAS_KEYS + ["pka"]] for df in calc_dfs.values()],
+                     keys=names, names=["set", None]).reset_index(level=0)
+    calc["set"] = pd.Categorical(calc["set"], categories=names, ordered=True)
+
+    # the ref pkas of the proteins of each set, in ref order within a set:
+    set_pdbs = calc[["set", "PDB"]].drop_duplicates()
+    df = ref_df.merge(set_pdbs, on="PDB").sort_values("set", kind="stable")
+    df = df.merge(calc, on=["set"] + PKAS_KEYS, how="left", suffixes=("_ref", "_calc"), indicator=True)
+
+    missing = (df["_merge"] == "left_only").to_numpy()
+    sign = df.resid.str[3]
+    pka_calc = df.pka_calc.where(~missing, np.select([sign == "-", sign == "+"], [0.0, 14.0], np.nan))
+    bad = missing & ~sign.isin(["-", "+"])
+    if bad.any():
+        logger.error(f"Parsing error of job pKas for {df[bad][['set'] + PKAS_KEYS].values.tolist()}")
+
+    return pd.DataFrame({"set": df["set"].to_numpy(),
+                         "key": df.PDB + "/" + df.resid,
+                         "calc": pka_calc.to_numpy(),
+                         "ref": df.pka_ref.to_numpy()})
+
+
+def pkas_stats_matrix(matches:pd.DataFrame, within:tuple=(1, 2, 3)) -> pd.DataFrame:
+    """Return the stats of the matched pkas of several sets, `matches` as output by
+    match_pkas_many, per set, for all residues ("ALL") and per residue type:
+    N, mean_delta & rmsd (of |calc - ref|, as in matched_pkas_stats), and the
+    fraction of |calc - ref| <= each value in `within`.
+    """
 
-        pkas.append(("{}/{}".format(*key), calc_pka, expl_pkas[key]))
+    delta = (matches.calc - matches.ref).abs()
+    df = pd.DataFrame({"set": matches["set"],
+                       "res": matches.key.str.split("/").str[1].str[:3],
+                       "delta": delta, "delta2": delta**2})
+    for w in within:
+        df[f"within_{w}"] = (delta <= w).astype(float)
 
-    return pkas
+    aggs = {"N": ("delta", "size"), "mean_delta": ("delta", "mean"), "rmsd": ("delta2", "mean")}
+    aggs.update({f"within_{w}": (f"within_{w}", "mean") for w in within})
+    per_res = df.groupby(["set", "res"], observed=True).agg(**aggs)
+    all_res = df.assign(res="ALL").groupby(["set", "res"], observed=True).agg(**aggs)
+    stats = pd.concat([all_res, per_res]).sort_index(level="set", kind="stable", sort_remaining=False)
+    stats["rmsd"] = np.sqrt(stats["rmsd"])
+
+    return stats
 
 
 def matched_pkas_to_csv(fpath:str, matched_pkas:list, kind:str=SUB1) -> None:
@@ -710,91 +1083,500 @@ def res_outlier_count(matched_fp:str,
     return out_df
 
 
-def analyze_runs(bench_dir:Path, subcmd:str):
-    """Create all analysis output files."""
+class AnalysisData:
+    """Data shared by the builders of the analysis artifacts of a set of runs (see
+    analysis_nodes): the set metadata, the analysis cache records and the analysis
+    tables; a table not built in the same session is loaded from its analysis file.
+    expl_df: the experimental pkas if already loaded, e.g. shared by analyze_many.
+    """
 
-    bench = Pathok(bench_dir)
-    # Get current set env; may need more than titr:
-    env = get_run_env(bench, subcmd=subcmd)
-    titr = env.runprm["TITR_TYPE"]
+    def __init__(self, bench_dir:str, subcmd:str, n_jobs:int = 1, expl_df:pd.DataFrame = None):
+        self.bench = Pathok(bench_dir)
+        self.subcmd = subcmd
+        meta = get_bench_meta(self.bench, subcmd=subcmd)
+        self.env = meta.env
+        self.titr = meta.titr_type
+        self.pdbs = self.bench.joinpath(RUNS_DIR)
+        self.book_fp = self.pdbs.joinpath(BENCH.Q_BOOK)
+        self.analyze = self.bench.joinpath(ANALYZE_DIR)
+        self.analyze.mkdir(exist_ok=True)
+
+        logger.info(f"Updating the analysis cache of parsed runs.")
+        self.records = update_analysis_cache(self.bench, n_jobs=n_jobs)
+        self.tables = {}
+        self.expl = expl_df
+
+    def path(self, f:FILES) -> Path:
+        return self.analyze.joinpath(f.value)
+
+    def table(self, name:str) -> pd.DataFrame:
+        if name not in self.tables:
+            self.tables[name] = self._load(name)
+        return self.tables[name]
+
+    def _load(self, name:str) -> pd.DataFrame:
+        if name == "sumcrg":
+            return fout_df(self.path(FILES.ALL_SUMCRG), collated=True, titr_type=self.titr, kind="sumcrg")
+        if name == "all_pkas":
+            return fout_df(self.path(FILES.ALL_PKAS), collated=True, titr_type=self.titr)
+        if name == "all_pkas_inb":
+            # in bounds pkas:
+            return all_pkas_df(self.bench, titr_type=self.titr)
+        if name == "refit":
+            return tsv_to_df(self.path(FILES.ALL_PKAS_REFIT), index_col=0)
+        if name == "pkas":
+            return pkas_dict_to_df(from_pickle(self.path(FILES.JOB_PKAS)))
+        if name == "matches":
+            df = pd.read_csv(self.path(FILES.MATCHED_PKAS))
+            df.columns = ["key", "calc", "ref"]
+            return df
+        if name in ["counts", "times"]:
+            self.tables["counts"], self.tables["times"] = records_to_frames(self.records)
+            return self.tables[name]
+        raise KeyError(f"Unknown analysis table: {name!r}")
+
+
+def _build_all_sumcrg(data:AnalysisData) -> None:
+    data.tables["sumcrg"] = collate_all_sumcrg(data.bench, data.env, titr_type=data.titr,
+                                               records=data.records)
+
+
+def _build_all_pkas(data:AnalysisData) -> None:
+    data.tables["all_pkas"] = collate_all_pkas(data.bench, titr_type=data.titr, records=data.records)
+
+
+def _build_oob(data:AnalysisData) -> None:
+    """Save the out of bounds pkas & the in bounds ones, if any (ALL_PKAS_OOB, ALL_PKAS_TSV)."""
+
+    for f in [FILES.ALL_PKAS_OOB, FILES.ALL_PKAS_TSV]:
+        data.path(f).unlink(missing_ok=True)
+    data.tables["all_pkas_inb"] = extract_oob_pkas(data.bench, data.table("all_pkas").copy())
+
+
+def _build_refit(data:AnalysisData) -> None:
+    data.tables["refit"] = titration.refit_pkas(data.table("sumcrg"), titr_type=data.titr)
+    data.tables["refit"].to_csv(data.path(FILES.ALL_PKAS_REFIT), sep="\t")
+
+
+def _build_job_pkas(data:AnalysisData) -> None:
+    # effective calculated pkas for all completed runs:
+    calc_df = job_pkas_to_df(data.book_fp, data.table("all_pkas_inb"))
+    to_pickle(pkas_df_to_dict(calc_df), data.path(FILES.JOB_PKAS))
+    data.tables["pkas"] = calc_df
 
-    pdbs = bench.joinpath(RUNS_DIR)
-    book_fp = pdbs.joinpath(BENCH.Q_BOOK)
 
-    analyze = bench.joinpath(ANALYZE_DIR)
-    if not analyze.exists():
-        analyze.mkdir()
-    else:
-        clear_folder(analyze)
+def _build_matched_pkas(data:AnalysisData) -> None:
+    expl_df = data.expl if data.expl is not None else experimental_pkas_to_df()
+    data.tables["matches"] = match_pkas_df(data.table("pkas"), expl_df)
+    matched_pkas_to_csv(data.path(FILES.MATCHED_PKAS),
+                        list(data.tables["matches"].itertuples(index=False, name=None)))
 
-    get_mcce_version(pdbs)
 
-    logger.info(f"Collating pK.out and sum_crg.out files.")
-    collate_all_sumcrg(bench, env, titr_type=titr)
-    collate_all_pkas(bench, titr_type=titr)
+def _build_matched_stats(data:AnalysisData) -> None:
+    d_stats = matched_pkas_stats(matched_pkas_to_df(data.path(FILES.MATCHED_PKAS)))
+    logger.info(d_stats["report"])
+    to_pickle(d_stats, data.path(FILES.MATCHED_PKAS_STATS))
 
-    logger.info(f"Saving out of bounds pK values to tsv, if any.")
-    extract_oob_pkas(bench)
 
-    logger.info(f"Calculating conformers and residues counts into tsv files.")
-    all_counts_to_tsv(pdbs, kind="confs", overwrite=True)
-    all_counts_to_tsv(pdbs, kind="res", overwrite=True)
-    all_run_times_to_tsv(pdbs, overwrite=True)
-    confs_per_res_to_tsv(pdbs)
+def _build_store(data:AnalysisData) -> None:
+    names = ["all_pkas", "sumcrg", "refit", "pkas", "counts", "times"]
+    if data.subcmd == SUB1:
+        names.append("matches")
+    tables = {name: data.table(name) for name in names
+              if name != "refit" or str(data.titr).lower() in ["ph", "eh"]}
+    store.write_store(data.bench, tables)
 
-    logger.info(f"Calculating conformers thoughput into tsv files.")
-    confs_throughput_to_tsv(pdbs)
 
-    logger.info(f"Getting calculated pKas to dict.")
-    # effective calculated pkas for all completed runs:
-    calc_pkas = job_pkas_to_dict(book_fp)
+def _plot_confs_tp(data:AnalysisData) -> None:
+    n_complete = len(get_book_dirs_for_status(data.book_fp))
+    plots.plot_conf_thrup(tsv_to_df(data.path(FILES.CONFS_THRUPUT)), n_complete,
+                          data.path(FILES.FIG_CONFS_TP))
 
-    calcpk_fp = analyze.joinpath(FILES.JOB_PKAS.value)
-    to_pickle(calc_pkas, calcpk_fp)
 
-    if subcmd == SUB1:
-        logger.info(f"Getting experimental pKas to dict.")
-        expl_pkas = experimental_pkas_to_dict()
-        #calc_pkas: done
+def _plot_res_analysis(data:AnalysisData) -> None:
+    plots.plot_res_analysis(list(data.table("matches").itertuples(index=False, name=None)),
+                            data.path(FILES.FIG_FIT_PER_RES))
 
-        logger.info(f"Matching the pkas and saving list to csv file.")
-        matched_pkas = match_pkas(calc_pkas, expl_pkas)
-        matched_fp = analyze.joinpath(FILES.MATCHED_PKAS.value)
-        matched_pkas_to_csv(matched_fp, matched_pkas)
 
-        logger.info(f"Calculating the matched pkas stats into dict.")
-        # no need for returned df here -> to tsv:
-        _ = res_outlier_count(matched_fp)
+def _plot_pkas_fit(data:AnalysisData) -> None:
+    d_stats = from_pickle(data.path(FILES.MATCHED_PKAS_STATS))
+    if isinstance(d_stats["fit"], str):
+        logger.info("Data could not be fitted: no plot generated.")
+        return
+    plots.plot_pkas_fit(matched_pkas_to_df(data.path(FILES.MATCHED_PKAS)), d_stats,
+                        data.path(FILES.FIG_FIT_ALLPKS))
 
-        # matched_df: used by matched_pkas_stats and plots.plot_pkas_fit
-        matched_df = matched_pkas_to_df(matched_fp)
-        d_stats = matched_pkas_stats(matched_df)
-        logger.info(d_stats["report"])
-        pkl_fp = analyze.joinpath(FILES.MATCHED_PKAS_STATS.value)
-        to_pickle(d_stats, pkl_fp)
 
-    # plots
-    logger.info(f"Plotting conformers throughput per step -> pic.")
-    tsv = analyze.joinpath(FILES.CONFS_THRUPUT.value)
-    thruput_df = tsv_to_df(tsv)
-    save_to = analyze.joinpath(FILES.FIG_CONFS_TP.value)
-    n_complete = len(get_book_dirs_for_status(book_fp))
-    plots.plot_conf_thrup(thruput_df, n_complete, save_to)
+def analysis_nodes(data:AnalysisData) -> dict:
+    """Return the graph of the analysis artifacts of `data`, {FILES name: artifacts.Node};
+    the sources are: the RUN_FILES of the runs, e.g. 'pK.out', 'book' (Q_BOOK), 'expl'
+    (BENCH.BENCH_WT) and 'params' (sub-command & titration type); see analysis_sources.
+    """
+
+    def node(f:FILES, inputs:list, build, outputs:list = None, optional:list = None,
+             serial:bool = False):
+        outputs = outputs or [f]
+        return artifacts.Node(f.name, [o.value for o in outputs], inputs, partial(build, data),
+                              optional=[o.value for o in optional or []], serial=serial)
+
+    pdbs = data.pdbs
+    refit = str(data.titr).lower() in ["ph", "eh"]
+    sub1 = data.subcmd == SUB1
+    nodes = [
+        node(FILES.VERSIONS, ["run.log"], lambda d: get_mcce_version(pdbs)),
+        node(FILES.ALL_SUMCRG, ["sum_crg.out", "params"], _build_all_sumcrg),
+        node(FILES.ALL_PKAS, ["pK.out", "params"], _build_all_pkas),
+        node(FILES.ALL_PKAS_OOB, ["ALL_PKAS"], _build_oob,
+             outputs=[FILES.ALL_PKAS_OOB, FILES.ALL_PKAS_TSV],
+             optional=[FILES.ALL_PKAS_OOB, FILES.ALL_PKAS_TSV]),
+        node(FILES.ALL_PKAS_REFIT, ["ALL_SUMCRG", "params"], _build_refit) if refit else None,
+        node(FILES.PKAS_SUMMARY, ["ALL_PKAS"],
+             lambda d: stats.pkas_summary_to_tsv(d.table("all_pkas"), d.analyze)),
+        node(FILES.CONF_COUNTS, ["step2_out.pdb"],
+             lambda d: all_counts_to_tsv(pdbs, kind="confs", records=d.records)),
+        node(FILES.RES_COUNTS, ["step2_out.pdb"],
+             lambda d: all_counts_to_tsv(pdbs, kind="res", records=d.records)),
+        node(FILES.RUN_TIMES, ["run.log"], lambda d: all_run_times_to_tsv(pdbs, records=d.records)),
+        node(FILES.CONFS_PER_RES, ["CONF_COUNTS", "RES_COUNTS"],
+             lambda d: confs_per_res_to_tsv(pdbs, overwrite=False)),
+        node(FILES.CONFS_THRUPUT, ["RUN_TIMES", "CONF_COUNTS"],
+             lambda d: confs_throughput_to_tsv(pdbs, overwrite=False)),
+        node(FILES.JOB_PKAS, ["ALL_PKAS", "ALL_PKAS_OOB", "book"], _build_job_pkas),
+        node(FILES.MATCHED_PKAS, ["JOB_PKAS", "expl"], _build_matched_pkas) if sub1 else None,
+        node(FILES.RES_OUTLIER, ["MATCHED_PKAS"],
+             lambda d: res_outlier_count(d.path(FILES.MATCHED_PKAS))) if sub1 else None,
+        # all groupings with bootstrap CIs:
+        node(FILES.PKAS_STATS, ["MATCHED_PKAS"],
+             lambda d: stats.matched_stats_to_csv(d.table("matches"), d.analyze)) if sub1 else None,
+        node(FILES.MATCHED_PKAS_STATS, ["MATCHED_PKAS"], _build_matched_stats) if sub1 else None,
+        node(FILES.STORE, ["ALL_PKAS", "ALL_SUMCRG", "JOB_PKAS", "step2_out.pdb", "run.log"]
+                          + ["ALL_PKAS_REFIT"] * refit + ["MATCHED_PKAS"] * sub1, _build_store),
+        node(FILES.FIG_CONFS_TP, ["CONFS_THRUPUT", "book"], _plot_confs_tp, serial=True),
+        node(FILES.FIG_FIT_PER_RES, ["MATCHED_PKAS"], _plot_res_analysis, serial=True) if sub1 else None,
+        node(FILES.FIG_FIT_ALLPKS, ["MATCHED_PKAS", "MATCHED_PKAS_STATS"], _plot_pkas_fit,
+             optional=[FILES.FIG_FIT_ALLPKS], serial=True) if sub1 else None,
+    ]
+
+    return {n.name: n for n in nodes if n is not None}
+
+
+def analysis_sources(data:AnalysisData) -> dict:
+    """Return the digests of the sources of the analysis artifacts of `data`: one per
+    RUN_FILES file name, from the fingerprints of that file in all the runs.
+    """
+
+    sources = {}
+    for fname in RUN_FILES:
+        h = hashlib.sha256()
+        for name, rec in sorted(data.records.items()):
+            h.update(f"{name}:{rec['fprints'][fname] and rec['fprints'][fname][2]}\n".encode())
+        sources[fname] = h.hexdigest()
+    sources["book"] = file_fingerprint(data.book_fp)[2]
+    sources["expl"] = file_fingerprint(BENCH.BENCH_WT)[2]
+    sources["params"] = f"{data.subcmd}:{data.titr}"
+
+    return sources
+
+
+def analysis_target(target:str) -> str:
+    """Return the FILES name of an artifact given by its FILES name or file name."""
+
+    for f in FILES:
+        if target in (f.name, f.value):
+            return FILES.ALL_PKAS_OOB.name if f is FILES.ALL_PKAS_TSV else f.name
+
+    return target
+
+
+def analyze_runs(bench_dir:Path, subcmd:str, n_jobs:int = 1, targets:list = None,
+                 force:bool = False, expl_df:pd.DataFrame = None) -> list:
+    """Create the analysis output files that are missing or stale (see artifacts.make),
+    or only those needed by `targets` (FILES names or file names).
+    n_jobs (int, 1): number of processes for parsing the runs & of threads for building
+                     the independent artifacts.
+    force (bool, False): rebuild the artifacts even if up to date.
+    expl_df (pd.DataFrame, None): the experimental pkas, loaded if None.
+    Return the names of the artifacts built.
+    """
+
+    data = AnalysisData(bench_dir, subcmd, n_jobs=n_jobs, expl_df=expl_df)
+    if targets is not None:
+        targets = [analysis_target(t) for t in targets]
+
+    return artifacts.make(data.analyze, analysis_nodes(data), analysis_sources(data),
+                          targets=targets, n_jobs=n_jobs, force=force)
 
+
+MANY_COLS = ["status", "runs", "pkas", "pkas_in", "pkas_oob", "mean_pka", "sd_pka",
+             "confs", "seconds"]
+MANY_MATCH_COLS = ["N", "mean_delta", "rmsd", "within_1", "within_2", "within_3",
+                   "slope", "intercept"]
+_MANY_EXPL = None   # experimental pkas of the analyze_many workers, set by _many_init
+
+
+def bench_summary(bench_dir:str, subcmd:str) -> dict:
+    """Return the summary of the analysis outputs of a set of runs: number of completed
+    runs, pkas counts, mean & sd (PKAS_SUMMARY), conformers (CONF_COUNTS), run time
+    (RUN_TIMES), and with pkdb_pdbs, the metrics of all the matched pkas (PKAS_STATS).
+    """
+
+    analyze = Path(bench_dir).joinpath(ANALYZE_DIR)
+    book_fp = Path(bench_dir).joinpath(RUNS_DIR, BENCH.Q_BOOK)
+    summary = {"runs": len(get_book_dirs_for_status(book_fp))}
+
+    pks = pd.read_csv(analyze.joinpath(FILES.PKAS_SUMMARY.value), sep="\t", index_col="res").loc["ALL"]
+    summary.update(pkas=pks.N, pkas_in=pks.N_in, pkas_oob=pks.N - pks.N_in,
+                   mean_pka=pks["mean"], sd_pka=pks["sd"])
+    summary["confs"] = pd.read_csv(analyze.joinpath(FILES.CONF_COUNTS.value), sep="\t").confs.sum()
+    summary["seconds"] = pd.read_csv(analyze.joinpath(FILES.RUN_TIMES.value), sep="\t").seconds.sum()
     if subcmd == SUB1:
-        logger.info(f"Plotting residues analysis -> pic.")
-        save_to = matched_fp.parent.joinpath(FILES.FIG_FIT_PER_RES.value)
-        plots.plot_res_analysis(matched_pkas, save_to)
+        st = pd.read_csv(analyze.joinpath(FILES.PKAS_STATS.value), index_col=["grouping", "group"])
+        summary.update({f"matched_{m}": st.loc[("all", "ALL"), m] for m in MANY_MATCH_COLS})
 
-        if isinstance(d_stats["fit"], str):
-            logger.info("Data could not be fitted: no plot generated.")
-        return
+    return summary
 
-        logger.info(f"Plotting pkas fit -> pic.")
-        save_to = matched_fp.parent.joinpath(FILES.FIG_FIT_ALLPKS.value)
-        plots.plot_pkas_fit(matched_df, d_stats, save_to)
 
-    return
+def _many_init(expl_df:pd.DataFrame) -> None:
+    """Initializer of the analyze_many workers: the experimental pkas are loaded once."""
+    global _MANY_EXPL
+    _MANY_EXPL = expl_df
+
+
+def _many_one(bench_dir:Path, subcmd:str, force:bool) -> dict:
+    with plots.figures_scope():
+        analyze_runs(bench_dir, subcmd, force=force, expl_df=_MANY_EXPL)
+    return bench_summary(bench_dir, subcmd)
+
+
+def analyze_many(dirs:list, subcmd:str, n_jobs:int = 1, out_dir:str = ".",
+                 force:bool = False) -> pd.DataFrame:
+    """Analyze several sets of runs, `dirs`, in one pool of `n_jobs` processes sharing
+    the experimental pkas, loaded once; each set gets its usual analysis outputs (see
+    analyze_runs). The sets not 100% completed are skipped; the failure of a set is
+    logged & does not stop the others.
+    Output in `out_dir`: FILES.MANY_SUMMARY: one row per set (see bench_summary) with
+    its status: ok, incomplete or failed, preceded by its grid options if the set is
+    the point of a sweep (see sweep.points_params).
+    Return the summary table.
+    """
+
+    dirs = [Path(d) for d in dirs]
+    expl_df = experimental_pkas_to_df() if subcmd == SUB1 else None
+
+    rows = {str(d): {"status": "incomplete"} for d in dirs}
+    todo = []
+    for d in dirs:
+        pct = pct_completed(d.joinpath(RUNS_DIR, BENCH.Q_BOOK))
+        if pct < 1.:
+            logger.warning(f"Runs not 100% completed or failed, skipped: {d}; completed = {pct:.2f}")
+        else:
+            todo.append(d)
+
+    n_workers = max(1, min(n_jobs, len(todo)))
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_many_init,
+                             initargs=(expl_df,)) as pool:
+        futs = {pool.submit(_many_one, d, subcmd, force): d for d in todo}
+        for fut, d in futs.items():
+            try:
+                rows[str(d)] = {"status": "ok", **fut.result()}
+                logger.info(f"Analyzed: {d}")
+            except Exception as e:
+                logger.error(f"Analysis failed: {d}: {e!r}")
+                rows[str(d)] = {"status": "failed"}
+
+    cols = MANY_COLS + ([f"matched_{m}" for m in MANY_MATCH_COLS] if subcmd == SUB1 else [])
+    summary = pd.DataFrame.from_dict(rows, orient="index").reindex(columns=cols)
+    counts = ["runs", "pkas", "pkas_in", "pkas_oob", "confs", "seconds"]
+    counts += ["matched_N"] if subcmd == SUB1 else []
+    summary[counts] = summary[counts].astype("Int64")
+    params = sweep.points_params(dirs)
+    if not params.empty:
+        summary = params.reindex(summary.index).join(summary)
+    summary.index.name = "bench_dir"
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    summary_fp = out_dir.joinpath(FILES.MANY_SUMMARY.value)
+    summary.to_csv(summary_fp, sep="\t", float_format="%.3f")
+    logger.info(f"Saved the summary of {len(dirs)} sets: {summary_fp}")
+
+    return summary
+
+
+STREAM_CHUNK = 500   # number of runs per chunk in stream_analysis
+TP_COLS = ["confs", "seconds", "confs_per_sec", "per_min_thrup"]
+
+
+def _chunks(items, size:int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class _StreamOut:
+    """Output files of stream_analysis: created by the first write, then appended to."""
+
+    def __init__(self, analyze:Path):
+        self.analyze = analyze
+        self.started = set()
+
+    def path(self, f:FILES) -> Path:
+        return self.analyze.joinpath(f.value)
+
+    def text(self, f:FILES, hdr:str, lines:list) -> None:
+        first = f not in self.started
+        with open(self.path(f), "w" if first else "a", encoding="latin-1", newline="") as fh:
+            fh.write("".join(f"{line}\n" for line in ([hdr] if first else []) + lines))
+        self.started.add(f)
+
+    def df(self, f:FILES, df:pd.DataFrame) -> None:
+        first = f not in self.started
+        df.to_csv(self.path(f), sep="\t", mode="w" if first else "a", header=first)
+        self.started.add(f)
+
+
+def stream_analysis(bench_dir:str, subcmd:str, chunk_size:int = STREAM_CHUNK,
+                    n_jobs:int = 1) -> int:
+    """Analyze the completed runs of a set by chunks of `chunk_size` runs, so that the
+    peak memory does not depend on the number of runs: the runs are read from the book
+    & parsed (analysis cache) one chunk at a time, and each chunk is appended to the
+    outputs; the rows are in book order by chunk, in sorted order within a chunk.
+    Outputs: ALL_PKAS, ALL_SUMCRG, ALL_PKAS_TSV (in bounds pkas), ALL_PKAS_OOB,
+    ALL_PKAS_REFIT, CONF_COUNTS, RES_COUNTS, RUN_TIMES, CONFS_PER_RES, VERSIONS, and
+    from mergeable accumulators (stats.GroupSums): PKAS_SUMMARY, CONFS_THRUPUT.
+    With pkdb_pdbs, the matched pkas (bounded by the pKaDBv1 size) are also appended
+    to MATCHED_PKAS, then analyzed as in analyze_runs.
+    JOB_PKAS and STORE hold the whole set in memory: they are not written (removed if
+    found), hence bench_compare needs a full analysis.
+    n_jobs (int, 1): number of processes for parsing the runs of a chunk.
+    Return the number of runs analyzed.
+    """
+
+    bench = Pathok(bench_dir)
+    meta = get_bench_meta(bench, subcmd=subcmd)
+    titr = meta.titr_type
+    pdbs = bench.joinpath(RUNS_DIR)
+    book_fp = pdbs.joinpath(BENCH.Q_BOOK)
+    analyze = bench.joinpath(ANALYZE_DIR)
+    cache_dir = analyze.joinpath(ANALYSIS_CACHE)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    # outputs not streamed, or written only if needed:
+    for f in [FILES.JOB_PKAS, FILES.STORE, FILES.ALL_PKAS_OOB, FILES.MATCHED_PKAS]:
+        analyze.joinpath(f.value).unlink(missing_ok=True)
+    analyze.joinpath(artifacts.ARTIFACTS_STATE).unlink(missing_ok=True)
+    get_mcce_version(pdbs)
+
+    pko_hdr = _collated_pko_hdr(str(titr).upper())
+    pko_specs, pko_cols = get_col_specs(collated=True, titr_type=titr)
+    sc_hdr = get_sumcrg_hdr(bench)
+    sc_specs, sc_cols = get_sumcrg_col_specs(collated=True, titr_type=sc_hdr.split()[0], hdr=sc_hdr)
+    sc_skip = _sumcrg_skip_line(sc_hdr)
+    refit = str(titr).lower() in ["ph", "eh"]
+    expl_df = experimental_pkas_to_df() if subcmd == SUB1 else None
+
+    out = _StreamOut(analyze)
+    pkas_sums = stats.GroupSums(stats.PKAS_SUMS)
+    tp_sums = stats.GroupSums(TP_COLS + [f"n_{c}" for c in TP_COLS])
+    n_runs, n_complete = 0, 0
+    pool = ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
+    mapper = map if pool is None else pool.map
+    try:
+        for chunk in _chunks(iter_book_dirs(book_fp), chunk_size):
+            chunk = sorted(chunk)
+            n_complete += len(chunk)
+            run_dirs = [pdbs.joinpath(name) for name in chunk]
+            rec_fps = [cache_dir.joinpath(f"{name}.pickle") for name in chunk]
+            records = {d.name: rec for d, (rec, _) in zip(run_dirs, mapper(refresh_run_record, run_dirs, rec_fps))
+                       if rec is not None}
+            n_runs += len(records)
+
+            # pkas:
+            lines = [f"{name}:{line}" for name, rec in records.items()
+                     if rec["lines"]["pK.out"] is not None
+                     for line in rec["lines"]["pK.out"] if not line.endswith("total")]
+            out.text(FILES.ALL_PKAS, pko_hdr, lines)
+            if lines:
+                allout_df = fwf_to_df(StringIO("\n".join([pko_hdr] + lines)), pko_specs, pko_cols)
+                msk = get_oob_mask(allout_df)
+                if msk.any():
+                    out.df(FILES.ALL_PKAS_OOB, allout_df[msk])
+                out.df(FILES.ALL_PKAS_TSV, allout_df[~msk])
+                stats.pkas_sums(allout_df.iloc[:, 0], allout_df["pKa/Em"].to_numpy(), pkas_sums)
+                if expl_df is not None:
+                    matches = match_pkas_df(_unique_keys(_allout_pkas(allout_df[~msk]), "pka"), expl_df)
+                    out.text(FILES.MATCHED_PKAS, "key,mcce,expl",
+                             ["{},{},{}".format(*m) for m in matches.itertuples(index=False, name=None)])
+
+            # sum_crg:
+            lines = [f"{name}:{line}" for name, rec in records.items()
+                     if rec["lines"]["sum_crg.out"] is not None
+                     for line in rec["lines"]["sum_crg.out"] if not sc_skip(line)]
+            out.text(FILES.ALL_SUMCRG, sc_hdr, lines)
+            if lines and refit:
+                sumcrg_df = fwf_to_df(StringIO("\n".join([sc_hdr] + lines)), sc_specs, sc_cols, is_pko=False)
+                out.df(FILES.ALL_PKAS_REFIT, titration.refit_pkas(sumcrg_df, titr_type=titr))
+
+            # counts & times:
+            for kind, f in [("confs", FILES.CONF_COUNTS), ("res", FILES.RES_COUNTS)]:
+                out.text(f, f"PDB\t{kind}", [f"{name}\t{rec['counts'][kind]}" for name, rec in records.items()
+                                              if rec["counts"] is not None])
+            out.text(FILES.RUN_TIMES, "PDB\tstep\tseconds",
+                     ["\t".join(row) for rec in records.values() if rec["times"] is not None
+                      for row in rec["times"]])
+            counts_df, times_df = records_to_frames(records)
+            per_res = counts_df.copy()
+            per_res["confs_per_res"] = round(per_res.confs/per_res.res, 2)
+            out.df(FILES.CONFS_PER_RES, per_res)
+
+            tp = counts_df[["confs"]].merge(times_df.set_index("PDB"), on="PDB")
+            tp["seconds"] = pd.to_numeric(tp.seconds, errors="coerce")
+            tp["confs_per_sec"] = round(tp.confs/tp.seconds, 2)
+            tp["per_min_thrup"] = round(tp.confs_per_sec * 60, 2)
+            vals = tp[TP_COLS].astype(float)
+            tp_sums.add(tp.step.to_numpy(), np.column_stack([vals.fillna(0.), vals.notna()]))
+            logger.info(f"Streamed chunk of {len(records)} runs; total: {n_runs}.")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not n_runs:
+        logger.warning(f"No completed runs to analyze in {pdbs}.")
+        return 0
+
+    pkas_summary = stats.pkas_summary(pkas_sums)
+    pkas_summary.to_csv(out.path(FILES.PKAS_SUMMARY), sep="\t", float_format="%.3f")
+
+    tp_df = tp_sums.to_df()
+    thruput_df = pd.DataFrame({c: tp_df[c] / tp_df[f"n_{c}"] for c in TP_COLS})
+    thruput_df.index.name = "step"
+    thruput_df.to_csv(out.path(FILES.CONFS_THRUPUT), sep="\t")
+    plots.plot_conf_thrup(tsv_to_df(out.path(FILES.CONFS_THRUPUT)), n_complete,
+                          out.path(FILES.FIG_CONFS_TP))
+
+    matched_fp = out.path(FILES.MATCHED_PKAS)
+    if expl_df is not None and matched_fp.exists():
+        _ = res_outlier_count(matched_fp)
+        matches = pd.read_csv(matched_fp)
+        matches.columns = ["key", "calc", "ref"]
+        _ = stats.matched_stats_to_csv(matches, analyze)
+        matched_df = matched_pkas_to_df(matched_fp)
+        d_stats = matched_pkas_stats(matched_df)
+        logger.info(d_stats["report"])
+        to_pickle(d_stats, out.path(FILES.MATCHED_PKAS_STATS))
+        plots.plot_res_analysis(list(matches.itertuples(index=False, name=None)),
+                                out.path(FILES.FIG_FIT_PER_RES))
+        if not isinstance(d_stats["fit"], str):
+            plots.plot_pkas_fit(matched_df, d_stats, out.path(FILES.FIG_FIT_ALLPKS))
+
+    logger.info(f"Streaming analysis of {n_runs} runs done.")
+
+    return n_runs
 
 
 #................................................................................
@@ -803,7 +1585,12 @@ def pkdb_pdbs_analysis(args:Union[dict,Namespace]) -> None:
 
     if isinstance(args, dict):
         args = Namespace(**args)
-    analyze_runs(args.bench_dir, SUB1)
+    if getattr(args, "stream", False):
+        stream_analysis(args.bench_dir, SUB1, chunk_size=getattr(args, "chunk_size", STREAM_CHUNK),
+                        n_jobs=getattr(args, "jobs", 1))
+        return
+    analyze_runs(args.bench_dir, SUB1, n_jobs=getattr(args, "jobs", 1),
+                 targets=getattr(args, "target", None), force=getattr(args, "force", False))
     return
 
 
@@ -812,11 +1599,49 @@ def user_pdbs_analysis(args:Union[dict,Namespace]) -> None:
 
     if isinstance(args, dict):
         args = Namespace(**args)
-    analyze_runs(args.bench_dir, SUB2)
+    if getattr(args, "stream", False):
+        stream_analysis(args.bench_dir, SUB2, chunk_size=getattr(args, "chunk_size", STREAM_CHUNK),
+                        n_jobs=getattr(args, "jobs", 1))
+        return
+    analyze_runs(args.bench_dir, SUB2, n_jobs=getattr(args, "jobs", 1),
+                 targets=getattr(args, "target", None), force=getattr(args, "force", False))
+    return
+
+
+def bench_dirs_from_args(dirs:list) -> list:
+    """Return the resolved paths of the sets of runs in `dirs`, paths or glob patterns;
+    a sweep folder is replaced by its points, read from its manifest; the matches of a
+    pattern without a runs subfolder, or that are the staged pdbs of a sweep, are ignored.
+    """
+
+    def is_staged(p:Path) -> bool:
+        return p.name == sweep.STAGED_DIR and sweep.is_sweep(p.parent)
+
+    found = []
+    for d in dirs:
+        if any(c in d for c in "*?["):
+            matches = [Path(p) for p in sorted(glob.glob(d))
+                       if sweep.is_sweep(p) or (Path(p).joinpath(RUNS_DIR).is_dir() and not is_staged(Path(p)))]
+        else:
+            matches = [Path(d)]
+        for p in matches:
+            found.extend(sweep.point_dirs(p) if sweep.is_sweep(p) else [p])
+
+    return list(dict.fromkeys(p.resolve() for p in found))
+
+
+def many_analysis(args:Union[dict,Namespace]) -> None:
+    """Processing tied to sub-command many: several sets of pkdb_pdbs or user_pdbs runs."""
+
+    if isinstance(args, dict):
+        args = Namespace(**args)
+    analyze_many(args.dirs, SUB2 if args.user_pdbs else SUB1, n_jobs=getattr(args, "jobs", 1),
+                 out_dir=args.o, force=getattr(args, "force", False))
     return
 
 
 CLI_NAME = ENTRY_POINTS["analyze"] # as per pyproject.toml entry point
+SUB_MANY = "many"
 
 HELP_1 = """Sub-command for analyzing a benchmarking set against the pKaDBv1
 using the same dataset and structure: <bench_dir>/runs folder."
@@ -826,6 +1651,10 @@ HELP_2 = f"""
 Sub-command for analyzing a benchmarking set of user's pdbs.
 """
 
+HELP_MANY = f"""
+Sub-command for analyzing several benchmarking sets in one process pool.
+"""
+
 EPI = """
 Post an issue for all errors and feature requests at:
 https://github.com/GunnerLab/MCCE_Benchmarking/issues
@@ -835,14 +1664,16 @@ DESC = f"""
 Description:
 Create analysis output files for a set of runs in <bench_dir>/analysis.
 
-The main command is {CLI_NAME} along with one of 2 sub-commands:
+The main command is {CLI_NAME} along with one of 3 sub-commands:
 - Sub-command 1: {SUB1}: analyze pKas against pKaDBv1;
 - Sub-command 2: {SUB2}: analyze pKas for user's pdbs;
+- Sub-command 3: {SUB_MANY}: analyze several sets of runs of either kind;
 
 Output files:
     ALL_PKAS = "all_pkas.out"
     ALL_SUMCRG = "all_sumcrg.out"
     ALL_PKAS_OOB = "all_pkas_oob.tsv"    # out of bounds pKas
+    ALL_PKAS_REFIT = "all_pkas_refit.tsv"  # Hill refit of the sum_crg curves
     JOB_PKAS = "job_pkas.pickle"                    # from dict
     CONF_COUNTS = "conf_counts.tsv"
     RES_COUNTS = "res_counts.tsv"
@@ -853,9 +1684,30 @@ Output files:
     MATCHED_PKAS = "matched_pkas.csv"
     MATCHED_PKAS_STATS = "matched_pkas_stats.pickle" # from dict
     PKAS_STATS = "pkas_stats.csv"
+    PKAS_SUMMARY = "pkas_summary.tsv"
     RES_OUTLIER = "outlier_residues.tsv"
     FIG_FIT_ALLPKS = "pkas_fit.png"
     FIG_FIT_PER_RES = "res_analysis.png"
+    STORE = "analysis_store.npz"
+
+The analysis tables (pkas, all_pkas, sumcrg, refit, counts, times, matches) are also saved
+in the versioned columnar store STORE; see store.read_table.
+The parsed runs are cached in <bench_dir>/analysis/.cache: when re-analyzing a set,
+only the runs with new or changed pK.out, sum_crg.out, step2_out.pdb or run.log are parsed.
+Each output file is an artifact derived from the runs or from other outputs, e.g.
+CONFS_THRUPUT <- RUN_TIMES + CONF_COUNTS: only the missing or stale outputs, i.e. whose
+inputs changed since they were built, are rebuilt; --target builds only the given
+outputs and those they derive from; --force rebuilds them even if up to date.
+With --stream, the runs are analyzed by chunks, with a peak memory independent of the
+number of runs; the summary statistics (PKAS_SUMMARY, CONFS_THRUPUT) are merged across
+the chunks; JOB_PKAS & STORE are not written: use a full analysis for bench_compare.
+
+- Sub-command {SUB_MANY}: analyze several sets of runs, e.g. the points of a sweep, in one
+pool of --jobs processes sharing the experimental pkas; each set gets its usual outputs,
+and a summary table with one row per set is saved in -o: {FILES.MANY_SUMMARY.value}.
+A sweep folder given in -dirs stands for all its points; the summary rows of the points
+of a sweep start with their grid options.
+The sets not 100% completed are skipped.
 """
 
 USAGE = f"""
@@ -864,6 +1716,12 @@ USAGE = f"""
 Examples:
    >{CLI_NAME} {SUB1} -bench_dir <path to dir>
    >{CLI_NAME} {SUB2} -bench_dir <path to dir>
+   >{CLI_NAME} {SUB2} -bench_dir <path to dir> --jobs 8
+   >{CLI_NAME} {SUB1} -bench_dir <path to dir> --target matched_pkas.csv
+   >{CLI_NAME} {SUB2} -bench_dir <path to dir> --stream --chunk_size 1000
+   >{CLI_NAME} {SUB_MANY} -dirs <dir1> <dir2> <dir3> --jobs 4 -o <output dir>
+   >{CLI_NAME} {SUB_MANY} -dirs <sweep dir> --user_pdbs --jobs 4
+   >{CLI_NAME} {SUB_MANY} -dirs "./sweep/<job_name>*" --user_pdbs --jobs 4
 """
 
 def analyze_parser():
@@ -875,6 +1733,20 @@ def analyze_parser():
             return None
         return Path(p).resolve()
 
+    def arg_valid_jobs(n: str) -> int:
+        """Return the number of processes, capped to the number of cpus."""
+        n = int(n)
+        if n < 1:
+            raise ValueError(f"--jobs must be >= 1; Given: {n}.")
+        return min(n, os.cpu_count() or 1)
+
+    def arg_valid_target(t: str) -> str:
+        """Return the FILES name of an output given by its FILES name or file name."""
+        name = analysis_target(t)
+        if name not in FILES.__members__:
+            raise ValueError(f"Unknown output: {t}.")
+        return name
+
     # parent parser
     p = ArgumentParser(
         prog = f"{CLI_NAME} ",
@@ -888,9 +1760,10 @@ def analyze_parser():
                                   title = f"{CLI_NAME} sub-commands",
                                   dest = "subparser_name",
                                   description = "Sub-commands of MCCE benchmarking analysis cli.",
-                                  help = f"""The 2 choices for the benchmarking process:
+                                  help = f"""The 3 choices for the benchmarking process:
                                   1) Analyze dataset of mcce runs viz pKaDBv1: {SUB1}
-                                  2) FUTURE: Analyze two mcce runs
+                                  2) Analyze dataset of mcce runs of user's pdbs: {SUB2}
+                                  3) Analyze several datasets: {SUB_MANY}
                                   """)
 
     sub1 = subparsers.add_parser(SUB1,
@@ -903,6 +1776,44 @@ def analyze_parser():
         help = """The user's directory where the /runs subfolder is setup.
         """
     )
+    sub1.add_argument(
+        "--jobs",
+        type = arg_valid_jobs,
+        default = 1,
+        help = """Number of processes for parsing the runs & of threads for building
+        the independent outputs; default: %(default)s.
+        """
+    )
+    sub1.add_argument(
+        "--target",
+        nargs = "+",
+        type = arg_valid_target,
+        help = """Output(s) to bring up to date, given by their FILES name or file name,
+        e.g. MATCHED_PKAS or matched_pkas.csv; default: all.
+        """
+    )
+    sub1.add_argument(
+        "--force",
+        default = False,
+        action = "store_true",
+        help = """Rebuild the outputs even if up to date.
+        """
+    )
+    sub1.add_argument(
+        "--stream",
+        default = False,
+        action = "store_true",
+        help = """Analyze the completed runs by chunks of --chunk_size runs, with a peak
+        memory independent of the number of runs (no JOB_PKAS, STORE); for very large sets.
+        """
+    )
+    sub1.add_argument(
+        "--chunk_size",
+        type = int,
+        default = STREAM_CHUNK,
+        help = """Number of runs per chunk with --stream; default: %(default)s.
+        """
+    )
     sub1.set_defaults(func=pkdb_pdbs_analysis)
 
     sub2 = subparsers.add_parser(SUB2,
@@ -915,7 +1826,88 @@ def analyze_parser():
         help = """The user's directory where the /runs subfolder is setup.
         """
     )
+    sub2.add_argument(
+        "--jobs",
+        type = arg_valid_jobs,
+        default = 1,
+        help = """Number of processes for parsing the runs & of threads for building
+        the independent outputs; default: %(default)s.
+        """
+    )
+    sub2.add_argument(
+        "--target",
+        nargs = "+",
+        type = arg_valid_target,
+        help = """Output(s) to bring up to date, given by their FILES name or file name,
+        e.g. MATCHED_PKAS or matched_pkas.csv; default: all.
+        """
+    )
+    sub2.add_argument(
+        "--force",
+        default = False,
+        action = "store_true",
+        help = """Rebuild the outputs even if up to date.
+        """
+    )
+    sub2.add_argument(
+        "--stream",
+        default = False,
+        action = "store_true",
+        help = """Analyze the completed runs by chunks of --chunk_size runs, with a peak
+        memory independent of the number of runs (no JOB_PKAS, STORE); for very large sets.
+        """
+    )
+    sub2.add_argument(
+        "--chunk_size",
+        type = int,
+        default = STREAM_CHUNK,
+        help = """Number of runs per chunk with --stream; default: %(default)s.
+        """
+    )
     sub2.set_defaults(func=user_pdbs_analysis)
+
+    many = subparsers.add_parser(SUB_MANY,
+                                 formatter_class = RawDescriptionHelpFormatter,
+                                 help=HELP_MANY)
+    many.add_argument(
+        "-dirs",
+        required = True,
+        nargs = "+",
+        type = str,
+        help = """Paths to the sets of runs or to sweep folders (all their points), or quoted
+        glob patterns, e.g. "./sweep/<job_name>*".
+        """
+    )
+    many.add_argument(
+        "-o",
+        type = arg_valid_dirpath,
+        default = ".",
+        help = f"""Output folder of {FILES.MANY_SUMMARY.value}; default: %(default)s.
+        """
+    )
+    many.add_argument(
+        "--user_pdbs",
+        default = False,
+        action = "store_true",
+        help = f"""The sets are {SUB2} runs; absence means {SUB1}.
+        """
+    )
+    many.add_argument(
+        "--jobs",
+        type = arg_valid_jobs,
+        default = 1,
+        help = """Number of processes, each analyzing one set at a time; default: %(default)s.
+        """
+    )
+    many.add_argument(
+        "--force",
+        default = False,
+        action = "store_true",
+        help = """Rebuild the outputs even if up to date.
+        """
+    )
+    many.set_defaults(func=many_analysis)
+
     return p
 
 
@@ -927,6 +1919,16 @@ def analyze_cli(argv=None):
     cli_parser = analyze_parser()
     args = cli_parser.parse_args(argv)
 
+    if args.subparser_name == SUB_MANY:
+        args.dirs = bench_dirs_from_args(args.dirs)
+        if not args.dirs:
+            cli_parser.error("-dirs: no sets of runs found.")
+        # the crontab may be scheduling the incomplete sets:
+        if all(pct_completed(d.joinpath(RUNS_DIR, BENCH.Q_BOOK)) == 1. for d in args.dirs):
+            clear_crontab()
+        args.func(args)
+        return
+
     # OK to analyze?
     bench = Pathok(args.bench_dir)
     book_fp = bench.joinpath(RUNS_DIR, BENCH.Q_BOOK)
@@ -1,7 +1,9 @@
 #!/usr/bin/env python
 
 from collections import defaultdict
+from contextlib import contextmanager
 import logging
+from mcce_benchmark import stats
 import matplotlib.pyplot as plt
 from matplotlib import ticker, gridspec
 from matplotlib.ticker import MaxNLocator
@@ -16,6 +18,19 @@ logger.setLevel(logging.ERROR)
 np.seterr(all='raise')
 
 
+@contextmanager
+def figures_scope():
+    """Context discarding the pyplot figures & style settings (e.g. sns.set_style) on
+    exit, so that the plots of several sets of runs made in one process are independent.
+    """
+
+    with plt.rc_context():
+        try:
+            yield
+        finally:
+            plt.close("all")
+
+
 def plot_conf_thrup(tp_df:pd.DataFrame, n_complete:int, outfp:str=None) -> None:
     """
     Conformers throughput per mcce step.
@@ -132,6 +147,11 @@ def plot_res_analysis(matched_pKas:list, outfp:str=None) -> None:
     N_ioniz = len(residues_stat.keys())
     n_cells = int(N_ioniz**(1/2)) + 1
 
+    # fit lines of all the residue types in one grouped calculation (y: calc, x: ref):
+    codes = np.repeat(np.arange(N_ioniz), [len(v) for v in residues_stat.values()])
+    pairs = np.array([p for v in residues_stat.values() for p in v], dtype=float).reshape(-1, 2)
+    fits = stats.grouped_metrics(pairs[:, 1], pairs[:, 0], codes, N_ioniz)
+
     cm = plt.get_cmap('tab20')
     fig = plt.figure(figsize=(10,10))
     gs = gridspec.GridSpec(n_cells, n_cells)
@@ -142,18 +162,9 @@ def plot_res_analysis(matched_pKas:list, outfp:str=None) -> None:
         x = np.array([p[1] for p in residues_stat[k]])
         ax.plot(x, y, "o", color=cm(i+1))
 
-        converged = True
-        err_msg = None
-        try:
-            m, b = np.polyfit(x, y, 1)
-        except Exception as e:
-            #(np.linalg.LinAlgError, RuntimeWarning, FloatingPointError, RankWarning) as e:
-            #RankWarning: Polyfit may be poorly conditioned
-            #RuntimeWarning: invalid value encountered in divide
-            #("SVD did not converge in Linear Least Squares")
-            converged = False
-            err_msg = str(e)
-            m, b = 0,0
+        m, b = fits["slope"][i], fits["intercept"][i]
+        converged = not np.isnan(m)
+        err_msg = None if converged else "degenerate fit"
 
         if converged:
             ax.plot(x, m * x + b, ':', color="k")
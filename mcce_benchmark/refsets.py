@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+
+"""
+Module: refsets.py
+
+Registry of the reference sets of runs (refsets) used by `bench_compare`
+(--dir2_is_refset, -ref).
+Each refset has an entry in a json manifest, REFSETS_MANIFEST, with:
+  - path: the refset folder; relative to BENCH.BENCH_PH_REFS for a packaged refset;
+  - subcmd: the bench_setup sub-command of the runs;
+  - params: the run.prm.record parameters of the runs;
+  - mcce_version: the MCCE version(s) found in analysis/FILES.VERSIONS;
+  - hashes: sha256 digests of the run files the analysis derives from (REFSET_RUN_FILES)
+    and of the analysis store (FILES.STORE), which holds the pkas & sum_crg tables.
+
+The packaged refsets are listed in BENCH.BENCH_PH_REFS/REFSETS_MANIFEST, the local
+ones (see register_refset) in USER_REFSETS.
+get_refset returns the path of a refset once its store is verified: the store is
+rebuilt from the raw runs only when its hash does not match the manifest. The package
+data is never modified: the store of a packaged refset is rebuilt in a copy of the
+refset in USER_REFSETS_DIR/<name> (runs linked, analysis files copied), recorded in
+USER_REFSETS with the hash of the packaged store it replaces; registry returns it in
+place of the packaged refset as long as the packaged store hash is unchanged.
+
+Functions:
+ run_files_hash(refset_dir:str) -> str
+ build_refset_store(refset_dir:str) -> Path
+ refset_entry(refset_dir:str, subcmd:str=SUB1, path:str=None) -> dict
+ load_manifest(manifest_fp:str) -> dict
+ save_manifest(manifest:dict, manifest_fp:str) -> None
+ registry() -> dict
+ get_refset(refset_name:str, subcmd:str=SUB1, verify:bool=True) -> Path
+ register_refset(refset_name:str, bench_dir:str, subcmd:str=SUB1) -> dict
+"""
+
+from mcce_benchmark import BENCH, FILES, ANALYZE_DIR, RUNS_DIR, SUB1
+from mcce_benchmark import pkanalysis, store
+from mcce_benchmark.io_utils import Pathok, file_fingerprint
+from mcce_benchmark.mcce_env import get_bench_meta
+import hashlib
+import json
+import logging
+from pathlib import Path
+import shutil
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+REFSETS_MANIFEST = "refsets.json"
+USER_REFSETS = Path.home().joinpath(".mcce_benchmark", REFSETS_MANIFEST)
+USER_REFSETS_DIR = USER_REFSETS.parent.joinpath("refsets")   # rebuilt packaged refsets
+REFSET_RUN_FILES = ["pK.out", "sum_crg.out", "run.prm.record"]
+
+
+def run_files_hash(refset_dir:str) -> str:
+    """Return the sha256 digest of the REFSET_RUN_FILES of all the runs in `refset_dir`,
+    with their run folder & file names, in sorted order.
+    """
+
+    runs_dir = Pathok(Path(refset_dir).joinpath(RUNS_DIR))
+    h = hashlib.sha256()
+    for run_dir in sorted(d for d in runs_dir.iterdir() if d.is_dir()):
+        for fname in REFSET_RUN_FILES:
+            fp = run_dir.joinpath(fname)
+            if fp.exists():
+                h.update(f"{run_dir.name}/{fname}\n".encode())
+                h.update(fp.read_bytes())
+
+    return h.hexdigest()
+
+
+def build_refset_store(refset_dir:str) -> Path:
+    """Collate the pK.out & sum_crg.out files of the refset runs and save the all_pkas,
+    sumcrg and pkas tables to its analysis store; the other analysis files are kept.
+    Return the store path.
+    """
+
+    bench = Pathok(refset_dir)
+    meta = get_bench_meta(bench)
+    sumcrg_df = pkanalysis.collate_all_sumcrg(bench, meta.env, titr_type=meta.titr_type)
+    allout_df = pkanalysis.collate_all_pkas(bench, titr_type=meta.titr_type)
+    tables = {"all_pkas": allout_df, "sumcrg": sumcrg_df}
+
+    allout_df = pkanalysis.extract_oob_pkas(bench, allout_df)
+    tables["pkas"] = pkanalysis.job_pkas_to_df(bench.joinpath(RUNS_DIR, BENCH.Q_BOOK), allout_df)
+
+    return store.write_store(bench, tables, compress=True)
+
+
+def _mcce_versions(refset_dir:str) -> list:
+    """Return the MCCE versions listed in the FILES.VERSIONS file of `refset_dir`."""
+
+    fp = Path(refset_dir).joinpath(ANALYZE_DIR, FILES.VERSIONS.value)
+    if not fp.exists():
+        return []
+
+    return [line.replace("Version", "").strip()
+            for line in fp.read_text().splitlines()[1:] if line.strip()]
+
+
+def refset_entry(refset_dir:str, subcmd:str=SUB1, path:str=None) -> dict:
+    """Return the manifest entry of the refset in `refset_dir`; its store is built if
+    missing. `path` (default: the resolved `refset_dir`) is the path recorded.
+    """
+
+    bench = Pathok(refset_dir)
+    store_fp = store.store_path(bench)
+    if not store_fp.exists():
+        build_refset_store(bench)
+
+    return {"path": str(bench.resolve()) if path is None else path,
+            "subcmd": subcmd,
+            "params": get_bench_meta(bench, subcmd=subcmd).runprm,
+            "mcce_version": _mcce_versions(bench),
+            "hashes": {"runs": run_files_hash(bench),
+                       "store": file_fingerprint(store_fp)[2]},
+            }
+
+
+def load_manifest(manifest_fp:str) -> dict:
+    """Return the refsets entries of a manifest file, {refset name: entry}, or an
+    empty dict if the file does not exist.
+    """
+
+    fp = Path(manifest_fp)
+    if not fp.exists():
+        return {}
+
+    with open(fp) as fh:
+        return json.load(fh)
+
+
+def save_manifest(manifest:dict, manifest_fp:str) -> None:
+    fp = Path(manifest_fp)
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    with open(fp, "w") as fh:
+        json.dump(manifest, fh, indent=2)
+
+    return
+
+
+def _manifest_fp(packaged:bool) -> Path:
+    return Path(BENCH.BENCH_PH_REFS.joinpath(REFSETS_MANIFEST)) if packaged else USER_REFSETS
+
+
+def registry() -> dict:
+    """Return all the registered refsets, {refset name: entry}; a local refset does
+    not replace a packaged one of the same name, unless it is its rebuilt copy (key
+    'replaces': the hash of the current packaged store). Each entry has an added key,
+    'packaged' (bool).
+    """
+
+    local = load_manifest(_manifest_fp(False))
+    packaged = load_manifest(_manifest_fp(True))
+    refsets = {name: dict(entry, packaged=False)
+               for name, entry in local.items() if name not in packaged}
+    for name, entry in packaged.items():
+        rebuilt = local.get(name)
+        if rebuilt is not None and rebuilt.get("replaces") == entry["hashes"]["store"]:
+            refsets[name] = dict(rebuilt, packaged=False)
+        else:
+            refsets[name] = dict(entry, packaged=True)
+
+    return refsets
+
+
+def _refset_dir(entry:dict) -> Path:
+    if entry["packaged"]:
+        return Path(BENCH.BENCH_PH_REFS.joinpath(entry["path"]))
+
+    return Path(entry["path"])
+
+
+def _user_copy(refset_name:str, refset_dir:Path) -> Path:
+    """Return a new copy of the packaged refset in `refset_dir` in USER_REFSETS_DIR:
+    its runs folder is linked, its analysis files (but the store) are copied.
+    """
+
+    dest = USER_REFSETS_DIR.joinpath(refset_name)
+    if dest.exists():
+        # the runs link is removed, not followed:
+        shutil.rmtree(dest)
+    dest.mkdir(parents=True)
+    dest.joinpath(RUNS_DIR).symlink_to(Path(refset_dir).joinpath(RUNS_DIR).resolve(),
+                                       target_is_directory=True)
+    shutil.copytree(Path(refset_dir).joinpath(ANALYZE_DIR), dest.joinpath(ANALYZE_DIR),
+                    ignore=shutil.ignore_patterns(FILES.STORE.value))
+
+    return dest
+
+
+def _verify_store(refset_name:str, entry:dict) -> Path:
+    """Return the folder of a refset after rebuilding its store from its raw runs if
+    its hash does not match the manifest entry: in place for a local refset, in a copy
+    in USER_REFSETS_DIR for a packaged one; the new entry is saved in USER_REFSETS.
+    A failure to write is logged: the legacy analysis files are then used.
+    """
+
+    refset_dir = _refset_dir(entry)
+    store_fp = store.store_path(refset_dir)
+    if store_fp.exists() and file_fingerprint(store_fp)[2] == entry["hashes"]["store"]:
+        return refset_dir
+
+    logger.warning(f"The analysis store of refset {refset_name!r} does not match the manifest: rebuilding it.")
+    if run_files_hash(refset_dir) != entry["hashes"]["runs"]:
+        logger.warning(f"The run files of refset {refset_name!r} differ from those in the manifest.")
+    try:
+        if entry["packaged"]:
+            replaces = entry["hashes"]["store"]
+            refset_dir = _user_copy(refset_name, refset_dir)
+            logger.info(f"The packaged refset {refset_name!r} is rebuilt in {refset_dir}.")
+        else:
+            replaces = entry.get("replaces")
+        build_refset_store(refset_dir)
+        new_entry = refset_entry(refset_dir, subcmd=entry["subcmd"])
+        if replaces is not None:
+            new_entry["replaces"] = replaces
+        manifest = load_manifest(USER_REFSETS)
+        manifest[refset_name] = new_entry
+        save_manifest(manifest, USER_REFSETS)
+    except OSError as e:
+        logger.error(f"Could not rebuild the store of refset {refset_name!r}: {e}")
+
+    return refset_dir
+
+
+def get_refset(refset_name:str, subcmd:str=SUB1, verify:bool=True) -> Path:
+    """Return the path of a registered refset after verifying its analysis store
+    (if `verify`).
+    """
+
+    refsets = registry()
+    entry = refsets.get(refset_name)
+    if entry is None:
+        msg = f"Unknown refset: {refset_name!r}; registered: {list(refsets)}."
+        logger.error(msg)
+        raise ValueError(msg)
+
+    if subcmd != entry["subcmd"]:
+        msg = f"The refset {refset_name!r} applies to runs setup with `bench_setup {entry['subcmd']}`."
+        logger.error(msg)
+        raise ValueError(msg)
+
+    if verify:
+        return _verify_store(refset_name, entry)
+
+    return _refset_dir(entry)
+
+
+def register_refset(refset_name:str, bench_dir:str, subcmd:str=SUB1) -> dict:
+    """Add the set of runs in `bench_dir` to the local refsets (USER_REFSETS) under
+    `refset_name`; a packaged refset name cannot be reused.
+    Return the refset entry.
+    """
+
+    if refset_name in load_manifest(_manifest_fp(True)):
+        msg = f"{refset_name!r} is the name of a packaged refset."
+        logger.error(msg)
+        raise ValueError(msg)
+
+    entry = refset_entry(bench_dir, subcmd=subcmd)
+    manifest = load_manifest(USER_REFSETS)
+    manifest[refset_name] = entry
+    save_manifest(manifest, USER_REFSETS)
+    logger.info(f"Registered refset {refset_name!r}: {entry['path']}")
+
+    return entry
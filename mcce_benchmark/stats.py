@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+"""
+Module: stats.py
+
+Statistics of matched pkas (columns key (<pdb>/<resid>), calc, ref) for all the
+groupings at once: all the pkas, per residue type, per protein.
+The metrics of every group are obtained with grouped NumPy sums (np.bincount):
+  N, mean_delta & rmsd (of |calc - ref|), within_<b> (fraction of |calc - ref| <= b),
+  slope & intercept of the least-squares line ref = slope * calc + intercept,
+  as in pkanalysis.matched_pkas_stats.
+The bootstrap confidence intervals are batched: the metrics of all the resamples of
+all the groups are computed in the same sums. The pkas of a protein are correlated:
+for the 'all' & 'res' groupings, the resamples are cluster resamples, i.e. the proteins
+of each group are drawn with replacement with all their pkas of the group (as weights
+of the pkas); for the 'PDB' grouping, each pka is replaced by a random pka of its
+protein (per-pka resamples, which would be optimistic for the other groupings).
+The resamples are drawn with a fixed default seed, BOOT_SEED, so that a rebuilt
+PKAS_STATS file is identical for the same matched pkas.
+
+Mergeable accumulators, GroupSums: per-group sums of per-row values, which can be
+computed on chunks of rows & merged, e.g. by the streaming analysis (see
+pkanalysis.stream_analysis); pkas_sums accumulates the counts, sums, sums of squares
+and histograms of the calculated pkas per residue type, pkas_summary reports them.
+
+Functions:
+ grouped_metrics(calc, ref, codes, n_groups, within=WITHIN, weights=None) -> dict
+ bootstrap_metrics(calc, ref, codes, n_groups, n_boot=1000, within=WITHIN, seed=BOOT_SEED,
+                   clusters=None) -> dict
+ matched_stats(matches:pd.DataFrame, n_boot=1000, ci=0.95, within=WITHIN, seed=BOOT_SEED) -> pd.DataFrame
+ matched_stats_to_csv(matches:pd.DataFrame, out_dir:str, seed=BOOT_SEED, **kwargs) -> pd.DataFrame
+ pkas_sums(resids:pd.Series, pkas:np.ndarray, sums:GroupSums=None) -> GroupSums
+ pkas_summary(sums:GroupSums) -> pd.DataFrame
+ pkas_summary_to_tsv(pkas_df:pd.DataFrame, out_dir:str) -> pd.DataFrame
+"""
+
+from mcce_benchmark import FILES
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import warnings
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+WITHIN = (1, 2, 3)
+GROUPINGS = ["all", "res", "PDB"]
+BOOT_SEED = 20240326   # default seed of the bootstrap resamples: reproducible CIs
+# pkas histograms: unit bins [k, k + 1) over the titration range, 14 included in the last
+PKAS_HIST_BINS = 14
+PKAS_SUMS = (["N", "N_below", "N_above", "N_sharp", "N_in", "sum", "sum2"]
+             + [f"pka_{k}" for k in range(PKAS_HIST_BINS)])
+
+
+def grouped_metrics(calc:np.ndarray, ref:np.ndarray, codes:np.ndarray, n_groups:int,
+                    within:tuple = WITHIN, weights:np.ndarray = None) -> dict:
+    """Return the metrics of the pkas in each group, {metric: array of size n_groups},
+    given the group codes (0 to n_groups - 1) of the pkas, and their weights if any
+    (e.g. the number of times a pka is drawn in a resample).
+    The metrics of an empty group, or the fit of a degenerate group, are nan.
+    """
+
+    if weights is None:
+        def gsum(v):
+            return np.bincount(codes, weights=v, minlength=n_groups)
+        n = np.bincount(codes, minlength=n_groups).astype(float)
+    else:
+        def gsum(v):
+            return np.bincount(codes, weights=v * weights, minlength=n_groups)
+        n = gsum(np.ones(codes.size))
+    ad = np.abs(calc - ref)
+    sx, sy = gsum(calc), gsum(ref)
+    sxx, sxy = gsum(calc * calc), gsum(calc * ref)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out = {"N": n,
+               "mean_delta": gsum(ad) / n,
+               "rmsd": np.sqrt(gsum(ad * ad) / n)}
+        for b in within:
+            out[f"within_{b}"] = gsum((ad <= b).astype(float)) / n
+        den = n * sxx - sx * sx
+        slope = np.where(np.abs(den) > 1e-12 * n * n, (n * sxy - sx * sy) / den, np.nan)
+        out["slope"] = slope
+        out["intercept"] = (sy - slope * sx) / n
+
+    return out
+
+
+def bootstrap_metrics(calc:np.ndarray, ref:np.ndarray, codes:np.ndarray, n_groups:int,
+                      n_boot:int = 1000, within:tuple = WITHIN, seed:int = BOOT_SEED,
+                      clusters:np.ndarray = None) -> dict:
+    """Return the metrics of `n_boot` resamples of each group, {metric: (n_boot x n_groups)
+    array}; the resamples are stratified by group.
+    clusters (None): cluster codes (0 to n_clusters - 1) of the pkas, e.g. their protein:
+      the clusters of each group are resampled, as (n_boot x n_units) weights of the
+      (group, cluster) units; if None, the pkas are resampled as one index matrix.
+    """
+
+    rng = np.random.default_rng(seed)
+    boot_codes = (codes[None, :] + n_groups * np.arange(n_boot)[:, None]).ravel()
+
+    if clusters is not None:
+        units, unit_codes = np.unique(np.column_stack([codes, clusters]), axis=0, return_inverse=True)
+        unit_codes = unit_codes.ravel()
+        w = np.zeros((n_boot, len(units)))
+        for g in range(n_groups):
+            g_units = np.flatnonzero(units[:, 0] == g)
+            if g_units.size:
+                w[:, g_units] = rng.multinomial(g_units.size, np.full(g_units.size, 1 / g_units.size),
+                                                size=n_boot)
+        metrics = grouped_metrics(np.tile(calc, n_boot), np.tile(ref, n_boot), boot_codes,
+                                  n_boot * n_groups, within=within, weights=w[:, unit_codes].ravel())
+
+        return {m: v.reshape(n_boot, n_groups) for m, v in metrics.items()}
+
+    order = np.argsort(codes, kind="stable")
+    sizes = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # each pka -> a random pka of its group, for all the resamples at once:
+    u = rng.random((n_boot, codes.size))
+    idx = order[starts[codes] + (u * sizes[codes]).astype(np.int64)]
+
+    metrics = grouped_metrics(calc[idx].ravel(), ref[idx].ravel(), boot_codes,
+                              n_boot * n_groups, within=within)
+
+    return {m: v.reshape(n_boot, n_groups) for m, v in metrics.items()}
+
+
+def matched_stats(matches:pd.DataFrame, n_boot:int = 1000, ci:float = 0.95,
+                  within:tuple = WITHIN, seed:int = BOOT_SEED) -> pd.DataFrame:
+    """Return the metrics of the matched pkas for each grouping ('all', 'res': residue
+    type, 'PDB': protein) with their bootstrap percentile confidence intervals
+    (columns <metric>_lo, <metric>_hi; none if n_boot is 0) in a pandas.DataFrame
+    indexed by (grouping, group); the 'all' & 'res' CIs are from protein resamples.
+    `matches` has columns key (<pdb>/<resid>), calc, ref (e.g. from pkanalysis.match_pkas_df);
+    they are sorted first: the resamples, hence the CIs, do not depend on the rows order.
+    """
+
+    matches = matches.sort_values(["key", "calc", "ref"], kind="stable", ignore_index=True)
+    keys = matches.key.str.split("/", n=1)
+    calc = matches.calc.to_numpy(dtype=float)
+    ref = matches.ref.to_numpy(dtype=float)
+    labels = {"all": np.full(len(matches), "ALL", dtype=object),
+              "res": keys.str[1].str[:3].to_numpy(dtype=object),
+              "PDB": keys.str[0].to_numpy(dtype=object)}
+
+    pdb_codes = pd.factorize(labels["PDB"], sort=True)[0]
+    q = [(1 - ci) / 2, (1 + ci) / 2]
+    frames = []
+    for grouping in GROUPINGS:
+        codes, groups = pd.factorize(labels[grouping], sort=True)
+        df = pd.DataFrame(grouped_metrics(calc, ref, codes, len(groups), within=within),
+                          index=pd.MultiIndex.from_product([[grouping], groups],
+                                                           names=["grouping", "group"]))
+        df["N"] = df["N"].astype(int)
+        if n_boot:
+            clusters = None if grouping == "PDB" else pdb_codes
+            boot = bootstrap_metrics(calc, ref, codes, len(groups), n_boot=n_boot,
+                                     within=within, seed=seed, clusters=clusters)
+            for m, v in boot.items():
+                if m == "N":
+                    continue
+                with warnings.catch_warnings():
+                    # all-nan columns: degenerate fits
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    df[f"{m}_lo"], df[f"{m}_hi"] = np.nanquantile(v, q, axis=0)
+        frames.append(df)
+
+    return pd.concat(frames)
+
+
+def matched_stats_to_csv(matches:pd.DataFrame, out_dir:str, seed:int = BOOT_SEED,
+                         **kwargs) -> pd.DataFrame:
+    """Save the matched_stats of `matches` to FILES.PKAS_STATS in `out_dir`; return them."""
+
+    stats = matched_stats(matches, seed=seed, **kwargs)
+    fp = Path(out_dir).joinpath(FILES.PKAS_STATS.value)
+    stats.to_csv(fp, float_format="%.4f")
+    logger.info(f"Saved the matched pkas stats with bootstrap CIs: {fp}")
+
+    return stats
+
+
+class GroupSums:
+    """Mergeable sums of per-row values by group, {group: array of len(columns)}."""
+
+    def __init__(self, columns:list):
+        self.columns = list(columns)
+        self.sums = {}
+
+    def add(self, groups:np.ndarray, values:np.ndarray) -> "GroupSums":
+        """Add the rows of `values` (n_rows x n_columns) to the sums of their `groups`."""
+
+        codes, uniq = pd.factorize(np.asarray(groups, dtype=object))
+        values = np.asarray(values, dtype=float).reshape(len(codes), len(self.columns))
+        sums = np.column_stack([np.bincount(codes, weights=values[:, j], minlength=len(uniq))
+                                for j in range(len(self.columns))])
+        for g, row in zip(uniq, sums):
+            self.sums[g] = self.sums[g] + row if g in self.sums else row
+
+        return self
+
+    def merge(self, other:"GroupSums") -> "GroupSums":
+        for g, row in other.sums.items():
+            self.sums[g] = self.sums[g] + row if g in self.sums else row.copy()
+
+        return self
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame.from_dict(self.sums, orient="index", columns=self.columns).sort_index()
+
+
+def pkas_sums(resids:pd.Series, pkas:np.ndarray, sums:GroupSums = None) -> GroupSums:
+    """Add the calculated pkas (with the out of bounds codes of io_utils.pks_to_float)
+    to their residue type & 'ALL' PKAS_SUMS in `sums` (new if None); return them.
+    """
+
+    if sums is None:
+        sums = GroupSums(PKAS_SUMS)
+
+    pkas = np.asarray(pkas, dtype=float)
+    below, above, sharp = pkas == -8888., pkas == 8888., pkas == 9999.
+    inb = ~(below | above | sharp) & np.isfinite(pkas)
+    pk = np.where(inb, pkas, 0.)
+    hist = np.zeros((len(pkas), PKAS_HIST_BINS))
+    bins = np.clip(np.floor(pk), 0, PKAS_HIST_BINS - 1).astype(int)
+    hist[np.flatnonzero(inb), bins[inb]] = 1.
+    values = np.column_stack([np.ones(len(pkas)), below, above, sharp, inb, pk, pk * pk, hist])
+
+    res = pd.Series(resids, dtype=object).str[:3].to_numpy(dtype=object)
+    sums.add(res, values)
+    sums.add(np.full(len(pkas), "ALL", dtype=object), values)
+
+    return sums
+
+
+def pkas_summary(sums:GroupSums) -> pd.DataFrame:
+    """Return the summary of the pkas sums of pkas_sums per group ('ALL' first):
+    counts, mean & sd of the in bounds pkas, and their histogram.
+    """
+
+    df = sums.to_df()
+    df = pd.concat([df.loc[["ALL"]], df.drop(index="ALL")]) if "ALL" in df.index else df
+    n = df["N_in"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = df["sum"] / n
+        sd = np.sqrt(np.maximum(df["sum2"] - n * mean * mean, 0.) / (n - 1))
+    out = df[["N", "N_below", "N_above", "N_sharp", "N_in"]].astype(int)
+    out["mean"] = mean.where(n > 0)
+    out["sd"] = sd.where(n > 1)
+    hist = df[[f"pka_{k}" for k in range(PKAS_HIST_BINS)]].astype(int)
+    out = pd.concat([out, hist], axis=1)
+    out.index.name = "res"
+
+    return out
+
+
+def pkas_summary_to_tsv(pkas_df:pd.DataFrame, out_dir:str) -> pd.DataFrame:
+    """Save the pkas_summary of the collated pK.out frame `pkas_df` (columns resid@<titr>,
+    pKa/Em, ...) to FILES.PKAS_SUMMARY in `out_dir`; return it.
+    """
+
+    summary = pkas_summary(pkas_sums(pkas_df.iloc[:, 0], pkas_df["pKa/Em"].to_numpy()))
+    fp = Path(out_dir).joinpath(FILES.PKAS_SUMMARY.value)
+    summary.to_csv(fp, sep="\t", float_format="%.3f")
+    logger.info(f"Saved the pkas summary per residue type: {fp}")
+
+    return summary
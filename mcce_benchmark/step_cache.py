@@ -0,0 +1,337 @@
+#!/usr/bin/env python
+
+"""
+Module: step_cache.py
+
+Content-addressed cache of the outputs of mcce steps 1 and 2, shared across
+benchmarking sets (e.g. parameter sweeps over step3/step4 options).
+
+Cache key of step n (1 or 2): sha256 of
+  - the content of the run's input pdb (prot.pdb);
+  - the command lines of steps 1 through n in the run script, i.e. the step options
+    rendered by custom_sh.populate_custom_template (or the default script);
+  - the MCCE version identity: hashes of the mcce executable and step<n>.py scripts
+    found in USER_MCCE.
+
+Cache layout:
+  <cache_dir>/<key[:2]>/<key>/ : outputs of steps 1 through n (see STEP_FILES)
+                                 + run.prm.record truncated before the next step;
+                                 read-only copies: a cache entry shares no file with
+                                 a run folder, where mcce may rewrite its outputs.
+
+Workflow:
+ - `bench_setup [pkdb_pdbs, user_pdbs] --step_cache` calls `enable_step_cache`, which
+   saves the cache settings in <bench_dir>/runs/CACHE_CFG and adds a guard to the
+   step1 & step2 lines of the run script so that they are skipped when the
+   environment variable MCCE_CACHED_STEPS is >= the step number.
+ - Before launching a run, `batch_submit.batch_run` calls `fetch_cached_steps`, which
+   copies the cached outputs into the run folder; the number of steps found is
+   passed to the script via MCCE_CACHED_STEPS.
+ - When a run is no longer running, `store_step_outputs` adds the outputs of its
+   completed steps to the cache, then the cache is trimmed to its maximal size by
+   `evict_lru`. A step is completed if the run is completed or if the next step was
+   started (its #STEP record is in run.prm.record): the outputs of a step interrupted
+   by a failed or killed run may be truncated.
+
+Functions:
+ get_mcce_version_id() -> str
+ guard_script_steps(sh_text:str) -> str
+ script_step_lines(sh_path:str) -> dict
+ step_keys(run_dir:str, step_lines:dict) -> dict
+ enable_step_cache(bench_dir:str, job_name:str, cache_dir:str, max_gb:float) -> None
+ read_cache_config(runs_dir:str) -> Union[dict, None]
+ fetch_cached_steps(run_dir:str, keys:dict, cache_dir:str) -> int
+ store_step_outputs(run_dir:str, keys:dict, cache_dir:str, max_gb:float,
+                    run_completed:bool=False) -> list
+ evict_lru(cache_dir:str, max_gb:float) -> int
+"""
+
+from mcce_benchmark import RUNS_DIR, USER_MCCE
+from mcce_benchmark.io_utils import Pathok, file_fingerprint, make_executable
+import hashlib
+import logging
+import os
+from pathlib import Path
+import shutil
+from typing import Union
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+CACHE_CFG = "step_cache.txt"   # in <bench_dir>/runs
+CACHE_DIR = Path("~/.cache/mcce_benchmark/steps").expanduser()
+CACHE_MAX_GB = 10.
+CACHED_STEPS_VAR = "MCCE_CACHED_STEPS"
+
+# outputs of each step needed by the following ones; step<n>_out.pdb is required:
+STEP_FILES = {1: ["step0_out.pdb", "step1_out.pdb", "head1.lst", "new.tpl", "name.txt"],
+              2: ["step2_out.pdb", "head2.lst", "rot_stat"],
+             }
+
+_version_id = None
+
+
+def get_mcce_version_id() -> str:
+    """Return the identity of the MCCE installation in USER_MCCE: sha256 of the hashes
+    of the mcce executable and of the scripts of the cached steps.
+    """
+
+    global _version_id
+    if _version_id is not None:
+        return _version_id
+
+    h = hashlib.sha256()
+    for name in ["mcce"] + [f"step{n}.py" for n in STEP_FILES]:
+        fp = USER_MCCE.joinpath(name)
+        if fp.exists():
+            h.update(f"{name}:{file_fingerprint(fp.resolve())[2]}".encode())
+    _version_id = h.hexdigest()
+
+    return _version_id
+
+
+def _guard(n:int) -> str:
+    return f'[ "${{{CACHED_STEPS_VAR}:-0}}" -ge {n} ] || '
+
+
+def guard_script_steps(sh_text:str) -> str:
+    """Return the script text with the cached steps command lines prefixed by a
+    guard, which skips the step if MCCE_CACHED_STEPS >= step number.
+    """
+
+    lines = []
+    for line in sh_text.splitlines():
+        for n in STEP_FILES:
+            if line.startswith(f"step{n}.py"):
+                line = _guard(n) + line
+                break
+        lines.append(line)
+
+    return "\n".join(lines) + "\n"
+
+
+def script_step_lines(sh_path:str) -> dict:
+    """Return the command lines of the cached steps in the run script
+    (without guard) in a dict: {step number: line}.
+    """
+
+    step_lines = {}
+    with open(sh_path) as fh:
+        for line in fh:
+            cmd = line.strip().split("|| ", maxsplit=1)[-1]
+            for n in STEP_FILES:
+                if cmd.startswith(f"step{n}.py"):
+                    step_lines[n] = " ".join(cmd.split())
+
+    return step_lines
+
+
+def step_keys(run_dir:str, step_lines:dict) -> dict:
+    """Return the cache keys of the steps in `step_lines` for the run in `run_dir`
+    in a dict: {step number: key}. The key of step n depends on the lines of
+    steps 1 through n.
+    """
+
+    prot = Pathok(Path(run_dir).joinpath("prot.pdb")).resolve()
+    h = hashlib.sha256()
+    h.update(file_fingerprint(prot)[2].encode())
+    h.update(get_mcce_version_id().encode())
+
+    keys = {}
+    for n in sorted(STEP_FILES):
+        if n not in step_lines:
+            break
+        h.update(step_lines[n].encode())
+        keys[n] = h.copy().hexdigest()
+
+    return keys
+
+
+def enable_step_cache(bench_dir:str, job_name:str,
+                      cache_dir:str = CACHE_DIR,
+                      max_gb:float = CACHE_MAX_GB) -> None:
+    """Save the cache settings in <bench_dir>/runs/CACHE_CFG and add the step guards
+    to the run script <bench_dir>/runs/<job_name>.sh. A soft-linked script is replaced
+    by a guarded copy.
+    """
+
+    runs_dir = Pathok(Path(bench_dir).joinpath(RUNS_DIR))
+    cache_dir = Path(cache_dir).expanduser().resolve()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(runs_dir.joinpath(CACHE_CFG), "w") as fh:
+        fh.write(f"cache_dir\t{cache_dir}\nmax_gb\t{max_gb}\n")
+
+    sh_path = Pathok(runs_dir.joinpath(f"{job_name}.sh"))
+    with open(sh_path) as fh:
+        sh_text = fh.read()
+    if _guard(1) not in sh_text:
+        sh_text = guard_script_steps(sh_text)
+    if sh_path.is_symlink():
+        sh_path.unlink()
+    with open(sh_path, "w") as fh:
+        fh.write(sh_text)
+    make_executable(sh_path)
+    logger.info(f"Step cache enabled in {cache_dir} for {sh_path.name}.")
+
+    return
+
+
+def read_cache_config(runs_dir:str) -> Union[dict, None]:
+    """Return the cache settings dict {'cache_dir':Path, 'max_gb':float} saved in
+    <bench_dir>/runs/CACHE_CFG, or None if the cache is not enabled.
+    """
+
+    fp = Path(runs_dir).joinpath(CACHE_CFG)
+    if not fp.exists():
+        return None
+
+    cfg = {}
+    with open(fp) as fh:
+        for line in fh:
+            fields = line.strip().split("\t")
+            if len(fields) == 2:
+                cfg[fields[0]] = fields[1]
+
+    return {"cache_dir": Path(cfg["cache_dir"]),
+            "max_gb": float(cfg.get("max_gb", CACHE_MAX_GB))}
+
+
+def _entry_dir(cache_dir:Path, key:str) -> Path:
+    return Path(cache_dir).joinpath(key[:2], key)
+
+
+def _copy(src:Path, dest:Path, read_only:bool = False) -> None:
+    """Copy `src` to a new file `dest`: no hard link, as mcce truncates the outputs
+    of a rerun step (open with 'w'), which would also truncate the linked file.
+    """
+    if dest.exists() or dest.is_symlink():
+        dest.unlink()
+    shutil.copyfile(src, dest)
+    if read_only:
+        dest.chmod(0o444)
+
+
+def fetch_cached_steps(run_dir:str, keys:dict, cache_dir:str = CACHE_DIR) -> int:
+    """Copy into `run_dir` the outputs of the latest step found in the cache.
+    Return the number of steps retrieved (0 if none).
+    """
+
+    run_dir = Path(run_dir)
+    for n in sorted(keys, reverse=True):
+        entry = _entry_dir(cache_dir, keys[n])
+        if not entry.joinpath(f"step{n}_out.pdb").exists():
+            continue
+        for fp in entry.iterdir():
+            _copy(fp, run_dir.joinpath(fp.name))
+        # entry mtime is the LRU clock:
+        os.utime(entry)
+        logger.info(f"{run_dir.name}: outputs of steps 1-{n} retrieved from cache.")
+        return n
+
+    return 0
+
+
+def _record_upto(record_fp:Path, n:int) -> list:
+    """Return the lines of run.prm.record preceding the record of step n+1."""
+
+    lines = []
+    with open(record_fp) as fh:
+        for line in fh:
+            if line.startswith(f"#STEP{n+1}"):
+                break
+            lines.append(line)
+
+    return lines
+
+
+def _step_started(record_fp:Path, n:int) -> bool:
+    """Return whether run.prm.record has the record of step n."""
+
+    if not record_fp.exists():
+        return False
+    with open(record_fp) as fh:
+        return any(line.startswith(f"#STEP{n}") for line in fh)
+
+
+def store_step_outputs(run_dir:str, keys:dict,
+                       cache_dir:str = CACHE_DIR,
+                       max_gb:float = CACHE_MAX_GB,
+                       run_completed:bool = False) -> list:
+    """Add the outputs of the completed steps in `keys` found in `run_dir` to the
+    cache, then evict the least recently used entries beyond `max_gb`.
+    A step is completed if `run_completed` or if the next step was started.
+    Return the list of steps that were added.
+    """
+
+    run_dir = Path(run_dir)
+    record = run_dir.joinpath("run.prm.record")
+    added = []
+    files = []
+    for n in sorted(keys):
+        files.extend(STEP_FILES[n])
+        if not run_dir.joinpath(f"step{n}_out.pdb").exists():
+            break
+        if not (run_completed or _step_started(record, n + 1)):
+            logger.info(f"{run_dir.name}: step {n} not confirmed complete: not cached.")
+            break
+        entry = _entry_dir(cache_dir, keys[n])
+        if entry.exists():
+            continue
+
+        tmp = entry.with_name(f".{entry.name}.tmp")
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir(parents=True)
+        for f in files:
+            fp = run_dir.joinpath(f)
+            if fp.exists():
+                _copy(fp, tmp.joinpath(f), read_only=True)
+        if record.exists():
+            with open(tmp.joinpath(record.name), "w") as fh:
+                fh.writelines(_record_upto(record, n))
+            tmp.joinpath(record.name).chmod(0o444)
+        # atomic publication of the entry:
+        tmp.rename(entry)
+        added.append(n)
+
+    if added:
+        logger.info(f"{run_dir.name}: outputs of steps {added} added to cache.")
+        evict_lru(cache_dir, max_gb)
+
+    return added
+
+
+def evict_lru(cache_dir:str = CACHE_DIR, max_gb:float = CACHE_MAX_GB) -> int:
+    """Delete the least recently used cache entries until the cache size is
+    below `max_gb`. Return the number of deleted entries.
+    """
+
+    cache_dir = Path(cache_dir)
+    if not cache_dir.is_dir():
+        return 0
+
+    entries = []
+    total = 0
+    for entry in cache_dir.glob("*/*"):
+        if not entry.is_dir() or entry.name.startswith("."):
+            continue
+        size = sum(fp.stat().st_size for fp in entry.iterdir())
+        entries.append((entry.stat().st_mtime, size, entry))
+        total += size
+
+    max_bytes = max_gb * 1024**3
+    n_evicted = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry)
+        total -= size
+        n_evicted += 1
+
+    if n_evicted:
+        logger.info(f"Evicted {n_evicted} cache entries from {cache_dir}.")
+
+    return n_evicted
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+
+"""
+Module: store.py
+
+Columnar store of the analysis outputs of a set of runs: one NumPy `.npz` archive,
+<bench_dir>/analysis/FILES.STORE, holding one column per entry plus a json schema
+with a version number.
+Tables written by pkanalysis.analyze_runs:
+  pkas     : PDB, resid, pka         :: in bounds pkas of the completed runs (JOB_PKAS)
+  all_pkas : collated pK.out         :: (ALL_PKAS)
+  sumcrg   : collated sum_crg.out    :: (ALL_SUMCRG)
+  refit    : refit pK.out columns    :: (ALL_PKAS_REFIT), see titration.py
+  counts   : PDB, confs, res         :: (CONF_COUNTS, RES_COUNTS)
+  times    : PDB, step, seconds      :: (RUN_TIMES)
+  matches  : key, calc, ref          :: (MATCHED_PKAS), pkdb_pdbs only
+
+The archive members are loaded on access, so that a reader only loads the columns
+it requests. The legacy FILES remain the human-readable outputs; they can be
+recreated from the store with export_legacy.
+
+Functions:
+ write_store(bench_dir:str, tables:dict, compress:bool=False) -> Path
+ store_schema(bench_dir:str) -> Union[dict, None]
+ read_table(bench_dir:str, table:str, columns:list=None) -> Union[pd.DataFrame, None]
+ export_legacy(bench_dir:str, kind:str=SUB1) -> list
+"""
+
+from mcce_benchmark import ANALYZE_DIR, FILES, SUB1
+from mcce_benchmark.io_utils import Pathok, to_pickle
+import json
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Union
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+STORE_VERSION = 1
+SCHEMA_KEY = "__schema__"
+
+
+def store_path(bench_dir:str) -> Path:
+    """Return the path of the analysis store of `bench_dir`."""
+
+    return Path(bench_dir).joinpath(ANALYZE_DIR, FILES.STORE.value)
+
+
+def _column_array(col:pd.Series) -> tuple:
+    """Return the (array, kind) of a column; kind is "num" or "str".
+    Non-numeric columns are saved as unicode arrays, missing values as "".
+    """
+
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.to_numpy(), "num"
+
+    return col.fillna("").astype(str).to_numpy(dtype=str), "str"
+
+
+def write_store(bench_dir:str, tables:dict, compress:bool=False) -> Path:
+    """Save the pandas.DataFrames in `tables`, {name: df}, to the analysis store
+    of `bench_dir`; a named index is saved as a column & restored by read_table.
+    compress (bool, False): zip-compress the archive members, e.g. for a shipped store.
+    Return the store path.
+    """
+
+    fp = store_path(bench_dir)
+    fp.parent.mkdir(exist_ok=True)
+
+    schema = {"version": STORE_VERSION, "tables": {}}
+    arrays = {}
+    for name, df in tables.items():
+        if df is None:
+            continue
+        index = [n for n in df.index.names if n is not None]
+        if index:
+            df = df.reset_index()
+        cols, kinds = [], []
+        for i, c in enumerate(df.columns):
+            arrays[f"{name}:{i}"], kind = _column_array(df.iloc[:, i])
+            cols.append(str(c))
+            kinds.append(kind)
+        schema["tables"][name] = {"columns": cols, "kinds": kinds, "index": index}
+
+    arrays[SCHEMA_KEY] = np.array(json.dumps(schema))
+    if compress:
+        np.savez_compressed(fp, **arrays)
+    else:
+        np.savez(fp, **arrays)
+    logger.info(f"Saved analysis store: {fp}; tables: {list(schema['tables'])}")
+
+    return fp
+
+
+def store_schema(bench_dir:str) -> Union[dict, None]:
+    """Return the schema of the analysis store of `bench_dir`, or None if the store
+    is missing or of a different version.
+    """
+
+    fp = store_path(bench_dir)
+    if not fp.exists():
+        return None
+
+    with np.load(fp, allow_pickle=False) as npz:
+        schema = json.loads(str(npz[SCHEMA_KEY]))
+    if schema.get("version") != STORE_VERSION:
+        logger.warning(f"Store version {schema.get('version')} != {STORE_VERSION}: {fp}; re-run the analysis.")
+        return None
+
+    return schema
+
+
+def read_table(bench_dir:str, table:str, columns:list=None) -> Union[pd.DataFrame, None]:
+    """Return the `columns` (default: all) of `table` from the analysis store of
+    `bench_dir` in a pandas.DataFrame; the saved index is restored if all its columns
+    are loaded.
+    Return None if the store or the table is not found.
+    """
+
+    schema = store_schema(bench_dir)
+    if schema is None or table not in schema["tables"]:
+        return None
+
+    tbl = schema["tables"][table]
+    if columns is None:
+        columns = tbl["columns"]
+    missing = set(columns) - set(tbl["columns"])
+    if missing:
+        logger.error(f"Columns not in table {table!r}: {sorted(missing)}")
+        raise KeyError(f"Columns not in table {table!r}: {sorted(missing)}")
+
+    data = {}
+    with np.load(store_path(bench_dir), allow_pickle=False) as npz:
+        for c in columns:
+            i = tbl["columns"].index(c)
+            data[c] = npz[f"{table}:{i}"]
+            if tbl["kinds"][i] == "str":
+                data[c] = np.array(data[c].tolist(), dtype=object)
+    df = pd.DataFrame(data, columns=columns)
+
+    if tbl["index"] and set(tbl["index"]).issubset(columns):
+        df.set_index(tbl["index"], inplace=True)
+
+    return df
+
+
+def export_legacy(bench_dir:str, kind:str=SUB1) -> list:
+    """Recreate the legacy JOB_PKAS, CONF_COUNTS, RES_COUNTS, RUN_TIMES and
+    MATCHED_PKAS files of `bench_dir` from its analysis store.
+    Return the list of the files written.
+    """
+
+    analyze = Pathok(Path(bench_dir).joinpath(ANALYZE_DIR))
+    written = []
+
+    pkas = read_table(bench_dir, "pkas")
+    if pkas is not None:
+        fp = analyze.joinpath(FILES.JOB_PKAS.value)
+        to_pickle(dict(zip(zip(pkas.PDB, pkas.resid), pkas.pka)), fp)
+        written.append(fp)
+
+    counts = read_table(bench_dir, "counts")
+    if counts is not None:
+        for c, fname in [("confs", FILES.CONF_COUNTS.value), ("res", FILES.RES_COUNTS.value)]:
+            fp = analyze.joinpath(fname)
+            counts[[c]].to_csv(fp, sep="\t")
+            written.append(fp)
+
+    times = read_table(bench_dir, "times")
+    if times is not None:
+        fp = analyze.joinpath(FILES.RUN_TIMES.value)
+        times.to_csv(fp, sep="\t", index=False)
+        written.append(fp)
+
+    matches = read_table(bench_dir, "matches")
+    if matches is not None:
+        fp = analyze.joinpath(FILES.MATCHED_PKAS.value)
+        hdr = "key,mcce,expl\n" if kind == SUB1 else "key,set1,set2\n"
+        with open(fp, "w") as fh:
+            fh.writelines(hdr)
+            fh.writelines("{},{},{}\n".format(*row) for row in matches.itertuples(index=False))
+        written.append(fp)
+
+    return written
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+"""
+Module: sweep.py
+
+Setup of a parameter sweep: one benchmarking set ("point") per combination of the
+step options given in a grid, e.g. `-grid d=4,8 n=15,30` => 4 points.
+
+Sweep folder layout:
+  <sweep_dir>/
+    SWEEP_MANIFEST     : one row per point: point, bench_dir, job_name (MANIFEST_COLS),
+                         + the grid options
+    staged/runs/       : pdbs staged once (read-only), shared by all points
+    <job_name>NN/runs/ : one bench_dir per point; its pdb folders soft-link the staged pdbs
+
+All the points are processed by a single scheduler (crontab entry), see
+batch_submit.launch_sweep: the points share the n_batch cores and, via the shared
+steps cache (step_cache.py), the outputs of identical steps 1 & 2.
+The analysis (bench_analyze many) and comparison (bench_compare -dirs) of a sweep
+folder apply to its points, see point_dirs; the grid options of each point, see
+points_params, are added to the analysis summary.
+
+Functions:
+ parse_grid(grid_args:list) -> dict
+ grid_points(grid:dict) -> list
+ setup_sweep(args:Namespace) -> pd.DataFrame
+ read_sweep_manifest(sweep_dir:str) -> Union[pd.DataFrame, None]
+ is_sweep(bench_dir:str) -> bool
+ point_dirs(sweep_dir:str) -> list
+ points_params(bench_dirs:list) -> pd.DataFrame
+"""
+
+from argparse import Namespace
+from copy import deepcopy
+from itertools import product
+from mcce_benchmark import BENCH, RUNS_DIR, SWEEP_MANIFEST
+from mcce_benchmark import audit, custom_sh, job_setup, step_cache
+import logging
+import os
+import pandas as pd
+from pathlib import Path
+import shutil
+from typing import Union
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+STAGED_DIR = "staged"
+MANIFEST_COLS = ["point", "bench_dir", "job_name"]   # + the grid options
+MAX_SH_NAME = 15  # pgrep only matches the first 15 chars of a process name
+
+
+def parse_grid(grid_args:list) -> dict:
+    """Return a dict {option: [values]} from a list of 'option=v1,v2,...' strings.
+    The options are the mcce steps options of the cli, see custom_sh.all_default_opts;
+    the values are converted to the type of the option default.
+    """
+
+    grid = {}
+    for g in grid_args:
+        try:
+            opt, vals = g.split("=", maxsplit=1)
+        except ValueError:
+            msg = f"Invalid grid entry: {g!r}; expected format: option=v1,v2,..."
+            logger.error(msg)
+            raise ValueError(msg)
+
+        opt = opt.strip().lstrip("-")
+        if opt not in custom_sh.all_default_opts:
+            msg = f"Unknown step option in grid: {opt!r}."
+            logger.error(msg)
+            raise ValueError(msg)
+
+        default = custom_sh.all_default_opts[opt]
+        if isinstance(default, list):
+            msg = f"Option {opt!r} cannot be swept."
+            logger.error(msg)
+            raise ValueError(msg)
+
+        values = []
+        for v in vals.split(","):
+            v = v.strip()
+            if isinstance(default, bool):
+                values.append(v.lower() in ["1", "t", "true", "y", "yes"])
+            else:
+                values.append(type(default)(v))
+        grid[opt] = values
+
+    return grid
+
+
+def grid_points(grid:dict) -> list:
+    """Return the list of dicts {option: value} for all the combinations in `grid`."""
+
+    opts = list(grid)
+    return [dict(zip(opts, vals)) for vals in product(*[grid[o] for o in opts])]
+
+
+def stage_pdbs(sweep_dir:Path, args:Namespace) -> Path:
+    """Setup the pdbs once in <sweep_dir>/staged/runs, from either args.pdbs_list or
+    the pKaDBv1 pdbs, and make them read-only.
+    Return the staged runs folder path.
+    """
+
+    staged = sweep_dir.joinpath(STAGED_DIR)
+    staged_args = Namespace(bench_dir=staged,
+                            pdbs_list=getattr(args, "pdbs_list", None),
+                            incremental=False)
+    if staged_args.pdbs_list is not None:
+        job_setup.setup_user_runs(staged_args)
+    else:
+        job_setup.setup_expl_runs(staged, args.n_pdbs, getattr(args, "subset", None))
+
+    staged_runs = staged.joinpath(RUNS_DIR)
+    for fp in staged_runs.glob("*/*"):
+        if fp.is_file() and not fp.is_symlink():
+            fp.chmod(0o444)
+
+    return staged_runs
+
+
+def link_staged_runs(staged_runs:Path, bench_dir:Path) -> None:
+    """Create <bench_dir>/runs with a folder per staged pdb, in which the staged
+    files are soft-linked (relative links), and a copy of the staged book.
+    """
+
+    runs_dir = bench_dir.joinpath(RUNS_DIR)
+    runs_dir.mkdir(parents=True, exist_ok=True)
+
+    for d in audit.book_states(staged_runs.joinpath(BENCH.Q_BOOK)):
+        pd_dir = runs_dir.joinpath(d)
+        pd_dir.mkdir(exist_ok=True)
+        for fp in staged_runs.joinpath(d).iterdir():
+            link = pd_dir.joinpath(fp.name)
+            if link.exists() or link.is_symlink():
+                continue
+            if fp.is_symlink():   # prot.pdb
+                link.symlink_to(os.readlink(fp))
+            else:
+                link.symlink_to(os.path.relpath(fp, pd_dir))
+
+    shutil.copy(staged_runs.joinpath(BENCH.Q_BOOK), runs_dir.joinpath(BENCH.Q_BOOK))
+    default_sh = staged_runs.joinpath(BENCH.DEFAULT_JOB_SH.name)
+    shutil.copy(default_sh, runs_dir.joinpath(default_sh.name))
+
+    return
+
+
+def setup_sweep(args:Namespace) -> pd.DataFrame:
+    """Setup a sweep in args.bench_dir: staged pdbs, one bench_dir & run script per
+    point of the grid in args.grid, with the steps cache enabled, and the manifest.
+    Return the manifest as a pandas.DataFrame.
+    """
+
+    sweep_dir = Path(args.bench_dir)
+    sweep_dir.mkdir(exist_ok=True)
+
+    grid = parse_grid(args.grid)
+    points = grid_points(grid)
+    n_digits = max(2, len(str(len(points))))
+    sh_len = len(f"{args.job_name}{0:0{n_digits}d}.sh")
+    if sh_len > MAX_SH_NAME:
+        logger.warning(f"The points scripts names ({sh_len} chars) exceed {MAX_SH_NAME} chars; "
+                       + "their running jobs may not be detected: use a shorter job_name.")
+
+    staged_runs = stage_pdbs(sweep_dir, args)
+
+    rows = []
+    for i, point in enumerate(points, start=1):
+        job_name = f"{args.job_name}{i:0{n_digits}d}"
+        bench_dir = sweep_dir.joinpath(job_name)
+        link_staged_runs(staged_runs, bench_dir)
+
+        point_args = deepcopy(args)
+        for opt, v in point.items():
+            setattr(point_args, opt, v)
+        custom_sh.write_run_script_from_template(bench_dir,
+                                                 job_name,
+                                                 job_args=point_args)
+        step_cache.enable_step_cache(bench_dir,
+                                     job_name,
+                                     cache_dir=args.cache_dir,
+                                     max_gb=args.cache_max_gb)
+        rows.append({"point": i, "bench_dir": str(bench_dir), "job_name": job_name, **point})
+        logger.info(f"Sweep point {i}: {job_name} :: {point}")
+
+    manifest = pd.DataFrame(rows)
+    manifest.to_csv(sweep_dir.joinpath(SWEEP_MANIFEST), sep="\t", index=False)
+    logger.info(f"Sweep of {len(points)} points setup in {sweep_dir}.")
+
+    return manifest
+
+
+def read_sweep_manifest(sweep_dir:str) -> Union[pd.DataFrame, None]:
+    """Return the sweep manifest of `sweep_dir` as a pandas.DataFrame, or None
+    if `sweep_dir` is not a sweep folder.
+    """
+
+    fp = Path(sweep_dir).joinpath(SWEEP_MANIFEST)
+    if not fp.exists():
+        return None
+
+    return pd.read_csv(fp, sep="\t")
+
+
+def is_sweep(bench_dir:str) -> bool:
+    """Return True if `bench_dir` is a sweep folder."""
+
+    return Path(bench_dir).joinpath(SWEEP_MANIFEST).exists()
+
+
+def point_dirs(sweep_dir:str) -> list:
+    """Return the bench_dirs of the points of the sweep in `sweep_dir`, in point order;
+    they are located by their job_name, the manifest bench_dir may be relative.
+    """
+
+    manifest = read_sweep_manifest(sweep_dir)
+    if manifest is None:
+        return []
+
+    return [Path(sweep_dir).joinpath(job_name) for job_name in manifest.job_name]
+
+
+def points_params(bench_dirs:list) -> pd.DataFrame:
+    """Return the grid options of the sets in `bench_dirs` that are points of a sweep,
+    read from the manifest of their parent folder: a pandas.DataFrame indexed by the
+    sets paths (str, as given), with one column per option.
+    """
+
+    manifests = {}
+    rows = {}
+    for d in bench_dirs:
+        point_dir = Path(d).resolve()
+        sweep_dir = point_dir.parent
+        if sweep_dir not in manifests:
+            manifests[sweep_dir] = read_sweep_manifest(sweep_dir)
+        manifest = manifests[sweep_dir]
+        if manifest is None:
+            continue
+        point = manifest[manifest.job_name == point_dir.name]
+        if point.empty:
+            continue
+        rows[str(d)] = point.drop(columns=MANIFEST_COLS).iloc[0].to_dict()
+
+    return pd.DataFrame.from_dict(rows, orient="index")
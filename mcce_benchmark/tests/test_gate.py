@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mcce_benchmark import BENCH, RUNS_DIR, GATE_LOG
+from mcce_benchmark import gate
+from mcce_benchmark.io_utils import get_book_dirs_for_status
+
+
+N_RES = 5   # pkas per protein
+
+
+def ref_pkas(n_pdbs:int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({"PDB": np.repeat([f"P{i:03d}" for i in range(n_pdbs)], N_RES),
+                         "resid": [f"ASP-A{j:04d}_" for j in range(N_RES)] * n_pdbs,
+                         "pka": rng.uniform(2, 6, n_pdbs * N_RES)})
+
+
+def make_bench(tmp_path, n_runs:int, n_completed:int):
+    runs_dir = tmp_path.joinpath(RUNS_DIR)
+    runs_dir.mkdir(exist_ok=True)
+    states = ["c"] * n_completed + ["r"] * (n_runs - n_completed)
+    book = "".join(f"P{i:03d} {s}\n" for i, s in enumerate(states))
+    runs_dir.joinpath(BENCH.Q_BOOK).write_text(book)
+
+    return tmp_path
+
+
+@pytest.fixture
+def calc_pkas(monkeypatch):
+    """Patch gate.completed_pkas_df: the calculated pkas of the completed runs are
+    the reference pkas + offset + noise.
+    """
+
+    def patch(ref_df:pd.DataFrame, offset:float, sd:float = 0.3):
+        rng = np.random.default_rng(1)
+        calc_df = ref_df.assign(pka=ref_df.pka + offset + rng.normal(0, sd, len(ref_df)))
+
+        def completed_pkas_df(bench_dir):
+            done = get_book_dirs_for_status(bench_dir.joinpath(RUNS_DIR, BENCH.Q_BOOK))
+            return calc_df[calc_df.PDB.isin(done)].reset_index(drop=True)
+
+        monkeypatch.setattr(gate, "completed_pkas_df", completed_pkas_df)
+
+    return patch
+
+
+class TestMetricBounds:
+
+    def test_classic_se(self):
+        delta = np.random.default_rng(0).normal(0.5, 1, 200)
+        z = 1.96
+        b = gate.metric_bounds(delta, z)
+        x = np.abs(delta)
+        half = z * x.std(ddof=1) / np.sqrt(x.size)
+        assert b["mean_delta"] == pytest.approx((x.mean(), x.mean() - half, x.mean() + half))
+        x2 = delta**2
+        half2 = z * x2.std(ddof=1) / np.sqrt(x2.size)
+        assert b["rmsd"] == pytest.approx((np.sqrt(x2.mean()),
+                                           np.sqrt(max(x2.mean() - half2, 0.)),
+                                           np.sqrt(x2.mean() + half2)))
+        # one delta per cluster: the classic standard error
+        b_cl = gate.metric_bounds(delta, z, clusters=[f"P{i}" for i in range(200)])
+        for m in gate.GATE_METRICS:
+            assert b_cl[m] == pytest.approx(b[m])
+
+    def test_correlated_clusters_widen(self):
+        rng = np.random.default_rng(0)
+        # 20 proteins with a shared shift of their 10 deltas:
+        delta = np.repeat(rng.normal(0, 1, 20), 10) + rng.normal(0, 0.2, 200)
+        clusters = np.repeat(np.arange(20), 10)
+        b = gate.metric_bounds(delta, 1.96)
+        b_cl = gate.metric_bounds(delta, 1.96, clusters=clusters)
+        for m in gate.GATE_METRICS:
+            assert b_cl[m][0] == pytest.approx(b[m][0])
+            assert b_cl[m][2] - b_cl[m][1] > 2 * (b[m][2] - b[m][1])
+
+    def test_single_cluster(self):
+        b = gate.metric_bounds(np.array([0.5, -1.0, 0.2]), 1.96, clusters=["A", "A", "A"])
+        assert b["mean_delta"][1] == 0.0
+        assert np.isinf(b["mean_delta"][2])
+
+
+class TestGateLook:
+
+    def test_min_runs(self, tmp_path, calc_pkas):
+        ref_df = ref_pkas(40)
+        calc_pkas(ref_df, 0.0)
+        bench = make_bench(tmp_path, 40, 5)
+        look = gate.gate_look(bench, ref_df, max_rmsd=1.0, min_runs=10)
+        assert look["look"] == 0
+        assert look["decision"] == "undecided"
+        assert not bench.joinpath(GATE_LOG).exists()
+
+    def test_looks_and_log(self, tmp_path, calc_pkas):
+        ref_df = ref_pkas(40)
+        calc_pkas(ref_df, 0.0)
+        bench = make_bench(tmp_path, 40, 10)
+        look1 = gate.gate_look(bench, ref_df, max_rmsd=1.0, min_runs=10)
+        assert look1["look"] == 1
+        assert look1["N"] == 10 * N_RES
+        assert look1["alpha_k"] == pytest.approx(gate.look_alpha(1, 0.05))
+
+        # no new completed runs: the previous look holds
+        again = gate.gate_look(bench, ref_df, max_rmsd=1.0, min_runs=10)
+        assert again["look"] == 1
+        assert len(gate.read_gate_log(bench)) == 1
+
+        make_bench(tmp_path, 40, 20)
+        look2 = gate.gate_look(bench, ref_df, max_rmsd=1.0, min_runs=10)
+        assert look2["look"] == 2
+        assert look2["alpha_k"] == pytest.approx(gate.look_alpha(2, 0.05))
+        log = gate.read_gate_log(bench)
+        assert log.look.tolist() == [1, 2]
+        assert (log.ref == gate.GATE_EXPL_REF).all()
+
+        # other settings: new log
+        look = gate.gate_look(bench, ref_df, max_rmsd=1.5, min_runs=10)
+        assert look["look"] == 1
+        assert gate.read_gate_log(bench).look.tolist() == [1]
+
+    def test_decisions(self, tmp_path, calc_pkas):
+        ref_df = ref_pkas(40)
+        calc_pkas(ref_df, 0.0)
+        bench = make_bench(tmp_path, 40, 20)
+        assert gate.gate_look(bench, ref_df, max_rmsd=1.0)["decision"] == "pass"
+
+        calc_pkas(ref_df, 2.0)
+        look = gate.gate_look(bench, ref_df, max_rmsd=1.0, max_mean_delta=1.0, alpha=0.1)
+        assert look["decision"] == "fail"
+        assert look["rmsd"][1] > 1.0
+
+    def test_finished_estimates_decide(self, tmp_path, calc_pkas):
+        ref_df = ref_pkas(12)
+        calc_pkas(ref_df, 0.0, sd=0.5)
+        bench = make_bench(tmp_path, 12, 12)
+        est, lo, hi = gate.gate_look(bench, ref_df, max_mean_delta=10.)["mean_delta"]
+        # all runs finished: the estimate decides between the bounds
+        look = gate.gate_look(bench, ref_df, max_mean_delta=(est + hi) / 2)
+        assert look["finished"]
+        assert look["decision"] == "pass"
+        look = gate.gate_look(bench, ref_df, max_mean_delta=(est + lo) / 2)
+        assert look["decision"] == "fail"
+
+    def test_no_maximum(self, tmp_path):
+        with pytest.raises(ValueError):
+            gate.gate_look(make_bench(tmp_path, 5, 5), ref_pkas(5))
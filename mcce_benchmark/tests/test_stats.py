@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mcce_benchmark.stats import grouped_metrics, bootstrap_metrics, matched_stats
+
+
+def random_pkas(n:int = 60, n_groups:int = 3, seed:int = 0) -> tuple:
+    rng = np.random.default_rng(seed)
+    calc = rng.uniform(0, 14, n)
+    ref = 0.8 * calc + 1.5 + rng.normal(0, 1, n)
+    codes = np.arange(n) % n_groups
+
+    return calc, ref, codes
+
+
+class TestGroupedMetrics:
+
+    def test_metrics_per_group(self):
+        calc, ref, codes = random_pkas()
+        out = grouped_metrics(calc, ref, codes, 3)
+        for g in range(3):
+            c, r = calc[codes == g], ref[codes == g]
+            ad = np.abs(c - r)
+            assert out["N"][g] == c.size
+            assert out["mean_delta"][g] == pytest.approx(ad.mean())
+            assert out["rmsd"][g] == pytest.approx(np.sqrt(np.mean(ad**2)))
+            for b in (1, 2, 3):
+                assert out[f"within_{b}"][g] == pytest.approx(np.mean(ad <= b))
+            # fit of ref = slope * calc + intercept:
+            slope, intercept = np.polyfit(c, r, 1)
+            assert out["slope"][g] == pytest.approx(slope)
+            assert out["intercept"][g] == pytest.approx(intercept)
+
+    def test_empty_group(self):
+        calc, ref, codes = random_pkas(n_groups=2)
+        out = grouped_metrics(calc, ref, codes, 3)
+        assert out["N"][2] == 0
+        for m in ["mean_delta", "rmsd", "within_1", "slope", "intercept"]:
+            assert np.isnan(out[m][2])
+            assert not np.isnan(out[m][:2]).any()
+
+    def test_degenerate_groups(self):
+        # group 0: a single pka; group 1: a constant calc: no fit
+        calc = np.array([5.0, 7.0, 7.0, 7.0])
+        ref = np.array([4.0, 6.0, 7.5, 8.0])
+        out = grouped_metrics(calc, ref, np.array([0, 1, 1, 1]), 2)
+        assert np.isnan(out["slope"]).all()
+        assert np.isnan(out["intercept"]).all()
+        assert out["mean_delta"] == pytest.approx([1.0, 2.5 / 3])
+
+    def test_weights_as_repeats(self):
+        calc, ref, codes = random_pkas()
+        w = np.random.default_rng(1).integers(0, 4, calc.size)
+        idx = np.repeat(np.arange(calc.size), w)
+        weighted = grouped_metrics(calc, ref, codes, 3, weights=w.astype(float))
+        repeated = grouped_metrics(calc[idx], ref[idx], codes[idx], 3)
+        for m, v in repeated.items():
+            assert weighted[m] == pytest.approx(v)
+
+
+class TestBootstrapMetrics:
+
+    def test_seed_reproducible(self):
+        calc, ref, codes = random_pkas()
+        clusters = np.arange(calc.size) // 4
+        for cl in [None, clusters]:
+            b1 = bootstrap_metrics(calc, ref, codes, 3, n_boot=50, seed=7, clusters=cl)
+            b2 = bootstrap_metrics(calc, ref, codes, 3, n_boot=50, seed=7, clusters=cl)
+            b3 = bootstrap_metrics(calc, ref, codes, 3, n_boot=50, seed=8, clusters=cl)
+            assert b1["rmsd"].shape == (50, 3)
+            assert np.array_equal(b1["rmsd"], b2["rmsd"])
+            assert not np.array_equal(b1["rmsd"], b3["rmsd"])
+
+    def test_resamples_keep_group_sizes(self):
+        calc, ref, codes = random_pkas(n=61)
+        sizes = np.bincount(codes, minlength=3)
+        boot = bootstrap_metrics(calc, ref, codes, 3, n_boot=20)
+        assert (boot["N"] == sizes).all()
+        # one pka per cluster: the weights of a group sum to its size
+        boot = bootstrap_metrics(calc, ref, codes, 3, n_boot=20, clusters=np.arange(61))
+        assert (boot["N"] == sizes).all()
+
+    def test_single_cluster_group(self):
+        # a group with a single cluster is always drawn whole: no variance
+        calc, ref, codes = random_pkas()
+        clusters = codes.copy()
+        full = grouped_metrics(calc, ref, codes, 3)
+        boot = bootstrap_metrics(calc, ref, codes, 3, n_boot=10, clusters=clusters)
+        for m in ["mean_delta", "rmsd", "slope"]:
+            assert boot[m] == pytest.approx(np.broadcast_to(full[m], (10, 3)))
+
+    def test_cluster_path_matches_index_path(self):
+        # one cluster per pka: both paths resample the pkas of each group
+        calc, ref, codes = random_pkas(n=90)
+        idx_boot = bootstrap_metrics(calc, ref, codes, 3, n_boot=2000, seed=1)
+        cl_boot = bootstrap_metrics(calc, ref, codes, 3, n_boot=2000, seed=2,
+                                    clusters=np.arange(calc.size))
+        for m in ["mean_delta", "rmsd"]:
+            assert cl_boot[m].mean(axis=0) == pytest.approx(idx_boot[m].mean(axis=0), rel=0.02)
+            assert cl_boot[m].std(axis=0) == pytest.approx(idx_boot[m].std(axis=0), rel=0.15)
+
+
+class TestMatchedStats:
+
+    def test_rows_order_independent(self):
+        calc, ref, _ = random_pkas(n=80)
+        keys = [f"P{i % 7:03d}/{'ASP' if i % 2 else 'LYS'}A{i:04d}_" for i in range(80)]
+        matches = pd.DataFrame({"key": keys, "calc": calc, "ref": ref})
+        st1 = matched_stats(matches, n_boot=100)
+        st2 = matched_stats(matches.sample(frac=1, random_state=3), n_boot=100)
+        pd.testing.assert_frame_equal(st1, st2)
+        assert st1.loc[("all", "ALL"), "N"] == 80
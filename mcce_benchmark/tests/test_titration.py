@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from mcce_benchmark.titration import fit_titrations
+
+
+X = np.arange(0., 15.)   # titration points, pH 0 to 14
+
+
+def hill(x:np.ndarray, pka:float, n:float, sign:int) -> np.ndarray:
+    return 1. / (1. + 10**(sign * n * (pka - x)))
+
+
+class TestFitTitrations:
+
+    def test_exact_curves(self):
+        params = [(4.2, 1.0, 1), (10.3, 0.8, -1), (7.1, 1.3, 1), (6.5, 1.0, -1)]
+        frac = np.array([hill(X, pka, n, s) for pka, n, s in params])
+        signs = np.array([s for _, _, s in params])
+        pka, n, chi2 = fit_titrations(X, frac, signs)
+        assert pka == pytest.approx([p[0] for p in params], abs=1e-4)
+        assert n == pytest.approx([p[1] for p in params], abs=1e-4)
+        assert chi2 == pytest.approx(np.zeros(4), abs=1e-8)
+
+    def test_no_hill(self):
+        frac = np.array([hill(X, 5.5, 1.0, 1), hill(X, 9.25, 1.0, -1)])
+        pka, n, _ = fit_titrations(X, frac, np.array([1, -1]), hill=False)
+        assert pka == pytest.approx([5.5, 9.25], abs=1e-4)
+        assert (n == 1.).all()
+
+    def test_noisy_curve(self):
+        rng = np.random.default_rng(0)
+        frac = np.clip(hill(X, 6.0, 0.9, 1) + rng.normal(0, 0.01, X.size), 0., 1.)[None, :]
+        pka, n, chi2 = fit_titrations(X, frac, np.array([1]))
+        assert pka[0] == pytest.approx(6.0, abs=0.1)
+        assert n[0] == pytest.approx(0.9, abs=0.1)
+        assert chi2[0] > 0
+
+    def test_out_of_bounds(self):
+        frac = np.array([np.full(X.size, 0.1),              # acid, never ionized: > last point
+                         np.full(X.size, 0.9),              # acid, always ionized: < first point
+                         np.where(X < 7, 0., 1.),           # no point in the transition
+                         np.full(X.size, 0.1)])             # skipped
+        pka, n, chi2 = fit_titrations(X, frac, np.array([1, 1, 1, 0]))
+        assert pka[:3] == pytest.approx([8888., -8888., 9999.])
+        assert np.isnan(pka[3])
+        assert np.isnan(n).all()
+        assert np.isnan(chi2).all()
+
+    def test_missing_points(self):
+        frac = np.array([hill(X, 8.0, 1.0, -1)])
+        frac[0, [0, 5, 12]] = np.nan
+        pka, n, _ = fit_titrations(X, frac, np.array([-1]))
+        assert pka[0] == pytest.approx(8.0, abs=1e-4)
+        assert n[0] == pytest.approx(1.0, abs=1e-4)
@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+
+"""
+Module: titration.py
+
+Refit of the titration curves of all the residues of a set of runs from their collated
+sum_crg.out data (table 'sumcrg' of the analysis store, or FILES.ALL_SUMCRG), so that
+alternative pKa definitions can be benchmarked without re-running MCCE.
+
+The charge of an ionizable residue gives its ionized fraction, f (|charge|), which is
+fitted to the Hill form of the Henderson-Hasselbalch equation:
+    f = 1 / (1 + 10**(s * n * (pKa - x)))
+where x is the titration point, s = +1 if f rises with x (acid), -1 if f falls (base),
+and n is the Hill coefficient (n(slope) in pK.out); a flat curve takes s from the sign
+of its resid ('-': acid, '+': base).
+All the curves are fitted at once on stacked (residues x points) arrays:
+  - start: closed-form weighted least-squares fit of the linearized (logit) form,
+           s * log10(f / (1 - f)) = n * (x - pKa), on the points with 0.01 < f < 0.99;
+  - refinement: batched Levenberg-Marquardt on the 2x2 normal equations of each
+                curve (hill=True), or the closed-form fit with n = 1 (hill=False).
+A curve that does not cross f = 0.5 has an out of bounds pKa, coded as in
+io_utils.pks_to_float: -8888 (< first point), 8888 (> last point); a curve with less
+than 1 point in its transition is too sharp to fit: 9999; a pKa fitted beyond the
+titration range is also out of bounds.
+
+The refit pkas are returned in the collated pK.out column schema (index PDB; columns
+resid@<titr>, pKa/Em, n(slope), 1000*chi2), so that their in bounds pkas can be used
+in place of the MCCE pkas, e.g.:
+  pkanalysis.job_pkas_to_df(book_fp, refit_df[~pkanalysis.get_oob_mask(refit_df)]);
+the energy terms of pK.out are not derived from sum_crg.out.
+
+Functions:
+ ionized_fractions(sumcrg_df:pd.DataFrame, titr_type:str="ph") -> tuple
+ fit_titrations(x:np.ndarray, frac:np.ndarray, signs:np.ndarray, hill:bool=True,
+                max_iter:int=MAX_ITER) -> tuple
+ refit_pkas(sumcrg_df:pd.DataFrame, titr_type:str="ph", hill:bool=True) -> pd.DataFrame
+ refit_bench(bench_dir:str, hill:bool=True) -> pd.DataFrame
+"""
+
+from mcce_benchmark import ANALYZE_DIR, FILES
+from mcce_benchmark import store
+from mcce_benchmark.io_utils import Pathok, fout_df
+from mcce_benchmark.mcce_env import get_bench_meta
+import logging
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+#.......................................................................
+
+MAX_ITER = 50
+MV_PER_PH = 58.0   # Eh titrations: mV per pH unit
+FRAC_MIN = 0.01    # linearized fit: points with FRAC_MIN < f < 1 - FRAC_MIN
+LN10 = np.log(10.)
+
+
+def ionized_fractions(sumcrg_df:pd.DataFrame, titr_type:str="ph") -> tuple:
+    """Return the titration points (in pH units), the ionized fractions (residues x
+    points; nan if missing), and the signs of the residues in a collated sum_crg frame:
+    +1 if the fraction rises with the titration points (acid), -1 if it falls (base),
+    the sign of the resid for a flat curve, 0 if not ionizable.
+    """
+
+    titr = titr_type.lower()
+    if titr not in ["ph", "eh"]:
+        raise ValueError("Only pH and Eh titrations can be refitted.")
+
+    x = pd.to_numeric(sumcrg_df.columns[1:]).to_numpy(dtype=float)
+    if titr == "eh":
+        x = x / MV_PER_PH
+    crg = sumcrg_df.iloc[:, 1:].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+
+    sign_chr = sumcrg_df.iloc[:, 0].astype(str).str[3].to_numpy(dtype=object)
+    signs = np.select([sign_chr == "-", sign_chr == "+"], [1, -1], 0)
+    frac = np.clip(np.abs(crg), 0., 1.)
+    frac[signs == 0] = np.nan
+
+    # direction of the curves from their end points (e.g. HEM+ rises with pH):
+    valid = ~np.isnan(frac)
+    rows = np.arange(len(frac))
+    first = frac[rows, np.argmax(valid, axis=1)]
+    last = frac[rows, valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)]
+    rise = np.sign(np.nan_to_num(last - first)).astype(int)
+    signs = np.where((signs != 0) & (rise != 0), rise, signs)
+
+    return x, frac, signs
+
+
+def _linear_fit(x:np.ndarray, frac:np.ndarray, signs:np.ndarray, hill:bool) -> tuple:
+    """Closed-form weighted least-squares fit of the linearized curves; the weights,
+    (f * (1 - f))**2, are the inverse variances of the logits.
+    Return pKa, n and the number of points used per curve.
+    """
+
+    ok = (frac > FRAC_MIN) & (frac < 1 - FRAC_MIN)
+    f = np.where(ok, frac, 0.5)
+    y = signs[:, None] * np.log10(f / (1 - f))
+    w = np.where(ok, (f * (1 - f))**2, 0.)
+    X = np.broadcast_to(x, frac.shape)
+
+    sw = w.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mx = (w * X).sum(axis=1) / sw
+        my = (w * y).sum(axis=1) / sw
+        if hill:
+            dx = X - mx[:, None]
+            n = (w * dx * (y - my[:, None])).sum(axis=1) / (w * dx * dx).sum(axis=1)
+        else:
+            n = np.ones_like(mx)
+        # a single point in the transition: n = 1 to start
+        n = np.where(ok.sum(axis=1) == 1, 1., n)
+        pka = mx - my / n
+
+    return pka, n, ok.sum(axis=1)
+
+
+def _model(x:np.ndarray, pka:np.ndarray, n:np.ndarray, signs:np.ndarray) -> np.ndarray:
+    g = np.clip(signs[:, None] * n[:, None] * (pka[:, None] - x) * LN10, -700, 700)
+    return 1. / (1. + np.exp(g))
+
+
+def _sse(x, frac, valid, pka, n, signs) -> np.ndarray:
+    r = np.where(valid, _model(x, pka, n, signs) - frac, 0.)
+    return (r * r).sum(axis=1)
+
+
+def fit_titrations(x:np.ndarray, frac:np.ndarray, signs:np.ndarray, hill:bool=True,
+                   max_iter:int=MAX_ITER) -> tuple:
+    """Fit the Hill curves of all the residues at once.
+    Args:
+      x (np.ndarray): titration points (pH units), shape (P,);
+      frac (np.ndarray): ionized fractions, shape (R, P), nan if missing;
+      signs (np.ndarray): +1 (acid), -1 (base), 0 (skipped), shape (R,);
+      hill (bool, True): fit n (batched Levenberg-Marquardt), else n = 1;
+      max_iter (int, MAX_ITER): maximum number of LM iterations.
+    Return the arrays pKa (with the out of bounds codes), n and chi2 (sum of squared
+    residuals, as in pK.out), of shape (R,); n & chi2 are nan for out of bounds pkas.
+    """
+
+    valid = ~np.isnan(frac)
+    frac = np.where(valid, frac, 0.)
+    signs = signs.astype(float)
+
+    # out of bounds: no crossing of f = 0.5
+    z = np.where(valid, signs[:, None] * (frac - 0.5), -1.)
+    has_pts = valid.any(axis=1) & (signs != 0)
+    above = has_pts & (z < 0).all(axis=1)
+    below = has_pts & (np.where(valid, z, 1.) > 0).all(axis=1)
+
+    pka, n, n_lin = _linear_fit(x, frac, signs, hill)
+    sharp = has_pts & ~above & ~below & (n_lin == 0)
+    fit = has_pts & ~above & ~below & ~sharp & np.isfinite(pka) & (n > 0)
+
+    if hill and fit.any():
+        xf, ff, vf, sf = x, frac[fit], valid[fit], signs[fit]
+        p, h = pka[fit], n[fit]
+        lam = np.full(p.shape, 1e-3)
+        sse = _sse(xf, ff, vf, p, h, sf)
+        for _ in range(max_iter):
+            m = _model(xf, p, h, sf)
+            r = np.where(vf, m - ff, 0.)
+            # df/dg = -f(1 - f); g = s * n * (pKa - x) * ln10
+            dg = np.where(vf, -m * (1 - m), 0.) * LN10 * sf[:, None]
+            jp = dg * h[:, None]            # d model / d pKa
+            jn = dg * (p[:, None] - xf)     # d model / d n
+            a, b, c = (jp * jp).sum(axis=1), (jp * jn).sum(axis=1), (jn * jn).sum(axis=1)
+            gp, gn = (jp * r).sum(axis=1), (jn * r).sum(axis=1)
+            a, c = a * (1 + lam), c * (1 + lam)
+            det = a * c - b * b
+            with np.errstate(divide="ignore", invalid="ignore"):
+                dp = np.where(det > 0, -(c * gp - b * gn) / det, 0.)
+                dn = np.where(det > 0, -(a * gn - b * gp) / det, 0.)
+            new_p, new_h = p + dp, np.maximum(h + dn, 1e-3)
+            new_sse = _sse(xf, ff, vf, new_p, new_h, sf)
+            better = new_sse < sse
+            p, h = np.where(better, new_p, p), np.where(better, new_h, h)
+            done = better & (sse - new_sse <= 1e-12 * np.maximum(sse, 1e-12))
+            sse = np.where(better, new_sse, sse)
+            lam = np.where(better, lam / 10, lam * 10)
+            if (done | (lam > 1e8)).all():
+                break
+        pka[fit], n[fit] = p, h
+
+    chi2 = np.full(pka.shape, np.nan)
+    if fit.any():
+        chi2[fit] = _sse(x, frac[fit], valid[fit], pka[fit], n[fit], signs[fit])
+    # unfitted crossings (e.g. a touch of f = 0.5): side of the last point
+    bad = has_pts & ~above & ~below & ~sharp & ~fit
+    z_last = z[np.arange(len(z)), valid.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)]
+    above |= bad & (z_last < 0)
+    below |= bad & (z_last >= 0)
+    # fitted beyond the titration range:
+    above |= fit & (pka > x.max())
+    below |= fit & (pka < x.min())
+    fit &= ~(above | below)
+    chi2[~fit] = np.nan
+
+    pka = np.select([above, below, sharp, fit], [8888., -8888., 9999., pka], np.nan)
+    n = np.where(fit, n, np.nan)
+
+    return pka, n, chi2
+
+
+def refit_pkas(sumcrg_df:pd.DataFrame, titr_type:str="ph", hill:bool=True) -> pd.DataFrame:
+    """Return the refit pkas of a collated sum_crg frame (index PDB) in the collated
+    pK.out column schema: resid@<titr>, pKa/Em, n(slope), 1000*chi2; the residues that
+    are not ionizable are skipped.
+    hill (bool, True): Hill fit (n free), else Henderson-Hasselbalch fit (n = 1).
+    """
+
+    x, frac, signs = ionized_fractions(sumcrg_df, titr_type=titr_type)
+    pka, n, chi2 = fit_titrations(x, frac, signs, hill=hill)
+    if titr_type.lower() == "eh":
+        pka = np.where(np.abs(pka) < 8888, pka * MV_PER_PH, pka)
+
+    keep = signs != 0
+    df = pd.DataFrame({f"resid@{titr_type.upper()}": sumcrg_df.iloc[:, 0].to_numpy()[keep],
+                       "pKa/Em": np.round(pka[keep], 3),
+                       "n(slope)": np.round(n[keep], 3),
+                       "1000*chi2": np.round(1000 * chi2[keep], 3)},
+                      index=sumcrg_df.index[keep])
+    df.index.name = "PDB"
+
+    return df
+
+
+def refit_bench(bench_dir:str, hill:bool=True) -> pd.DataFrame:
+    """Refit the titration curves of the analyzed set of runs in `bench_dir` from its
+    collated sum_crg data (analysis store, else FILES.ALL_SUMCRG); save the refit pkas
+    to FILES.ALL_PKAS_REFIT & return them.
+    """
+
+    bench = Pathok(bench_dir)
+    titr = get_bench_meta(bench).titr_type
+    sumcrg_df = store.read_table(bench, "sumcrg")
+    if sumcrg_df is None:
+        sumcrg_df = fout_df(Pathok(bench.joinpath(ANALYZE_DIR, FILES.ALL_SUMCRG.value)),
+                            collated=True, titr_type=titr, kind="sumcrg")
+
+    df = refit_pkas(sumcrg_df, titr_type=titr, hill=hill)
+    fp = bench.joinpath(ANALYZE_DIR, FILES.ALL_PKAS_REFIT.value)
+    df.to_csv(fp, sep="\t")
+    logger.info(f"Saved the {'Hill' if hill else 'Henderson-Hasselbalch'} refit pkas: {fp}")
+
+    return df